@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable
+
+import http_client
+import metrics
+from run_hf import retry_count
+
+
+@dataclass
+class ReleaseJob:
+    release: str
+    desc: str
+    # None: nada para analisar, o job vai para `write` com resultado vazio
+    make_prompt: Callable[[], str | None]
+    # rótulo em logs e no stream quando vários jobs são da mesma release
+    # (os shards do --shards); as métricas ficam sempre com `release`
+    label: str | None = None
+
+    @property
+    def name(self) -> str:
+        return self.label or self.release
+
+
+_current_job: contextvars.ContextVar[ReleaseJob | None] = contextvars.ContextVar(
+    "current_job", default=None
+)
+
+
+def current_release() -> str | None:
+    # release do job em andamento, visível dentro de `call` (roda no executor)
+    job = _current_job.get()
+    return job.release if job is not None else None
+
+
+def current_label() -> str | None:
+    job = _current_job.get()
+    return job.name if job is not None else None
+
+
+@dataclass
+class DispatchStats:
+    releases: int = 0
+    retries: int = 0
+    max_in_flight: int = 0
+    total_s: float = 0.0
+
+
+class AsyncDispatcher:
+    # Mantém até `concurrency` chamadas ao router em voo. As respostas chegam
+    # fora de ordem, mas `write` é chamado sempre na ordem original dos jobs.
+    # As novas tentativas depois de 429/503 ficam em `call` (run_hf.with_retries,
+    # a mesma política dos modos sequencial e --pipeline).
+
+    def __init__(
+        self,
+        call: Callable[[str], str],
+        write: Callable[[ReleaseJob, str], None],
+        concurrency: int = 4,
+    ):
+        if concurrency < 1:
+            raise ValueError("concurrency deve ser >= 1")
+        self.call = call
+        self.write = write
+        self.concurrency = concurrency
+        self.stats = DispatchStats()
+        self._in_flight = 0
+
+    async def _run_job(
+        self,
+        job: ReleaseJob,
+        sem: asyncio.Semaphore,
+        executor: ThreadPoolExecutor,
+    ) -> str:
+        loop = asyncio.get_running_loop()
+        _current_job.set(job)
+        metrics.bind_release(job.release)
+        async with sem:
+            # run_in_executor não propaga o contexto da task
+            ctx = contextvars.copy_context()
+            prompt = await loop.run_in_executor(executor, ctx.run, job.make_prompt)
+            if prompt is None:
+                print(f"{job.name}: nenhum arquivo para analisar, sem chamada ao modelo")
+                return ""
+            self._in_flight += 1
+            self.stats.max_in_flight = max(self.stats.max_in_flight, self._in_flight)
+            try:
+                ctx = contextvars.copy_context()
+                return await loop.run_in_executor(executor, ctx.run, self.call, prompt)
+            finally:
+                self._in_flight -= 1
+
+    async def run(self, jobs: list[ReleaseJob]) -> DispatchStats:
+        start = time.perf_counter()
+        retries = retry_count()
+        sem = asyncio.Semaphore(self.concurrency)
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+
+        tasks = [asyncio.create_task(self._run_job(job, sem, executor)) for job in jobs]
+        position = {task: i for i, task in enumerate(tasks)}
+        ready: dict[int, str] = {}
+        next_pos = 0
+        pending = set(tasks)
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    ready[position[task]] = task.result()
+                while next_pos in ready:
+                    self.write(jobs[next_pos], ready.pop(next_pos))
+                    self.stats.releases += 1
+                    next_pos += 1
+        finally:
+            for task in pending:
+                task.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.stats.total_s = time.perf_counter() - start
+            self.stats.retries = retry_count() - retries
+
+        return self.stats
+
+
+def ensure_pool_size(concurrency: int) -> None:
+    # o pool precisa comportar todas as conexões em voo para haver reuso
+    config = http_client.get_config()
+    if config.pool_size < concurrency:
+        http_client.configure(replace(config, pool_size=concurrency))
+
+
+def run_concurrent(
+    jobs: list[ReleaseJob],
+    call: Callable[[str], str],
+    write: Callable[[ReleaseJob, str], None],
+    concurrency: int = 4,
+) -> DispatchStats:
+    ensure_pool_size(concurrency)
+    dispatcher = AsyncDispatcher(call, write, concurrency)
+    return asyncio.run(dispatcher.run(jobs))
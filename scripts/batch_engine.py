@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+import csv
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+
+import metrics
+from async_dispatch import ReleaseJob, current_release, run_concurrent
+from checkpoint import CheckpointJournal
+from hf_stream import StreamRecorder
+from prompt_template import PromptTemplate
+from result_sink import CsvSink, ResultSink
+from run_hf import call_hf_router_chat, load_code, load_prompt_template, retry_count
+from response_cache import ResponseCache
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_releases(path: str) -> list[dict]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def release_fields(row: dict, idx: int) -> tuple[str, str]:
+    release = (row.get("tag_name") or row.get("name") or str(row.get("id") or "")).strip()
+    desc = (row.get("name") or "").strip()
+    if not release:
+        release = f"release_{idx}"
+    return release, desc
+
+
+@dataclass
+class BatchStats:
+    mode: str
+    releases: int = 0
+    total_s: float = 0.0
+    call_s: float = 0.0
+    per_release_s: list[float] = field(default_factory=list)
+    retries: int = 0
+    skipped: int = 0
+
+    @property
+    def mean_s(self) -> float:
+        return self.total_s / self.releases if self.releases else 0.0
+
+    @property
+    def overhead_s(self) -> float:
+        # tempo fora da chamada ao modelo, por release
+        if not self.releases:
+            return 0.0
+        return (self.total_s - self.call_s) / self.releases
+
+    def report(self) -> str:
+        lines = [
+            f"Modo: {self.mode}",
+            f"Releases: {self.releases}",
+            f"Tempo total: {self.total_s:.2f}s",
+            f"Tempo médio por release: {self.mean_s:.3f}s",
+        ]
+        if self.skipped:
+            lines.append(f"Puladas (já concluídas no checkpoint): {self.skipped}")
+        if self.retries:
+            lines.append(f"Novas tentativas (429/503): {self.retries}")
+        if self.mode == "inprocess":
+            lines.append(f"Overhead médio por release (fora do modelo): {self.overhead_s * 1000:.1f}ms")
+        return "\n".join(lines)
+
+
+class BatchEngine:
+    # Carrega template e código uma única vez e processa todas as releases
+    # no mesmo processo, reaproveitando call_hf_router_chat e o ResultSink. O
+    # código é o mesmo para todas as releases e já vai fixado no template.
+
+    def __init__(
+        self,
+        model: str,
+        template: str,
+        code: str,
+        out_csv: str,
+        token: str,
+        cache: ResponseCache | None = None,
+        journal: CheckpointJournal | None = None,
+        stream: StreamRecorder | None = None,
+        sink: ResultSink | None = None,
+    ):
+        self.model = model
+        self.template = template
+        self.code = code
+        self.prompt = PromptTemplate(template).bind(CODIGO=code)
+        self.out_csv = out_csv
+        self.token = token
+        self.cache = cache
+        self.journal = journal
+        self.stream = stream
+        # o journal precisa existir antes: ele trunca o CSV na retomada
+        self.sink = sink or CsvSink(out_csv)
+
+    @classmethod
+    def from_files(
+        cls,
+        model: str,
+        code_file: str,
+        prompt_file: str,
+        out_csv: str,
+        token: str,
+        cache: ResponseCache | None = None,
+        journal: CheckpointJournal | None = None,
+        stream: StreamRecorder | None = None,
+        sink: ResultSink | None = None,
+    ):
+        return cls(
+            model,
+            load_prompt_template(prompt_file),
+            load_code(code_file),
+            out_csv,
+            token,
+            cache,
+            journal,
+            stream,
+            sink,
+        )
+
+    def is_done(self, release: str) -> bool:
+        if self.sink.is_done(self.model, release):
+            return True
+        return self.journal is not None and self.journal.is_done(self.model, release)
+
+    def write(self, result: str, release: str, desc: str) -> None:
+        on_flush = None
+        if self.journal is not None:
+            # confirma no journal só depois que a release chegou ao arquivo
+            on_flush = lambda offset, release=release: self.journal.commit(self.model, release, offset)
+        with metrics.stage("escrita", release):
+            self.sink.write(result, release, desc, on_flush, self.model)
+
+    def close(self) -> None:
+        self.sink.close()
+
+    def call(self, prompt: str, label: str | None = None) -> str:
+        return call_hf_router_chat(
+            self.model,
+            prompt,
+            self.token,
+            cache=self.cache,
+            stream=self.stream,
+            label=label or current_release(),
+        )
+
+    def build(self, release: str, desc: str) -> str:
+        with metrics.stage("prompt"):
+            return self.prompt.build(release, desc)
+
+    def run_release(self, release: str, desc: str) -> float:
+        with metrics.release_scope(release):
+            prompt = self.build(release, desc)
+            t0 = time.perf_counter()
+            result = self.call(prompt, release)
+            call_s = time.perf_counter() - t0
+            self.write(result, release, desc)
+        return call_s
+
+    def run(self, rows: list[dict]) -> BatchStats:
+        stats = BatchStats(mode="inprocess")
+        total = len(rows)
+        start = time.perf_counter()
+        retries = retry_count()
+        for i, row in enumerate(rows, start=1):
+            release, desc = release_fields(row, i)
+            if self.is_done(release):
+                stats.skipped += 1
+                continue
+            print(f"[{i}/{total}] Rodando release {release}")
+            t0 = time.perf_counter()
+            stats.call_s += self.run_release(release, desc)
+            stats.per_release_s.append(time.perf_counter() - t0)
+            stats.releases += 1
+        stats.total_s = time.perf_counter() - start
+        stats.retries = retry_count() - retries
+        return stats
+
+    def run_async(self, rows: list[dict], concurrency: int) -> BatchStats:
+        jobs = []
+        skipped = 0
+        for i, row in enumerate(rows, start=1):
+            release, desc = release_fields(row, i)
+            if self.is_done(release):
+                skipped += 1
+                continue
+            jobs.append(
+                ReleaseJob(
+                    release,
+                    desc,
+                    lambda release=release, desc=desc: self.build(release, desc),
+                )
+            )
+
+        total = len(jobs)
+        done = 0
+
+        def write(job: ReleaseJob, result: str) -> None:
+            nonlocal done
+            self.write(result, job.release, job.desc)
+            done += 1
+            print(f"[{done}/{total}] OK {job.release}")
+
+        dispatch = run_concurrent(
+            jobs,
+            self.call,
+            write,
+            concurrency,
+        )
+        return BatchStats(
+            mode=f"async (concorrência {concurrency})",
+            releases=dispatch.releases,
+            total_s=dispatch.total_s,
+            retries=dispatch.retries,
+            skipped=skipped,
+        )
+
+
+def run_subprocess_batch(
+    model: str,
+    rows: list[dict],
+    code_file: str,
+    prompt_file: str,
+    out_csv: str,
+    journal: CheckpointJournal | None = None,
+) -> BatchStats:
+    # modo antigo: um interpretador novo por release
+    stats = BatchStats(mode="subprocess")
+    total = len(rows)
+    start = time.perf_counter()
+    for i, row in enumerate(rows, start=1):
+        release, desc = release_fields(row, i)
+        if journal is not None and journal.is_done(model, release):
+            stats.skipped += 1
+            continue
+        print(f"[{i}/{total}] Rodando release {release}")
+        t0 = time.perf_counter()
+        subprocess.run(
+            [
+                sys.executable,
+                os.path.join(SCRIPTS_DIR, "run_hf.py"),
+                model,
+                release,
+                desc,
+                code_file,
+                prompt_file,
+                out_csv,
+            ],
+            check=True,
+        )
+        if journal is not None:
+            journal.commit(model, release, os.path.getsize(out_csv))
+        stats.per_release_s.append(time.perf_counter() - t0)
+        stats.releases += 1
+    stats.total_s = time.perf_counter() - start
+    return stats
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import http_client
+from async_dispatch import ReleaseJob, run_concurrent
+from run_hf import HFRouterError, parse_retry_after, with_retries
+
+
+# Router falso local: responde depois de LATENCY_S e devolve 429 com
+# Retry-After em uma fração das chamadas.
+
+
+LATENCY_S = 0.2
+RATE_429 = 0.05
+
+
+class FakeRouterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length))
+        release = payload["messages"][-1]["content"]
+
+        if random.random() < RATE_429:
+            body = b'{"error": "rate limited"}'
+            self.send_response(429)
+            self.send_header("Retry-After", "0.1")
+        else:
+            time.sleep(LATENCY_S)
+            content = f"{release};{release};Bloaters;Long Method;ok"
+            body = json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_call(url: str):
+    def post(prompt: str) -> str:
+        payload = {"messages": [{"role": "user", "content": prompt}]}
+        r = http_client.get_session().post(url, json=payload, timeout=(5, 30))
+        if r.status_code != 200:
+            raise HFRouterError(
+                r.status_code, r.text, parse_retry_after(r.headers.get("Retry-After"))
+            )
+        return r.json()["choices"][0]["message"]["content"]
+
+    # a mesma política de novas tentativas de call_hf_router_chat
+    return lambda prompt: with_retries(lambda: post(prompt), prompt)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) >= 2 else 64
+    levels = [int(x) for x in sys.argv[2:]] or [1, 2, 4, 8, 16]
+
+    random.seed(0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRouterHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    call = make_call(f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions")
+
+    jobs = [ReleaseJob(f"v{i}", f"v{i}", lambda i=i: f"v{i}") for i in range(n)]
+
+    print(f"Releases: {n}, latência do router falso: {LATENCY_S * 1000:.0f}ms")
+    base = None
+    for concurrency in levels:
+        written: list[str] = []
+        stats = run_concurrent(
+            jobs, call, lambda job, result: written.append(result.split(";")[0]), concurrency
+        )
+        assert written == [job.release for job in jobs], "saída fora de ordem"
+        rate = stats.releases / stats.total_s
+        base = base or rate
+        print(
+            f"concorrência {concurrency:>3}: {rate:7.2f} releases/s "
+            f"(x{rate / base:.2f}), {stats.retries} novas tentativas, "
+            f"máx. em voo {stats.max_in_flight}"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import argparse
+import io
+import sys
+import time
+
+import torch
+
+from colab_script_completo import build_prompt, format_chat, load_model, load_prompt_template
+
+
+# Tokens/s da geração na CPU, float32 contra int8 dinâmico, por número de
+# threads. Usa o mesmo load_model do script do Colab, ex.:
+#   python scripts/bench_cpu_quant.py releases/editor.ts prompt/code_smells_prompt.txt
+
+
+def state_dict_mb(model) -> float:
+    buf = io.BytesIO()
+    torch.save(model.state_dict(), buf)
+    return buf.tell() / 1e6
+
+
+def tokens_per_second(model, tokenizer, prompt: str, max_new_tokens: int, runs: int) -> float:
+    inputs = tokenizer(format_chat(tokenizer, prompt), return_tensors="pt")
+    prompt_len = inputs["input_ids"].shape[1]
+    generated = 0
+    elapsed = 0.0
+    with torch.no_grad():
+        # aquecimento (alocações, pacotes de pesos do int8)
+        model.generate(**inputs, max_new_tokens=4, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            outputs = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                min_new_tokens=max_new_tokens,
+                do_sample=False,
+                pad_token_id=tokenizer.eos_token_id,
+            )
+            elapsed += time.perf_counter() - t0
+            generated += outputs.shape[1] - prompt_len
+    return generated / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de geração na CPU: float32 x int8.")
+    parser.add_argument("arquivo_codigo")
+    parser.add_argument("arquivo_prompt")
+    parser.add_argument("--modelo", default="Qwen/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--threads", default="", help="números de threads, separados por vírgula")
+    parser.add_argument("--max-chars", type=int, default=2000, help="corte do código, em caracteres")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args(sys.argv[1:])
+
+    template = load_prompt_template(args.arquivo_prompt)
+    with open(args.arquivo_codigo, "r", encoding="utf-8", errors="ignore") as f:
+        code = f.read()[: args.max_chars]
+    prompt = build_prompt(template, "v1.0.0", "v1.0.0", code)
+
+    threads = [int(x) for x in args.threads.split(",") if x] or [torch.get_num_threads()]
+    print(f"Modelo: {args.modelo}, max_new_tokens: {args.max_new_tokens}")
+
+    results = {}
+    for backend in ("cpu", "cpu-int8"):
+        model, tokenizer = load_model(args.modelo, backend)
+        print(f"{backend}: pesos {state_dict_mb(model):.0f} MB")
+        for n in threads:
+            torch.set_num_threads(n)
+            tps = tokens_per_second(model, tokenizer, prompt, args.max_new_tokens, args.repeticoes)
+            results[(backend, n)] = tps
+            print(f"  {n:>2} threads: {tps:6.1f} tokens/s")
+        del model
+
+    for n in threads:
+        base = results[("cpu", n)]
+        print(f"int8 / float32 com {n} threads: x{results[('cpu-int8', n)] / base:.2f}")
+
+
+if __name__ == "__main__":
+    main()
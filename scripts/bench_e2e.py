@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_tarball_stream import build_tarball
+from smell_catalog import CATALOG
+
+
+# Benchmark de ponta a ponta sem rede: sobe um router falso (latência, jitter,
+# 429/504 e CSV enlatado, com ou sem streaming) e um servidor de tarballs no
+# lugar da API do GitHub, e roda os scripts de verdade contra eles via
+# HF_ROUTER_URL / GITHUB_API_URL. O resultado é um JSON por commit com
+# releases/s, latência p50/p95/p99 por release e pico de RSS de cada cenário.
+#
+# A latência de uma release vai do primeiro pedido que chega aos servidores
+# (tarball ou router) até a resposta 200 do router, e inclui as novas
+# tentativas depois de 429/504.
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPTS_DIR)
+DEFAULT_OUT_DIR = os.path.join(".cache", "bench")
+MODEL = "bench/e2e-model:hf-inference"
+TAG_RE = re.compile(r"e2e-\d{5}")
+
+
+@dataclass
+class RouterConfig:
+    latency_ms: float = 200.0
+    jitter_ms: float = 50.0
+    rate_429: float = 0.0
+    rate_504: float = 0.0
+    retry_after: str = "0"
+    rows: int = 6
+    answers: str | None = None  # arquivo com o CSV devolvido; {release} e {desc} são trocados
+
+
+@dataclass
+class ServerStats:
+    router_requests: int = 0
+    router_429: int = 0
+    router_504: int = 0
+    tarball_requests: int = 0
+    tarball_bytes: int = 0
+    started: dict[str, float] = field(default_factory=dict)
+    finished: dict[str, float] = field(default_factory=dict)
+
+
+class Timeline:
+    # contadores e instantes por release, compartilhados pelos dois servidores
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = ServerStats()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats = ServerStats()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self.stats, name, getattr(self.stats, name) + amount)
+
+    def start(self, release: str | None) -> None:
+        if release:
+            with self._lock:
+                self.stats.started.setdefault(release, time.perf_counter())
+
+    def finish(self, release: str | None) -> None:
+        if release:
+            with self._lock:
+                self.stats.finished[release] = time.perf_counter()
+
+    def latencies(self) -> list[float]:
+        with self._lock:
+            s = self.stats
+            return sorted(s.finished[r] - s.started[r] for r in s.finished if r in s.started)
+
+
+def canned_csv(release: str, desc: str, rows: int) -> str:
+    # linhas do catálogo escolhidas pela release, iguais em toda execução
+    rng = random.Random(hashlib.sha256(release.encode("utf-8")).digest())
+    pairs = [(cat, smell) for cat, smells in CATALOG.items() for smell in smells]
+    chosen = rng.sample(pairs, min(rows, len(pairs)))
+    return "\n".join(
+        f"{release};{desc};{cat};{smell};Trecho sintético do benchmark" for cat, smell in chosen
+    )
+
+
+class RouterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    config = RouterConfig()
+    timeline = Timeline()
+    answers: str | None = None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        payload = json.loads(body or b"{}")
+        prompt = "\n".join(m.get("content") or "" for m in payload.get("messages") or [])
+        match = TAG_RE.search(prompt)
+        release = match.group(0) if match else None
+        self.timeline.start(release)
+        self.timeline.count("router_requests")
+
+        c = self.config
+        time.sleep(max(0.0, random.gauss(c.latency_ms, c.jitter_ms)) / 1000)
+
+        draw = random.random()
+        if draw < c.rate_429:
+            self.timeline.count("router_429")
+            self._send(429, b'{"error": "rate limited"}', {"Retry-After": c.retry_after})
+            return
+        if draw < c.rate_429 + c.rate_504:
+            self.timeline.count("router_504")
+            self._send(504, b"Gateway Timeout")
+            return
+
+        release = release or "desconhecida"
+        if self.answers is not None:
+            text = self.answers.replace("{release}", release).replace("{desc}", release)
+        else:
+            text = canned_csv(release, release, c.rows)
+
+        if payload.get("stream"):
+            self._send_stream(text)
+        else:
+            data = {
+                "choices": [{"message": {"role": "assistant", "content": text}}],
+                "usage": {"completion_tokens": len(text) // 4},
+            }
+            self._send(200, json.dumps(data).encode("utf-8"), {"Content-Type": "application/json"})
+        self.timeline.finish(release if match else None)
+
+    def _send(self, status: int, body: bytes, headers: dict | None = None) -> None:
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, text: str) -> None:
+        # um evento por linha do CSV; sem Content-Length, a conexão fecha no fim
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for line in text.splitlines(keepends=True):
+                event = {"choices": [{"delta": {"content": line}}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            usage = {"choices": [], "usage": {"completion_tokens": len(text) // 4}}
+            self.wfile.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TarballHandler(BaseHTTPRequestHandler):
+    # GET /repos/<dono>/<repo>/tarball/<tag>, com ETag por tag
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    timeline = Timeline()
+    blob = b""
+    latency_ms = 0.0
+
+    def do_GET(self):
+        release = self.path.rstrip("/").rsplit("/", 1)[-1]
+        self.timeline.start(release)
+        self.timeline.count("tarball_requests")
+        time.sleep(self.latency_ms / 1000)
+
+        etag = f'"{release}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/x-gzip")
+        self.send_header("Content-Length", str(len(self.blob)))
+        self.end_headers()
+        try:
+            for i in range(0, len(self.blob), 64 * 1024):
+                chunk = self.blob[i:i + 64 * 1024]
+                self.wfile.write(chunk)
+                self.timeline.count("tarball_bytes", len(chunk))
+        except (BrokenPipeError, ConnectionResetError):
+            # o streaming fecha a conexão assim que o orçamento de caracteres enche
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(handler) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_releases_csv(path: str, count: int) -> list[str]:
+    tags = [f"e2e-{i:05d}" for i in range(1, count + 1)]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "tag_name", "name", "published_at", "tarball_url"])
+        for i, tag in enumerate(tags):
+            writer.writerow([
+                i + 1,
+                tag,
+                tag,
+                f"2025-01-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z",
+                # URL da API pública: os scripts a trocam por GITHUB_API_URL
+                f"https://api.github.com/repos/bench/e2e/tarball/{tag}",
+            ])
+    return tags
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    k = (len(values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+@dataclass
+class Scenario:
+    name: str
+    script: str
+    args: list[str]
+    per_release: bool = False  # run_hf.py: um processo por release
+
+
+def scenarios(concurrency: int, code_file: str, prompt_file: str) -> list[Scenario]:
+    batch = ["run_batch_from_releases_csv.py", MODEL, "{releases}", code_file, prompt_file, "{saida}"]
+    hf_batch = ["run_hf_batch.py", MODEL, "{releases}", prompt_file, "{saida}"]
+    return [
+        Scenario("run_hf", "run_hf.py", [MODEL, "{release}", "{release}", code_file, prompt_file, "{saida}"], True),
+        Scenario("batch", batch[0], batch[1:]),
+        Scenario("batch_subprocess", batch[0], batch[1:] + ["--subprocess"]),
+        Scenario("batch_async", batch[0], batch[1:] + ["--concorrencia", str(concurrency)]),
+        Scenario("batch_async_stream", batch[0], batch[1:] + ["--concorrencia", str(concurrency), "--stream"]),
+        Scenario("hf_batch", hf_batch[0], hf_batch[1:]),
+        Scenario("hf_batch_async", hf_batch[0], hf_batch[1:] + ["--concorrencia", str(concurrency)]),
+        Scenario(
+            "hf_batch_pipeline",
+            hf_batch[0],
+            hf_batch[1:] + ["--pipeline", "--workers", f"download=2,inferencia={concurrency}"],
+        ),
+    ]
+
+
+def run_process(argv: list[str], cwd: str, env: dict, log) -> tuple[int, int]:
+    # (código de saída, pico de RSS em KB do processo e dos filhos que ele esperou)
+    proc = subprocess.Popen(argv, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, usage.ru_maxrss
+
+
+def run_scenario(scenario: Scenario, tags: list[str], workdir: str, env: dict, timeline: Timeline) -> dict:
+    cwd = os.path.join(workdir, scenario.name)
+    os.makedirs(cwd, exist_ok=True)
+    values = {"releases": os.path.join(workdir, "releases.csv"), "saida": os.path.join(cwd, "resultados.csv")}
+    script = os.path.join(SCRIPTS_DIR, scenario.script)
+
+    timeline.reset()
+    exit_code, peak_kb = 0, 0
+    t0 = time.perf_counter()
+    with open(os.path.join(cwd, "saida.log"), "w", encoding="utf-8") as log:
+        runs = [{**values, "release": tag} for tag in tags] if scenario.per_release else [values]
+        for run in runs:
+            argv = [sys.executable, script] + [a.format(**run) for a in scenario.args]
+            code, rss = run_process(argv, cwd, env, log)
+            peak_kb = max(peak_kb, rss)
+            if code != 0:
+                exit_code = code
+                break
+    wall = time.perf_counter() - t0
+
+    latencies = timeline.latencies()
+    s = timeline.stats
+    done = len(s.finished)
+    return {
+        "cenario": scenario.name,
+        "script": scenario.script,
+        "args": scenario.args,
+        "codigo_saida": exit_code,
+        "releases": done,
+        "wall_s": round(wall, 3),
+        "releases_por_s": round(done / wall, 3) if wall > 0 else None,
+        "latencia_ms": {
+            q: (round(v * 1000, 1) if v is not None else None)
+            for q, v in (("p50", percentile(latencies, 0.5)), ("p95", percentile(latencies, 0.95)), ("p99", percentile(latencies, 0.99)))
+        },
+        "pico_rss_mb": round(peak_kb / 1024, 1),
+        "router": {"requisicoes": s.router_requests, "429": s.router_429, "504": s.router_504},
+        "tarballs": {"requisicoes": s.tarball_requests, "mb": round(s.tarball_bytes / 1e6, 2)},
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(previous_path: str, report: dict) -> None:
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {s["cenario"]: s for s in json.load(f)["cenarios"]}
+    print(f"\nComparação com {previous_path}:")
+    for s in report["cenarios"]:
+        old = previous.get(s["cenario"])
+        if not old:
+            continue
+        def delta(new, before):
+            if new is None or not before:
+                return "-"
+            return f"{(new - before) / before * 100:+.1f}%"
+        print(
+            f"  {s['cenario']:<20} releases/s {delta(s['releases_por_s'], old['releases_por_s']):>8}  "
+            f"p95 {delta(s['latencia_ms']['p95'], old['latencia_ms']['p95']):>8}  "
+            f"RSS {delta(s['pico_rss_mb'], old['pico_rss_mb']):>8}"
+        )
+
+
+def main():
+    names = [s.name for s in scenarios(1, "", "")]
+    parser = argparse.ArgumentParser(
+        description="Benchmark de ponta a ponta dos scripts contra router e GitHub falsos."
+    )
+    parser.add_argument("--cenarios", default=",".join(names), help=f"separados por vírgula: {', '.join(names)}")
+    parser.add_argument("--releases", type=int, default=30)
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--latencia-ms", type=float, default=200.0, help="latência média do router falso")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="desvio padrão da latência")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="fração das chamadas respondidas com 429")
+    parser.add_argument("--taxa-504", type=float, default=0.0, help="fração das chamadas respondidas com 504")
+    parser.add_argument("--retry-after", default="0", help="valor do Retry-After nas respostas 429")
+    parser.add_argument("--linhas", type=int, default=6, help="linhas de CSV por resposta enlatada")
+    parser.add_argument("--respostas", help="arquivo com o CSV devolvido pelo router ({release}, {desc})")
+    parser.add_argument("--arquivos-tarball", type=int, default=400)
+    parser.add_argument("--bytes-arquivo", type=int, default=20_000)
+    parser.add_argument("--latencia-tarball-ms", type=float, default=0.0)
+    parser.add_argument("--codigo", default=os.path.join(ROOT_DIR, "releases", "editor.ts"))
+    parser.add_argument("--prompt", default=os.path.join(ROOT_DIR, "prompt", "code_smells_prompt.txt"))
+    parser.add_argument("--saida", help=f"JSON do relatório (padrão: {DEFAULT_OUT_DIR}/e2e_<commit>.json)")
+    parser.add_argument("--comparar", help="JSON de outra execução para comparar")
+    args = parser.parse_args(sys.argv[1:])
+
+    selected = [s for s in scenarios(args.concorrencia, args.codigo, args.prompt) if s.name in args.cenarios.split(",")]
+    if not selected:
+        raise RuntimeError(f"Nenhum cenário conhecido em --cenarios (use {', '.join(names)})")
+
+    config = RouterConfig(
+        args.latencia_ms, args.jitter_ms, args.taxa_429, args.taxa_504, args.retry_after, args.linhas, args.respostas
+    )
+    timeline = Timeline()
+    RouterHandler.config = config
+    RouterHandler.timeline = timeline
+    if args.respostas:
+        with open(args.respostas, "r", encoding="utf-8") as f:
+            RouterHandler.answers = f.read()
+    TarballHandler.timeline = timeline
+    TarballHandler.blob = build_tarball(args.arquivos_tarball, args.bytes_arquivo)
+    TarballHandler.latency_ms = args.latencia_tarball_ms
+
+    router = start_server(RouterHandler)
+    github = start_server(TarballHandler)
+    env = {
+        **os.environ,
+        "HF_TOKEN": "bench",
+        "HF_ROUTER_URL": f"http://127.0.0.1:{router.server_address[1]}/v1",
+        "GITHUB_API_URL": f"http://127.0.0.1:{github.server_address[1]}",
+        "HF_CACHE": "0",
+        "PYTHONUNBUFFERED": "1",
+    }
+    env.pop("GITHUB_TOKEN", None)
+    env.pop("GH_TOKEN", None)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_e2e_") as workdir:
+        tags = write_releases_csv(os.path.join(workdir, "releases.csv"), args.releases)
+        print(
+            f"{len(tags)} releases, router {config.latency_ms:.0f}±{config.jitter_ms:.0f}ms "
+            f"(429 {config.rate_429:.0%}, 504 {config.rate_504:.0%}), "
+            f"tarball {len(TarballHandler.blob) / 1e6:.1f} MB"
+        )
+        for scenario in selected:
+            result = run_scenario(scenario, tags, workdir, env, timeline)
+            results.append(result)
+            lat = result["latencia_ms"]
+            status = "" if result["codigo_saida"] == 0 else f"  FALHOU (código {result['codigo_saida']})"
+            print(
+                f"{result['cenario']:<20} {result['releases_por_s'] or 0:7.2f} releases/s  "
+                f"p50 {lat['p50']}ms p95 {lat['p95']}ms p99 {lat['p99']}ms  "
+                f"RSS {result['pico_rss_mb']} MB{status}"
+            )
+            if result["codigo_saida"] != 0:
+                with open(os.path.join(workdir, scenario.name, "saida.log"), encoding="utf-8") as f:
+                    print("    " + "\n    ".join(f.read().strip().splitlines()[-5:]))
+
+    router.shutdown()
+    github.shutdown()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "releases": args.releases,
+        "concorrencia": args.concorrencia,
+        "router": asdict(config),
+        "tarball": {"arquivos": args.arquivos_tarball, "bytes_arquivo": args.bytes_arquivo},
+        "cenarios": results,
+    }
+    out_path = args.saida or os.path.join(DEFAULT_OUT_DIR, f"e2e_{commit or 'sem_git'}.json")
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"OK -> {out_path}")
+
+    if args.comparar:
+        compare(args.comparar, report)
+
+
+if __name__ == "__main__":
+    main()
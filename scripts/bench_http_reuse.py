@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import http_client
+
+
+# Servidor local que conta quantas conexões TCP foram abertas, para comparar
+# requests.get "puro" com a sessão compartilhada de http_client.
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with CountingHandler.lock:
+            CountingHandler.connections += 1
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(n: int, get) -> tuple[int, float]:
+    CountingHandler.connections = 0
+    t0 = time.perf_counter()
+    for _ in range(n):
+        get()
+    return CountingHandler.connections, time.perf_counter() - t0
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) >= 2 else 200
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    timeout = http_client.get_config().github_timeout()
+    session = http_client.get_session()
+
+    bare_conns, bare_s = run(n, lambda: requests.get(url, timeout=timeout))
+    pooled_conns, pooled_s = run(n, lambda: session.get(url, timeout=timeout))
+
+    print(f"Requisições: {n}")
+    print(f"requests.get:         {bare_conns} conexões, {bare_s * 1000 / n:.2f}ms por requisição")
+    print(f"sessão compartilhada: {pooled_conns} conexões, {pooled_s * 1000 / n:.2f}ms por requisição")
+
+    server.shutdown()
+    http_client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import time
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from colab_script_completo import build_prompt, generate_batch, is_csv_row, load_prompt_template
+
+
+# Releases por minuto da geração local em lotes, por tamanho de lote.
+# Também mostra tokens gerados e linhas CSV válidas por release, com e sem os
+# critérios de parada (--sem-parada). Roda em CPU com um modelo pequeno, ex.:
+#   python scripts/bench_local_batch.py releases/editor.ts prompt/code_smells_prompt.txt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de geração local em lotes.")
+    parser.add_argument("arquivo_codigo")
+    parser.add_argument("arquivo_prompt")
+    parser.add_argument("--modelo", default="Qwen/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--releases", type=int, default=8)
+    parser.add_argument("--lotes", default="1,2,4,8", help="tamanhos de lote, separados por vírgula")
+    parser.add_argument("--max-chars", type=int, default=2000, help="corte do código, em caracteres")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--sem-parada", action="store_true", help="desliga os critérios de parada")
+    args = parser.parse_args(sys.argv[1:])
+
+    torch.manual_seed(0)
+    tokenizer = AutoTokenizer.from_pretrained(args.modelo)
+    model = AutoModelForCausalLM.from_pretrained(args.modelo, torch_dtype=torch.float32)
+    model.eval()
+
+    template = load_prompt_template(args.arquivo_prompt)
+    with open(args.arquivo_codigo, "r", encoding="utf-8", errors="ignore") as f:
+        code = f.read()[: args.max_chars]
+    prompts = [build_prompt(template, f"v1.{i}.0", f"v1.{i}.0", code) for i in range(args.releases)]
+
+    print(f"Modelo: {args.modelo} (CPU, {torch.get_num_threads()} threads)")
+    print(f"Releases: {args.releases}, max_new_tokens: {args.max_new_tokens}")
+    print(f"Critérios de parada: {'não' if args.sem_parada else 'sim'}")
+    for size in (int(x) for x in args.lotes.split(",")):
+        t0 = time.perf_counter()
+        generations = []
+        for start in range(0, len(prompts), size):
+            generations += generate_batch(
+                model, tokenizer, prompts[start:start + size], args.max_new_tokens, not args.sem_parada
+            )
+        elapsed = time.perf_counter() - t0
+        tokens = sum(g.new_tokens for g in generations) / len(generations)
+        rows = sum(
+            sum(is_csv_row(line.strip()) for line in g.text.splitlines()) for g in generations
+        ) / len(generations)
+        print(
+            f"lote {size:>2}: {len(prompts) / elapsed * 60:7.1f} releases/min ({elapsed:.1f}s), "
+            f"{tokens:.0f} tokens e {rows:.1f} linhas válidas por release"
+        )
+
+
+if __name__ == "__main__":
+    main()
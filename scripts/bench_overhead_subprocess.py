@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import sys
+import time
+
+from batch_engine import SCRIPTS_DIR
+from run_hf import build_prompt, load_code, load_prompt_template
+
+
+# Mede o custo fixo por release (sem rede) dos dois modos do batch:
+# - subprocess: interpretador novo + import de requests/run_hf + leitura de arquivos
+# - inprocess: só build_prompt, com template e código já carregados
+
+
+SUBPROCESS_SNIPPET = (
+    "import sys, run_hf; "
+    "t = run_hf.load_prompt_template(sys.argv[1]); "
+    "c = run_hf.load_code(sys.argv[2]); "
+    "run_hf.build_prompt(t, sys.argv[3], sys.argv[3], c)"
+)
+
+
+def bench_subprocess(n: int, code_file: str, prompt_file: str) -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        subprocess.run(
+            [sys.executable, "-c", SUBPROCESS_SNIPPET, prompt_file, code_file, f"v{i}"],
+            cwd=SCRIPTS_DIR,
+            check=True,
+        )
+    return (time.perf_counter() - t0) / n
+
+
+def bench_inprocess(n: int, code_file: str, prompt_file: str) -> float:
+    t0 = time.perf_counter()
+    template = load_prompt_template(prompt_file)
+    code = load_code(code_file)
+    for i in range(n):
+        build_prompt(template, f"v{i}", f"v{i}", code)
+    return (time.perf_counter() - t0) / n
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Uso:")
+        print("python scripts/bench_overhead_subprocess.py <arquivo_codigo> <arquivo_prompt> [n]")
+        sys.exit(1)
+
+    code_file = os.path.abspath(sys.argv[1])
+    prompt_file = os.path.abspath(sys.argv[2])
+    n = int(sys.argv[3]) if len(sys.argv) >= 4 else 20
+
+    sub = bench_subprocess(n, code_file, prompt_file)
+    inp = bench_inprocess(n, code_file, prompt_file)
+
+    print(f"Releases simuladas: {n}")
+    print(f"subprocess: {sub * 1000:.2f}ms por release")
+    print(f"inprocess:  {inp * 1000:.3f}ms por release")
+    print(f"Economia por release: {(sub - inp) * 1000:.2f}ms (sem contar o handshake TLS)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import argparse
+import copy
+import sys
+import time
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from colab_script_completo import PrefixCache, build_prompt, format_chat, load_prompt_template
+
+
+# Tempo de prefill por release com e sem o cache K/V do prefixo comum.
+# Roda em CPU com um modelo pequeno, ex.:
+#   python scripts/bench_prefix_cache.py releases/editor.ts prompt/code_smells_prompt_prefixo.txt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do cache de prefixo na geração local.")
+    parser.add_argument("arquivo_codigo")
+    parser.add_argument("arquivo_prompt")
+    parser.add_argument("--modelo", default="Qwen/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--releases", type=int, default=8)
+    parser.add_argument("--max-chars", type=int, default=8000, help="corte do código, em caracteres")
+    args = parser.parse_args(sys.argv[1:])
+
+    tokenizer = AutoTokenizer.from_pretrained(args.modelo)
+    model = AutoModelForCausalLM.from_pretrained(args.modelo, torch_dtype=torch.float32)
+    model.eval()
+
+    template = load_prompt_template(args.arquivo_prompt)
+    with open(args.arquivo_codigo, "r", encoding="utf-8", errors="ignore") as f:
+        code = f.read()[: args.max_chars]
+    releases = [(f"v1.{i}.0", f"Correções e melhorias da versão 1.{i}.0") for i in range(args.releases)]
+
+    prefix = PrefixCache(model, tokenizer, template, code)
+    print(f"Modelo: {args.modelo} (CPU, {torch.get_num_threads()} threads)")
+    print(f"Prefixo: {prefix.prefix_ids.shape[1]} tokens, prefill único em {prefix.prefill_s:.2f}s")
+
+    full_s = 0.0
+    cached_s = 0.0
+    full_tokens = 0
+    suffix_tokens = 0
+    with torch.no_grad():
+        for release, desc in releases:
+            text = format_chat(tokenizer, build_prompt(template, release, desc, code))
+            ids = tokenizer(text, return_tensors="pt").input_ids
+            t0 = time.perf_counter()
+            model(input_ids=ids, use_cache=True)
+            full_s += time.perf_counter() - t0
+            full_tokens += ids.shape[1]
+
+            suffix = tokenizer(
+                text[len(prefix.prefix_text):], add_special_tokens=False, return_tensors="pt"
+            ).input_ids
+            t0 = time.perf_counter()
+            model(input_ids=suffix, past_key_values=copy.deepcopy(prefix.cache), use_cache=True)
+            cached_s += time.perf_counter() - t0
+            suffix_tokens += suffix.shape[1]
+
+    n = len(releases)
+    print(f"sem cache: {full_s / n * 1000:8.1f} ms/release ({full_tokens / n:.0f} tokens)")
+    print(f"com cache: {cached_s / n * 1000:8.1f} ms/release ({suffix_tokens / n:.0f} tokens)")
+    if cached_s:
+        print(f"speedup do prefill: x{full_s / cached_s:.1f}")
+
+
+if __name__ == "__main__":
+    main()
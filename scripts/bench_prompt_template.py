@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import time
+import tracemalloc
+
+from prompt_template import PromptTemplate
+from run_hf import load_code, load_prompt_template
+
+
+# Custo de montar um prompt por release: três str.replace encadeados (como
+# era o build_prompt) contra o template compilado, com o código variando a
+# cada release (run_hf_batch) ou fixo no template (BatchEngine).
+
+
+def replace_chain(template: str, release: str, desc: str, code: str) -> str:
+    return (
+        template.replace("{{RELEASE}}", release)
+        .replace("{{DESCRICAO_RELEASE}}", desc)
+        .replace("{{CODIGO}}", code)
+    )
+
+
+def measure(label: str, fn, n: int) -> None:
+    fn(0)
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    per_call = (time.perf_counter() - t0) / n
+
+    # alocações de uma montagem: pico de memória e blocos que ficaram no meio do caminho
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    result = fn(1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    transient = peak - before - sys.getsizeof(result)
+    print(
+        f"{label:<24} {per_call * 1e6:8.2f}us/prompt  pico {(peak - before) / 1024:7.1f} KB  "
+        f"intermediário {max(0, transient) / 1024:6.1f} KB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara as formas de montar o prompt de cada release.")
+    parser.add_argument("arquivo_codigo")
+    parser.add_argument("arquivo_prompt")
+    parser.add_argument("-n", type=int, default=20_000)
+    args = parser.parse_args(sys.argv[1:])
+
+    text = load_prompt_template(args.arquivo_prompt)
+    code = load_code(args.arquivo_codigo)
+    compiled = PromptTemplate(text)
+    bound = compiled.bind(CODIGO=code)
+    print(f"Template: {len(text)} caracteres, código: {len(code)} caracteres, {args.n} prompts")
+
+    expected = replace_chain(text, "v1.0.1", "v1.0.1", code)
+    assert compiled.build("v1.0.1", "v1.0.1", code) == expected
+    assert bound.build("v1.0.1", "v1.0.1") == expected
+
+    measure("str.replace x3", lambda i: replace_chain(text, f"v1.0.{i}", f"v1.0.{i}", code), args.n)
+    measure("compilado", lambda i: compiled.build(f"v1.0.{i}", f"v1.0.{i}", code), args.n)
+    measure("compilado + código fixo", lambda i: bound.build(f"v1.0.{i}", f"v1.0.{i}"), args.n)
+
+
+if __name__ == "__main__":
+    main()
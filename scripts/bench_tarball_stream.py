@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import base64
+import io
+import random
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import http_client
+from run_hf_batch import MAX_CHARS, download_tarball, load_release_code, stream_text_from_tarball
+from tarball_cache import TarballCache
+
+
+# Compara o caminho antigo (baixar o tarball inteiro + getmembers) com o
+# streaming e com o cache local de tarballs, servindo um tarball sintético
+# a partir de um servidor local.
+
+
+def build_tarball(n_files: int, file_bytes: int) -> bytes:
+    rng = random.Random(0)
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for i in range(n_files):
+            data = base64.b64encode(rng.randbytes(file_bytes * 3 // 4))
+            info = tarfile.TarInfo(f"repo-abc123/src/module_{i:05d}.ts")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+class TarballHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    blob = b""
+    sent = 0
+
+    def do_GET(self):
+        etag = '"bench-v1"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/x-gzip")
+        self.send_header("Content-Length", str(len(self.blob)))
+        self.end_headers()
+        try:
+            for i in range(0, len(self.blob), 64 * 1024):
+                self.wfile.write(self.blob[i:i + 64 * 1024])
+                TarballHandler.sent += min(64 * 1024, len(self.blob) - i)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def old_path(url: str) -> str:
+    blob = download_tarball(url, None)
+    texts = []
+    total = 0
+    with tarfile.open(fileobj=io.BytesIO(blob), mode="r:gz") as tar:
+        for member in tar.getmembers():
+            extracted = tar.extractfile(member)
+            if not extracted:
+                continue
+            content = extracted.read().decode("utf-8", errors="ignore")
+            chunk = content[: MAX_CHARS - total]
+            texts.append(f"// {member.name}\n{chunk}")
+            total += len(chunk)
+            if total >= MAX_CHARS:
+                break
+    return "\n\n".join(texts)
+
+
+def measure(label: str, fn, url: str) -> None:
+    TarballHandler.sent = 0
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    text = fn(url)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    time.sleep(0.05)
+    print(
+        f"{label:<10} {elapsed * 1000:8.1f}ms  pico {peak / 1e6:7.2f} MB  "
+        f"enviados {TarballHandler.sent / 1e6:7.2f} MB  {len(text)} caracteres"
+    )
+
+
+def main():
+    n_files = int(sys.argv[1]) if len(sys.argv) >= 2 else 4000
+    file_bytes = int(sys.argv[2]) if len(sys.argv) >= 3 else 20_000
+
+    TarballHandler.blob = build_tarball(n_files, file_bytes)
+    print(
+        f"Tarball sintético: {n_files} arquivos, "
+        f"{len(TarballHandler.blob) / 1e6:.1f} MB comprimido"
+    )
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TarballHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/tarball/v1.0.0"
+
+    measure("antigo", old_path, url)
+    measure("streaming", lambda u: stream_text_from_tarball(u, None, MAX_CHARS), url)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TarballCache(tmp)
+        measure("cache 1ª", lambda u: load_release_code(u, None, cache), url)
+        measure("cache 304", lambda u: load_release_code(u, None, cache), url)
+        cache.revalidate = False
+        measure("cache fixo", lambda u: load_release_code(u, None, cache), url)
+        print(cache.stats.report())
+
+    server.shutdown()
+    http_client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import json
+import os
+
+
+# Journal de checkpoint ao lado do CSV de saída (<saida>.journal).
+# Cada linha registra um par (modelo, release) concluído e o tamanho do CSV
+# logo depois da escrita. Na retomada, o CSV é truncado para o último tamanho
+# registrado, o que descarta linhas parciais de uma escrita interrompida.
+
+
+class CheckpointJournal:
+    def __init__(self, out_csv: str):
+        self.out_csv = out_csv
+        self.path = f"{out_csv}.journal"
+        self.done: set[tuple[str, str]] = set()
+        self._fh = None
+        self._load()
+
+    def _load(self) -> None:
+        csv_size = os.path.getsize(self.out_csv) if os.path.exists(self.out_csv) else 0
+        if not os.path.exists(self.path):
+            # marca o tamanho inicial, para não perder linhas de execuções antigas
+            self.commit(None, None, csv_size)
+            return
+
+        entries = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    offset = entry["offset"]
+                except (json.JSONDecodeError, TypeError, KeyError):
+                    # última linha cortada por uma queda no meio da escrita
+                    break
+                # o journal pode estar à frente do CSV se o disco perdeu dados
+                if offset > csv_size:
+                    break
+                entries.append(entry)
+
+        if not entries:
+            # nem a marca inicial é válida (linha vazia, cortada ou à frente do
+            # CSV): não há como saber o que foi confirmado, então o CSV fica
+            # inteiro e vira a nova marca inicial
+            print(f"Checkpoint: {self.path} sem entradas válidas; {self.out_csv} mantido como está")
+            entries.append({"model": None, "release": None, "offset": csv_size})
+        committed = entries[-1]["offset"]
+        if csv_size > committed:
+            with open(self.out_csv, "r+b") as f:
+                f.truncate(committed)
+            print(f"Checkpoint: {csv_size - committed} bytes não confirmados removidos de {self.out_csv}")
+
+        self.done = {(e["model"], e["release"]) for e in entries if e["release"] is not None}
+
+        # reescreve o journal só com as entradas válidas
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for e in entries:
+                f.write(json.dumps(e, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+
+    def is_done(self, model: str, release: str) -> bool:
+        return (model, release) in self.done
+
+    def commit(self, model: str | None, release: str | None, offset: int) -> None:
+        if self._fh is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._fh = open(self.path, "a", encoding="utf-8")
+        entry = {"model": model, "release": release, "offset": offset}
+        self._fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        if release is not None:
+            self.done.add((model, release))
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
@@ -11,74 +11,135 @@ INSTRUÇÕES DE USO NO GOOGLE COLAB:
 5. Execute a célula (Ctrl+Enter)
 6. Siga as instruções que aparecerão na tela
 
-Tempo estimado: ~1h15min com GPU
+Tempo estimado: ~1h15min com GPU, gerando uma release por vez.
+
+As releases são geradas em lotes de BATCH_SIZE prompts por chamada a
+model.generate; aumente o valor se a GPU tiver memória sobrando.
+
+SEM GPU (CI, máquina local): troque o backend das entradas de MODELOS para
+"cpu" ou "cpu-int8", deixe os arquivos em data/, releases/ e prompt/ e rode
+python scripts/colab_script_completo.py. CPU_THREADS limita as threads do torch.
 """
 
+import copy
+import csv
+import glob
+import os
+import subprocess
+from dataclasses import dataclass
+from time import time
+
+# Dependências: instaladas aqui, antes dos imports do torch/transformers. Um
+# pip install depois do import não teria efeito sobre os módulos já
+# carregados. accelerate é exigido pelo device_map="auto" do backend gpu.
+try:
+    import accelerate
+    import torch
+    import transformers
+except ImportError:
+    print("🔧 Instalando dependências...")
+    subprocess.run(["pip", "install", "-q", "transformers", "accelerate", "torch"], check=True)
+    import torch
+
+from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteria, StoppingCriteriaList
+
+# releases por chamada a model.generate
+BATCH_SIZE = 4
+
+# Reaproveita o cache K/V do prefixo comum (sistema + instruções + código) entre
+# as releases. Rende mais com prompt/code_smells_prompt_prefixo.txt, que deixa
+# release e descrição no fim. Troca o lote de BATCH_SIZE por uma release por
+# chamada a generate: compensa quando o prefill do prompt domina (código longo,
+# respostas curtas); com respostas longas, o lote costuma render mais.
+USAR_CACHE_PREFIXO = False
+
+# Critérios de parada da geração local (além do eos e de max_new_tokens):
+# linha em branco depois das linhas CSV, linha CSV idêntica repetida e número
+# máximo de linhas válidas. 0 desliga o critério correspondente.
+PARAR_GERACAO = True
+MAX_LINHAS_VALIDAS = 40
+MAX_REPETICOES = 1
+
+# Backends de inferência; cada entrada de MODELOS escolhe o seu.
+#   gpu      float16 com device_map="auto" (requer CUDA)
+#   cpu      float32 na CPU
+#   cpu-int8 float32 na CPU com quantização dinâmica int8 das camadas Linear
+BACKENDS = ("gpu", "cpu", "cpu-int8")
+
+# threads do torch na CPU; 0 mantém o padrão (um por núcleo físico)
+CPU_THREADS = int(os.getenv("CPU_THREADS", "0"))
+
 # ============================================================================
-# PASSO 1: VERIFICAR GPU E INSTALAR DEPENDÊNCIAS
+# PASSO 1: VERIFICAR GPU (as dependências são instaladas no topo do arquivo)
 # ============================================================================
 
-print("🔧 Instalando dependências...")
-import subprocess
-subprocess.run(["pip", "install", "-q", "transformers", "accelerate", "torch"], check=True)
-
-import torch
-print(f"\n{'='*60}")
-print("🎮 VERIFICAÇÃO DE GPU")
-print(f"{'='*60}")
-print(f"GPU disponível: {torch.cuda.is_available()}")
-if torch.cuda.is_available():
-    print(f"GPU: {torch.cuda.get_device_name(0)}")
-    print(f"Memória: {torch.cuda.get_device_properties(0).total_memory / 1e9:.2f} GB")
-else:
-    print("⚠️  ATENÇÃO: GPU não detectada! Vá em Runtime → Change runtime type → GPU")
-    exit()
+def verificar_gpu(backends=BACKENDS):
+    print(f"\n{'='*60}")
+    print("🎮 VERIFICAÇÃO DE GPU")
+    print(f"{'='*60}")
+    print(f"GPU disponível: {torch.cuda.is_available()}")
+    if torch.cuda.is_available():
+        print(f"GPU: {torch.cuda.get_device_name(0)}")
+        print(f"Memória: {torch.cuda.get_device_properties(0).total_memory / 1e9:.2f} GB")
+    elif "gpu" in backends:
+        print("⚠️  ATENÇÃO: GPU não detectada! Vá em Runtime → Change runtime type → GPU")
+        exit()
+    else:
+        print(f"Usando CPU ({torch.get_num_threads()} threads)")
 
 # ============================================================================
 # PASSO 2: UPLOAD DOS ARQUIVOS
 # ============================================================================
 
-from google.colab import files
-import os
-
-# Criar estrutura de pastas
-os.makedirs("data", exist_ok=True)
-os.makedirs("releases", exist_ok=True)
-os.makedirs("prompt", exist_ok=True)
-os.makedirs("analises", exist_ok=True)
-
-print(f"\n{'='*60}")
-print("📤 UPLOAD DE ARQUIVOS")
-print(f"{'='*60}\n")
-
-print("1️⃣ Faça upload do CSV de releases:")
-print("   Arquivo: releases_CherryHQ_cherry-studio_...sample_30pct.csv\n")
-uploaded = files.upload()
-for filename in uploaded.keys():
-    os.rename(filename, f"data/{filename}")
-    print(f"✅ {filename} salvo em data/\n")
-
-print("2️⃣ Faça upload do código TypeScript:")
-print("   Arquivo: editor.ts\n")
-uploaded = files.upload()
-for filename in uploaded.keys():
-    os.rename(filename, f"releases/{filename}")
-    print(f"✅ {filename} salvo em releases/\n")
-
-print("3️⃣ Faça upload do prompt:")
-print("   Arquivo: code_smells_prompt.txt\n")
-uploaded = files.upload()
-for filename in uploaded.keys():
-    os.rename(filename, f"prompt/{filename}")
-    print(f"✅ {filename} salvo em prompt/\n")
+def upload_arquivos():
+    try:
+        from google.colab import files
+    except ImportError:
+        # fora do Colab (CI, máquina local) os arquivos já estão nas pastas
+        print("ℹ️  Fora do Colab: usando data/, releases/ e prompt/ locais")
+        return
+
+    # Criar estrutura de pastas
+    os.makedirs("data", exist_ok=True)
+    os.makedirs("releases", exist_ok=True)
+    os.makedirs("prompt", exist_ok=True)
+    os.makedirs("analises", exist_ok=True)
+
+    print(f"\n{'='*60}")
+    print("📤 UPLOAD DE ARQUIVOS")
+    print(f"{'='*60}\n")
+
+    print("1️⃣ Faça upload do CSV de releases:")
+    print("   Arquivo: releases_CherryHQ_cherry-studio_...sample_30pct.csv\n")
+    uploaded = files.upload()
+    for filename in uploaded.keys():
+        os.rename(filename, f"data/{filename}")
+        print(f"✅ {filename} salvo em data/\n")
+
+    print("2️⃣ Faça upload do código TypeScript:")
+    print("   Arquivo: editor.ts\n")
+    uploaded = files.upload()
+    for filename in uploaded.keys():
+        os.rename(filename, f"releases/{filename}")
+        print(f"✅ {filename} salvo em releases/\n")
+
+    print("3️⃣ Faça upload do prompt:")
+    print("   Arquivo: code_smells_prompt_prefixo.txt (ou code_smells_prompt.txt)\n")
+    uploaded = files.upload()
+    for filename in uploaded.keys():
+        os.rename(filename, f"prompt/{filename}")
+        print(f"✅ {filename} salvo em prompt/\n")
 
 # ============================================================================
 # PASSO 3: FUNÇÕES DE PROCESSAMENTO
 # ============================================================================
 
-import csv
-from time import time
-from transformers import AutoTokenizer, AutoModelForCausalLM
+SYSTEM_MESSAGE = (
+    "Responda somente com CSV separado por ponto e vírgula. "
+    "Não use markdown. Não escreva explicações. "
+    "Não escreva tags como <think>. "
+    "Não repita o cabeçalho."
+)
 
 def load_prompt_template(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
@@ -91,52 +152,263 @@ def build_prompt(template: str, release: str, desc: str, code: str) -> str:
         .replace("{{CODIGO}}", code)
     )
 
-def load_model(model_name: str):
-    print(f"\n📥 Carregando: {model_name}")
+def load_model(model_name: str, backend: str = "gpu"):
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {backend} (use {', '.join(BACKENDS)})")
+    print(f"\n📥 Carregando: {model_name} ({backend})")
     tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForCausalLM.from_pretrained(
-        model_name,
-        torch_dtype=torch.float16,
-        device_map="auto",
-        low_cpu_mem_usage=True
-    )
+
+    if backend == "gpu":
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            torch_dtype=torch.float16,
+            device_map="auto",
+            low_cpu_mem_usage=True
+        )
+    else:
+        if CPU_THREADS:
+            torch.set_num_threads(CPU_THREADS)
+        # float16 na CPU é lento e a quantização dinâmica parte de float32
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            torch_dtype=torch.float32,
+            low_cpu_mem_usage=True
+        )
+        if backend == "cpu-int8":
+            # pesos das Linear em int8; ativações quantizadas em tempo de execução
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+    model.eval()
     print(f"✅ Modelo carregado!\n")
     return model, tokenizer
 
-def generate_response(model, tokenizer, prompt: str) -> str:
+def format_chat(tokenizer, prompt: str) -> str:
     messages = [
-        {
-            "role": "system",
-            "content": (
-                "Responda somente com CSV separado por ponto e vírgula. "
-                "Não use markdown. Não escreva explicações. "
-                "Não escreva tags como <think>. "
-                "Não repita o cabeçalho."
-            ),
-        },
+        {"role": "system", "content": SYSTEM_MESSAGE},
         {"role": "user", "content": prompt},
     ]
-    
-    formatted_prompt = tokenizer.apply_chat_template(
+    return tokenizer.apply_chat_template(
         messages, tokenize=False, add_generation_prompt=True
     )
-    
-    inputs = tokenizer(formatted_prompt, return_tensors="pt").to("cuda")
-    
+
+STOP_EOS = "eos"
+STOP_MAX_TOKENS = "max_new_tokens"
+STOP_BLANK = "linha_em_branco"
+STOP_REPETITION = "repeticao"
+STOP_ROWS = "limite_linhas"
+
+@dataclass
+class Generation:
+    text: str
+    stop_reason: str
+    new_tokens: int
+
+def is_csv_row(line: str) -> bool:
+    return line.count(";") >= 2 and not line.lower().startswith("release;")
+
+class CsvStoppingCriteria(StoppingCriteria):
+    # Confere as linhas completas de cada sequência a cada "\n" gerado e
+    # encerra a sequência quando a resposta já acabou ou entrou em laço.
+    # cut[i] guarda até onde o texto gerado vale (a linha repetida e o que
+    # vem depois da linha em branco ficam de fora).
+
+    def __init__(self, tokenizer, prompt_len: int, batch_size: int,
+                 max_rows: int = MAX_LINHAS_VALIDAS, max_repeats: int = MAX_REPETICOES):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.max_rows = max_rows
+        self.max_repeats = max_repeats
+        self.reasons = [None] * batch_size
+        self.cut = [None] * batch_size
+        self.lengths = [None] * batch_size
+        self._pos = [0] * batch_size
+        self._rows = [0] * batch_size
+        self._repeats = [0] * batch_size
+        self._seen = [set() for _ in range(batch_size)]
+        self._blank_at = [None] * batch_size
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = []
+        for i, seq in enumerate(input_ids):
+            if self.reasons[i] is None and "\n" in self.tokenizer.decode(seq[-1:]):
+                text = self.tokenizer.decode(seq[self.prompt_len:], skip_special_tokens=True)
+                reason = self._scan(i, text)
+                if reason:
+                    self.reasons[i] = reason
+                    self.lengths[i] = seq.shape[0] - self.prompt_len
+            done.append(self.reasons[i] is not None)
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    def _scan(self, i: int, text: str):
+        end = text.rfind("\n")
+        while self._pos[i] <= end:
+            start = self._pos[i]
+            nl = text.index("\n", start)
+            self._pos[i] = nl + 1
+            line = text[start:nl].strip()
+
+            if not line:
+                if self._rows[i] and self._blank_at[i] is None:
+                    self._blank_at[i] = start
+                continue
+            if not is_csv_row(line):
+                # linha em branco seguida de algo que não é CSV: a resposta acabou
+                if self._blank_at[i] is not None:
+                    self.cut[i] = self._blank_at[i]
+                    return STOP_BLANK
+                continue
+            self._blank_at[i] = None
+
+            key = line.lower()
+            if key in self._seen[i]:
+                self._repeats[i] += 1
+                if self.max_repeats and self._repeats[i] >= self.max_repeats:
+                    self.cut[i] = start
+                    return STOP_REPETITION
+                continue
+            self._seen[i].add(key)
+            self._rows[i] += 1
+            if self.max_rows and self._rows[i] >= self.max_rows:
+                self.cut[i] = nl + 1
+                return STOP_ROWS
+        return None
+
+def finish_generations(tokenizer, outputs, prompt_len: int, criteria) -> list[Generation]:
+    results = []
+    for i, out in enumerate(outputs):
+        generated = out[prompt_len:]
+        text = tokenizer.decode(generated, skip_special_tokens=True)
+        reason = criteria.reasons[i] if criteria is not None else None
+        if reason is not None:
+            text = text[:criteria.cut[i]]
+            new_tokens = criteria.lengths[i]
+        else:
+            eos = (generated == tokenizer.eos_token_id).nonzero()
+            if len(eos):
+                reason, new_tokens = STOP_EOS, int(eos[0]) + 1
+            else:
+                reason, new_tokens = STOP_MAX_TOKENS, len(generated)
+        results.append(Generation(text.strip(), reason, new_tokens))
+    return results
+
+def generate_batch(model, tokenizer, prompts: list[str], max_new_tokens: int = 900,
+                   stop: bool = PARAR_GERACAO) -> list[Generation]:
+    # Vários prompts em uma única chamada a generate. O padding fica à
+    # esquerda para que todas as sequências terminem alinhadas e a geração
+    # comece na mesma posição; a saída i corresponde ao prompt i.
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+
+    formatted = [format_chat(tokenizer, p) for p in prompts]
+    inputs = tokenizer(formatted, return_tensors="pt", padding=True).to(model.device)
+    prompt_len = inputs["input_ids"].shape[1]
+    criteria = CsvStoppingCriteria(tokenizer, prompt_len, len(prompts)) if stop else None
+
     with torch.no_grad():
         outputs = model.generate(
             **inputs,
-            max_new_tokens=900,
+            max_new_tokens=max_new_tokens,
             temperature=0.2,
             do_sample=True,
-            pad_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.pad_token_id,
             eos_token_id=tokenizer.eos_token_id,
+            stopping_criteria=StoppingCriteriaList([criteria]) if criteria else None,
+        )
+
+    return finish_generations(tokenizer, outputs, prompt_len, criteria)
+
+def generate_responses(model, tokenizer, prompts: list[str], max_new_tokens: int = 900) -> list[str]:
+    return [g.text for g in generate_batch(model, tokenizer, prompts, max_new_tokens)]
+
+def generate_response(model, tokenizer, prompt: str) -> str:
+    return generate_responses(model, tokenizer, [prompt])[0]
+
+def stop_report(generations: list[Generation]) -> str:
+    if not generations:
+        return ""
+    reasons = {}
+    for g in generations:
+        reasons[g.stop_reason] = reasons.get(g.stop_reason, 0) + 1
+    mean = sum(g.new_tokens for g in generations) / len(generations)
+    detail = ", ".join(f"{k}={v}" for k, v in sorted(reasons.items()))
+    return f"Tokens gerados por release: {mean:.0f} em média; paradas: {detail}"
+
+class PrefixCache:
+    # Calcula uma vez, por modelo, o cache K/V de tudo o que vem antes do
+    # primeiro campo variável do prompt ({{RELEASE}} ou {{DESCRICAO_RELEASE}}).
+    # Cada release só faz o prefill do seu sufixo.
+    #
+    # O prompt de cada release é tokenizado inteiro, como em generate_batch, e
+    # o cache só é usado quando os primeiros tokens são exatamente prefix_ids:
+    # assim a entrada do modelo é a mesma do caminho sem cache. O último token
+    # do texto do prefixo fica fora, porque pode se fundir com o que vem depois
+    # (SentencePiece); se ainda assim os tokens não baterem, a release vai pelo
+    # caminho normal.
+
+    MARKER_RELEASE = "\ue000RELEASE\ue000"
+    MARKER_DESC = "\ue000DESC\ue000"
+
+    def __init__(self, model, tokenizer, template: str, code: str):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.template = template
+        self.code = code
+
+        full = format_chat(tokenizer, build_prompt(template, self.MARKER_RELEASE, self.MARKER_DESC, code))
+        cuts = [i for i in (full.find(self.MARKER_RELEASE), full.find(self.MARKER_DESC)) if i >= 0]
+        if not cuts:
+            raise ValueError("O template precisa de {{RELEASE}} ou {{DESCRICAO_RELEASE}}")
+        self.prefix_text = full[:min(cuts)]
+
+        prefix_ids = tokenizer(self.prefix_text, return_tensors="pt").input_ids
+        self.prefix_ids = prefix_ids[:, :-1].to(model.device)
+        start = time()
+        with torch.no_grad():
+            self.cache = model(input_ids=self.prefix_ids, use_cache=True).past_key_values
+        self.prefill_s = time() - start
+        self.suffix_tokens = []
+        self.fallbacks = 0
+
+    def generate(self, release: str, desc: str, max_new_tokens: int = 900) -> Generation:
+        prompt = build_prompt(self.template, release, desc, self.code)
+        input_ids = self.tokenizer(
+            format_chat(self.tokenizer, prompt), return_tensors="pt"
+        ).input_ids.to(self.model.device)
+        n = self.prefix_ids.shape[1]
+        if input_ids.shape[1] <= n or not torch.equal(input_ids[:, :n], self.prefix_ids):
+            self.fallbacks += 1
+            return generate_batch(self.model, self.tokenizer, [prompt], max_new_tokens)[0]
+
+        self.suffix_tokens.append(input_ids.shape[1] - n)
+        prompt_len = input_ids.shape[1]
+        criteria = CsvStoppingCriteria(self.tokenizer, prompt_len, 1) if PARAR_GERACAO else None
+
+        # generate estende o cache; a cópia preserva o prefixo para a próxima release
+        with torch.no_grad():
+            outputs = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=copy.deepcopy(self.cache),
+                max_new_tokens=max_new_tokens,
+                temperature=0.2,
+                do_sample=True,
+                pad_token_id=self.tokenizer.eos_token_id,
+                eos_token_id=self.tokenizer.eos_token_id,
+                stopping_criteria=StoppingCriteriaList([criteria]) if criteria else None,
+            )
+
+        return finish_generations(self.tokenizer, outputs, prompt_len, criteria)[0]
+
+    def report(self) -> str:
+        mean_suffix = sum(self.suffix_tokens) / len(self.suffix_tokens) if self.suffix_tokens else 0
+        return (
+            f"Prefixo: {self.prefix_ids.shape[1]} tokens (prefill único em {self.prefill_s:.1f}s); "
+            f"sufixo médio por release: {mean_suffix:.0f} tokens; "
+            f"{self.fallbacks} releases sem o cache (tokens do prefixo diferentes)"
         )
-    
-    return tokenizer.decode(
-        outputs[0][inputs['input_ids'].shape[1]:], 
-        skip_special_tokens=True
-    ).strip()
 
 def append_csv(out_path: str, csv_text: str, release: str, desc: str):
     write_header = not os.path.exists(out_path) or os.path.getsize(out_path) == 0
@@ -160,92 +432,151 @@ def append_csv(out_path: str, csv_text: str, release: str, desc: str):
         if kept_lines:
             f.write("\n".join(kept_lines) + "\n")
 
+def release_fields(row: dict, i: int) -> tuple[str, str]:
+    release = (row.get("tag_name") or row.get("name") or f"release_{i}").strip()
+    desc = (row.get("name") or "").strip()
+    return release, desc
+
+def batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield start, items[start:start + size]
+
 # ============================================================================
 # PASSO 4: CARREGAR DADOS
 # ============================================================================
 
-import glob
+def carregar_dados():
+    csv_files = glob.glob("data/*.csv")
+    code_files = glob.glob("releases/*.ts") + glob.glob("releases/*.js")
+    prompt_files = glob.glob("prompt/*.txt")
 
-csv_files = glob.glob("data/*.csv")
-code_files = glob.glob("releases/*.ts") + glob.glob("releases/*.js")
-prompt_files = glob.glob("prompt/*.txt")
+    if not csv_files or not code_files or not prompt_files:
+        print("❌ Erro: Arquivos não encontrados! Faça upload novamente.")
+        exit()
 
-if not csv_files or not code_files or not prompt_files:
-    print("❌ Erro: Arquivos não encontrados! Faça upload novamente.")
-    exit()
+    RELEASES_CSV = csv_files[0]
+    CODE_FILE = code_files[0]
+    PROMPT_FILE = prompt_files[0]
 
-RELEASES_CSV = csv_files[0]
-CODE_FILE = code_files[0]
-PROMPT_FILE = prompt_files[0]
+    with open(RELEASES_CSV, newline="", encoding="utf-8") as f:
+        releases = list(csv.DictReader(f))
 
-with open(RELEASES_CSV, newline="", encoding="utf-8") as f:
-    releases = list(csv.DictReader(f))
+    with open(CODE_FILE, "r", encoding="utf-8", errors="ignore") as f:
+        code = f.read()[:20000]  # Limita a 20k chars
 
-with open(CODE_FILE, "r", encoding="utf-8", errors="ignore") as f:
-    code = f.read()[:20000]  # Limita a 20k chars
+    prompt_template = load_prompt_template(PROMPT_FILE)
 
-prompt_template = load_prompt_template(PROMPT_FILE)
+    print(f"\n{'='*60}")
+    print("📊 DADOS CARREGADOS")
+    print(f"{'='*60}")
+    print(f"✅ {len(releases)} releases encontradas")
+    print(f"✅ Código: {len(code)} caracteres")
+    print(f"✅ Prompt carregado\n")
 
-print(f"\n{'='*60}")
-print("📊 DADOS CARREGADOS")
-print(f"{'='*60}")
-print(f"✅ {len(releases)} releases encontradas")
-print(f"✅ Código: {len(code)} caracteres")
-print(f"✅ Prompt carregado\n")
+    return releases, code, prompt_template
 
 # ============================================================================
 # PASSO 5: PROCESSAR COM OS 3 MODELOS
 # ============================================================================
 
+# (modelo, arquivo de saída, backend)
 MODELOS = [
-    ("Qwen/Qwen2.5-0.5B-Instruct", "analises/qwen_resultados.csv"),
-    ("microsoft/Phi-3-mini-4k-instruct", "analises/phi3_resultados.csv"),
-    ("Qwen/Qwen2.5-3B-Instruct", "analises/qwen3b_resultados.csv"),
+    ("Qwen/Qwen2.5-0.5B-Instruct", "analises/qwen_resultados.csv", "gpu"),
+    ("microsoft/Phi-3-mini-4k-instruct", "analises/phi3_resultados.csv", "gpu"),
+    ("Qwen/Qwen2.5-3B-Instruct", "analises/qwen3b_resultados.csv", "gpu"),
 ]
 
-for model_name, output_file in MODELOS:
-    print(f"\n{'='*70}")
-    print(f"🚀 PROCESSANDO: {model_name}")
-    print(f"{'='*70}\n")
-    
-    start = time()
-    model, tokenizer = load_model(model_name)
-    
+def processar_releases(model, tokenizer, releases, code, prompt_template, output_file, batch_size=BATCH_SIZE):
+    total = len(releases)
+    generations = []
+    for start, batch in batches(releases, batch_size):
+        fields = [release_fields(row, start + j) for j, row in enumerate(batch, start=1)]
+        print(f"[{start + 1}-{start + len(batch)}/{total}] {', '.join(r for r, _ in fields)}...", end=" ", flush=True)
+
+        try:
+            prompts = [build_prompt(prompt_template, release, desc, code) for release, desc in fields]
+            results = generate_batch(model, tokenizer, prompts)
+            generations.extend(results)
+            print("✅ " + " ".join(f"{g.new_tokens}t/{g.stop_reason}" for g in results))
+        except Exception as e:
+            print(f"❌ {str(e)[:50]}")
+            results = [Generation("", "erro", 0)] * len(batch)
+
+        # uma linha de resultado por release, na ordem do CSV
+        for (release, desc), result in zip(fields, results):
+            append_csv(output_file, result.text, release, desc)
+    print(stop_report(generations))
+
+def processar_releases_prefixo(model, tokenizer, releases, code, prompt_template, output_file):
+    prefix = PrefixCache(model, tokenizer, prompt_template, code)
+    total = len(releases)
+    generations = []
     for i, row in enumerate(releases, start=1):
-        release = (row.get("tag_name") or row.get("name") or f"release_{i}").strip()
-        desc = (row.get("name") or "").strip()
-        
-        print(f"[{i}/{len(releases)}] {release}...", end=" ", flush=True)
-        
+        release, desc = release_fields(row, i)
+        print(f"[{i}/{total}] {release}...", end=" ", flush=True)
+
         try:
-            prompt = build_prompt(prompt_template, release, desc, code)
-            result = generate_response(model, tokenizer, prompt)
-            append_csv(output_file, result, release, desc)
-            print("✅")
+            result = prefix.generate(release, desc)
+            generations.append(result)
+            append_csv(output_file, result.text, release, desc)
+            print(f"✅ {result.new_tokens}t/{result.stop_reason}")
         except Exception as e:
             print(f"❌ {str(e)[:50]}")
             append_csv(output_file, "", release, desc)
-    
-    del model, tokenizer
-    torch.cuda.empty_cache()
-    
-    elapsed = time() - start
-    print(f"\n✅ Concluído em {elapsed/60:.1f} minutos")
-    print(f"📁 {output_file}\n")
+    print(prefix.report())
+    print(stop_report(generations))
+
+def processar_modelos(releases, code, prompt_template):
+    for model_name, output_file, backend in MODELOS:
+        print(f"\n{'='*70}")
+        print(f"🚀 PROCESSANDO: {model_name}")
+        print(f"{'='*70}\n")
+
+        start = time()
+        model, tokenizer = load_model(model_name, backend)
+
+        if USAR_CACHE_PREFIXO:
+            processar_releases_prefixo(model, tokenizer, releases, code, prompt_template, output_file)
+        else:
+            processar_releases(model, tokenizer, releases, code, prompt_template, output_file)
+
+        del model, tokenizer
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+        elapsed = time() - start
+        print(f"\n✅ Concluído em {elapsed/60:.1f} minutos")
+        print(f"📁 {output_file}\n")
 
 # ============================================================================
 # PASSO 6: DOWNLOAD DOS RESULTADOS
 # ============================================================================
 
-print(f"\n{'='*60}")
-print("📥 DOWNLOAD DOS RESULTADOS")
-print(f"{'='*60}\n")
-
-for _, output_file in MODELOS:
-    if os.path.exists(output_file):
-        print(f"⬇️  Baixando {os.path.basename(output_file)}...")
-        files.download(output_file)
-
-print("\n✅ PROCESSAMENTO COMPLETO!")
-print("✅ Todos os arquivos foram baixados!")
-print(f"\n⏱️  Tempo total: {(time() - start)/60:.1f} minutos")
+def download_resultados():
+    try:
+        from google.colab import files
+    except ImportError:
+        print("\n✅ PROCESSAMENTO COMPLETO! Resultados em analises/")
+        return
+
+    print(f"\n{'='*60}")
+    print("📥 DOWNLOAD DOS RESULTADOS")
+    print(f"{'='*60}\n")
+
+    for _, output_file, _ in MODELOS:
+        if os.path.exists(output_file):
+            print(f"⬇️  Baixando {os.path.basename(output_file)}...")
+            files.download(output_file)
+
+    print("\n✅ PROCESSAMENTO COMPLETO!")
+    print("✅ Todos os arquivos foram baixados!")
+
+
+if __name__ == "__main__":
+    inicio = time()
+    verificar_gpu({backend for _, _, backend in MODELOS})
+    upload_arquivos()
+    releases, code, prompt_template = carregar_dados()
+    processar_modelos(releases, code, prompt_template)
+    download_resultados()
+    print(f"\n⏱️  Tempo total: {(time() - inicio)/60:.1f} minutos")
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from results_store import CATEGORIES, DEFAULT_STORE_DIR, SMELL_CATEGORY, SMELLS, ResultsStore
+
+
+# Matrizes da análise evolutiva a partir do store de resultados: release x
+# smell (em ordem de publicação), modelo x categoria e a série temporal de
+# smells por modelo. As agregações por modelo ficam em cache
+# (.cache/evolucao/<modelo>.npz), com a assinatura dos arquivos de origem;
+# quando só um modelo muda, só ele é recalculado.
+
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "evolucao")
+
+# matriz smell -> categoria (S x C) para somar smells por categoria num matmul
+CATEGORY_MATRIX = np.eye(len(CATEGORIES), dtype=np.int64)[SMELL_CATEGORY]
+
+
+@dataclass
+class ModelAggregate:
+    model: str
+    releases: np.ndarray  # nomes, em ordem de publicação
+    published_at: np.ndarray  # datetime64[s]
+    release_smell: np.ndarray  # releases x smells
+
+    @property
+    def categories(self) -> np.ndarray:
+        return self.release_smell.sum(axis=0) @ CATEGORY_MATRIX
+
+
+def load_published_at(releases_csv: str) -> dict[str, np.datetime64]:
+    dates = {}
+    with open(releases_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            tag = (row.get("tag_name") or row.get("name") or "").strip()
+            published = (row.get("published_at") or "").strip().rstrip("Z")
+            if tag and published:
+                dates[tag] = np.datetime64(published, "s")
+    return dates
+
+
+def file_signature(path: str) -> list:
+    st = os.stat(path)
+    return [os.path.abspath(path), st.st_size, st.st_mtime]
+
+
+class EvolutionAnalysis:
+    def __init__(self, store: ResultsStore, releases_csv: str, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.store = store
+        self.releases_csv = releases_csv
+        self.cache_dir = cache_dir
+        self.recomputed: list[str] = []
+        self._loaded: dict[str, ModelAggregate] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+        dates = load_published_at(releases_csv)
+        # junção release -> published_at para todas as releases do store;
+        # releases fora do CSV (ou texto inválido do modelo) ficam como NaT
+        published = np.array(
+            [dates.get(r, np.datetime64("NaT", "s")) for r in store.releases], dtype="datetime64[s]"
+        )
+        known = np.flatnonzero(~np.isnat(published))
+        self._order = known[np.argsort(published[known], kind="stable")]
+        # unicode de largura fixa, e não object: o .npz abre sem pickle
+        self._release_names = np.array(store.releases, dtype=str)[self._order]
+        self._published = published[self._order]
+        self.unmatched = len(store.releases) - len(known)
+
+    def _signature(self, model: str) -> str:
+        sources = sorted(
+            [key, s["size"], s["mtime"]] for key, s in self.store.sources.items() if s["model"] == model
+        )
+        raw = json.dumps([sources, file_signature(self.releases_csv), SMELLS])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _cache_path(self, model: str) -> str:
+        safe = model.replace("/", "_").replace(":", "_")
+        return os.path.join(self.cache_dir, f"{safe}.npz")
+
+    def model_aggregate(self, model: str) -> ModelAggregate:
+        if model not in self._loaded:
+            self._loaded[model] = self._model_aggregate(model)
+        return self._loaded[model]
+
+    def _model_aggregate(self, model: str) -> ModelAggregate:
+        signature = self._signature(model)
+        path = self._cache_path(model)
+        if os.path.exists(path):
+            try:
+                with np.load(path, allow_pickle=False) as cached:
+                    if str(cached["signature"]) == signature:
+                        return ModelAggregate(
+                            model, cached["releases"], cached["published_at"], cached["release_smell"]
+                        )
+            except ValueError:
+                # cache antigo, com nomes em array object (pickle): recalcula
+                pass
+
+        mi = self.store.models.index(model)
+        # linhas do cubo na ordem de publicação, só releases com data conhecida
+        matrix = np.asarray(self.store.counts[mi])[self._order]
+        aggregate = ModelAggregate(model, self._release_names, self._published, matrix)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            signature=np.array(signature),
+            releases=aggregate.releases,
+            published_at=aggregate.published_at,
+            release_smell=aggregate.release_smell,
+        )
+        os.replace(tmp, path)
+        self.recomputed.append(model)
+        return aggregate
+
+    def aggregates(self) -> list[ModelAggregate]:
+        return [self.model_aggregate(m) for m in self.store.models]
+
+    def release_smell(self, model: str | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # (releases, published_at, matriz releases x smells)
+        aggregates = self.aggregates() if model is None else [self.model_aggregate(model)]
+        # caches antigos podem ter outro conjunto de releases: alinha por nome
+        index = {name: i for i, name in enumerate(self._release_names)}
+        total = np.zeros((len(self._release_names), len(SMELLS)), dtype=np.int64)
+        for agg in aggregates:
+            rows = np.array([index.get(name, -1) for name in agg.releases], dtype=np.int64)
+            mask = rows >= 0
+            np.add.at(total, rows[mask], agg.release_smell[mask])
+        return self._release_names, self._published, total
+
+    def model_category(self) -> tuple[list[str], np.ndarray]:
+        aggregates = self.aggregates()
+        matrix = np.vstack([agg.categories for agg in aggregates]) if aggregates else np.zeros(
+            (0, len(CATEGORIES)), dtype=np.int64
+        )
+        return [agg.model for agg in aggregates], matrix
+
+    def timeline(self) -> tuple[np.ndarray, np.ndarray, list[str], np.ndarray]:
+        # smells (sem contar NENHUM) por release e por modelo, em ordem de publicação
+        aggregates = self.aggregates()
+        series = np.zeros((len(self._release_names), len(aggregates)), dtype=np.int64)
+        index = {name: i for i, name in enumerate(self._release_names)}
+        for j, agg in enumerate(aggregates):
+            rows = np.array([index.get(name, -1) for name in agg.releases], dtype=np.int64)
+            mask = rows >= 0
+            series[rows[mask], j] = agg.release_smell[mask, 1:].sum(axis=1)
+        return self._release_names, self._published, [a.model for a in aggregates], series
+
+
+def write_matrix(path: str, header: list[str], rows: list[list]) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(header)
+        writer.writerows(rows)
+    os.replace(tmp, path)
+
+
+def export(analysis: EvolutionAnalysis, out_dir: str) -> list[str]:
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+
+    def dated(releases, published):
+        return [[r, str(p)] for r, p in zip(releases, published)]
+
+    releases, published, matrix = analysis.release_smell()
+    path = os.path.join(out_dir, "release_smell.csv")
+    write_matrix(
+        path,
+        ["Release", "published_at"] + SMELLS,
+        [d + m.tolist() for d, m in zip(dated(releases, published), matrix)],
+    )
+    written.append(path)
+
+    for agg in analysis.aggregates():
+        safe = agg.model.replace("/", "_").replace(":", "_")
+        path = os.path.join(out_dir, f"release_smell_{safe}.csv")
+        write_matrix(
+            path,
+            ["Release", "published_at"] + SMELLS,
+            [d + m.tolist() for d, m in zip(dated(agg.releases, agg.published_at), agg.release_smell)],
+        )
+        written.append(path)
+
+    models, matrix = analysis.model_category()
+    path = os.path.join(out_dir, "modelo_categoria.csv")
+    write_matrix(path, ["Modelo"] + CATEGORIES, [[m] + row.tolist() for m, row in zip(models, matrix)])
+    written.append(path)
+
+    releases, published, models, series = analysis.timeline()
+    path = os.path.join(out_dir, "temporal.csv")
+    write_matrix(
+        path,
+        ["Release", "published_at"] + models,
+        [d + s.tolist() for d, s in zip(dated(releases, published), series)],
+    )
+    written.append(path)
+    return written
+
+
+def plot(analysis: EvolutionAnalysis, out_dir: str) -> list[str]:
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise RuntimeError("Gráficos requerem matplotlib: pip install matplotlib")
+
+    written = []
+    releases, published, models, series = analysis.timeline()
+    fig, ax = plt.subplots(figsize=(12, 5))
+    for j, model in enumerate(models):
+        ax.plot(published, series[:, j], marker="o", label=model)
+    ax.set_ylabel("code smells por release")
+    ax.legend()
+    path = os.path.join(out_dir, "temporal.png")
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+    written.append(path)
+
+    models, matrix = analysis.model_category()
+    fig, ax = plt.subplots(figsize=(8, 0.6 * len(models) + 2))
+    ax.imshow(matrix, aspect="auto", cmap="Reds")
+    ax.set_xticks(range(len(CATEGORIES)), CATEGORIES, rotation=30, ha="right")
+    ax.set_yticks(range(len(models)), models)
+    path = os.path.join(out_dir, "modelo_categoria.png")
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+    written.append(path)
+
+    releases, _, matrix = analysis.release_smell()
+    fig, ax = plt.subplots(figsize=(12, 0.15 * len(releases) + 2))
+    ax.imshow(matrix[:, 1:], aspect="auto", cmap="Reds")
+    ax.set_xticks(range(len(SMELLS) - 1), SMELLS[1:], rotation=60, ha="right")
+    ax.set_yticks(range(len(releases)), releases, fontsize=6)
+    path = os.path.join(out_dir, "release_smell.png")
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+    written.append(path)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matrizes e séries da análise evolutiva.")
+    parser.add_argument("csv_releases", help="CSV de releases com published_at")
+    parser.add_argument("resultados", nargs="*", help="arquivos de resultado (padrão: analises/*.csv)")
+    parser.add_argument("--dir", default=DEFAULT_STORE_DIR, help="pasta do store de resultados")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_DIR, help="pasta do cache das agregações")
+    parser.add_argument("--saida", default=os.path.join("analises", "evolucao"), help="pasta de saída")
+    parser.add_argument("--graficos", action="store_true", help="gera também os PNGs (matplotlib)")
+    args = parser.parse_args(sys.argv[1:])
+
+    t0 = time.perf_counter()
+    store = ResultsStore(args.dir)
+    paths = args.resultados or sorted(glob.glob(os.path.join("analises", "*.csv")))
+    print(store.ingest(paths).report())
+
+    analysis = EvolutionAnalysis(store, args.csv_releases, args.cache)
+    written = export(analysis, args.saida)
+    if args.graficos:
+        written += plot(analysis, args.saida)
+
+    recomputed = sorted(set(analysis.recomputed))
+    print(f"Modelos recalculados: {', '.join(recomputed) if recomputed else 'nenhum (cache)'}")
+    if analysis.unmatched:
+        print(f"{analysis.unmatched} releases dos resultados sem published_at no CSV (ignoradas)")
+    for path in written:
+        print(f"OK -> {path}")
+    print(f"({time.perf_counter() - t0:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
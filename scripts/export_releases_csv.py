@@ -1,131 +1,289 @@
 #!/usr/bin/env python3
+import argparse
+import csv
+import glob
+import json
 import os
+import re
 import sys
-import requests
-
-
-def load_prompt_template(path: str) -> str:
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import http_client
+from async_dispatch import ensure_pool_size
+
+
+# Exporta as releases de um repositório do GitHub para
+# data/releases_<dono>_<repo>_<data>.csv e gera a amostra sistemática
+# (_sample_30pct.csv). Sem CSV anterior, busca a primeira página, lê o total
+# de páginas no cabeçalho Link e baixa o resto em paralelo. Com CSV anterior,
+# busca só as páginas com releases publicadas depois do último published_at,
+# com requisição condicional (ETag) na primeira: sem novidade, a resposta é
+# 304 e não conta no limite da API. Releases novas geram um CSV (e uma
+# amostra) com a data da execução; os anteriores não são reescritos.
+
+
+COLUMNS = [
+    "id",
+    "tag_name",
+    "name",
+    "published_at",
+    "created_at",
+    "draft",
+    "prerelease",
+    "html_url",
+    "tarball_url",
+    "zipball_url",
+]
+PER_PAGE = 100
+DATA_DIR = "data"
+DEFAULT_ETAG_PATH = os.path.join(".cache", "github", "etags.json")
+LAST_PAGE_RE = re.compile(r'[?&]page=(\d+)[^>]*>;\s*rel="last"')
+
+
+@dataclass
+class ExportStats:
+    requests: int = 0
+    not_modified: int = 0
+    pages: int = 0
+    new_releases: int = 0
+    total_releases: int = 0
+
+    def report(self) -> str:
+        return (
+            f"GitHub: {self.requests} requisições ({self.not_modified} sem mudança/304), "
+            f"{self.pages} páginas lidas; {self.new_releases} releases novas, "
+            f"{self.total_releases} no total"
+        )
 
 
-def build_prompt(template: str, release: str, desc: str, code: str) -> str:
-    return (
-        template.replace("{{RELEASE}}", release)
-        .replace("{{DESCRICAO_RELEASE}}", desc)
-        .replace("{{CODIGO}}", code)
+class EtagStore:
+    # ETag por URL, para as requisições condicionais da próxima execução
+    def __init__(self, path: str = DEFAULT_ETAG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._etags: dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._etags = json.load(f)
+
+    def get(self, url: str) -> str | None:
+        with self._lock:
+            return self._etags.get(url)
+
+    def put(self, url: str, etag: str | None) -> None:
+        if not etag:
+            return
+        with self._lock:
+            self._etags[url] = etag
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with self._lock, open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._etags, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+class ReleaseFetcher:
+    def __init__(self, owner: str, repo: str, token: str | None, etags: EtagStore | None = None):
+        self.owner = owner
+        self.repo = repo
+        self.token = token
+        self.etags = etags
+        self.stats = ExportStats()
+        self._lock = threading.Lock()
+
+    def page_url(self, page: int) -> str:
+        base = http_client.get_config().github_api_url
+        return f"{base}/repos/{self.owner}/{self.repo}/releases?per_page={PER_PAGE}&page={page}"
+
+    def get_page(self, page: int, conditional: bool = False) -> tuple[list[dict] | None, int]:
+        # (releases, última página); releases None quando o servidor responde 304
+        url = self.page_url(page)
+        headers = {"Accept": "application/vnd.github+json", "X-GitHub-Api-Version": "2022-11-28"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        etag = self.etags.get(url) if conditional and self.etags is not None else None
+        if etag:
+            headers["If-None-Match"] = etag
+
+        session = http_client.get_session()
+        r = session.get(url, headers=headers, timeout=http_client.get_config().github_timeout())
+        with self._lock:
+            self.stats.requests += 1
+        if r.status_code == 304:
+            with self._lock:
+                self.stats.not_modified += 1
+            return None, page
+        if r.status_code in (403, 429) and r.headers.get("X-RateLimit-Remaining") == "0":
+            reset = int(r.headers.get("X-RateLimit-Reset") or 0)
+            when = time.strftime("%H:%M:%S", time.localtime(reset)) if reset else "?"
+            raise RuntimeError(f"Limite da API do GitHub esgotado (libera às {when}); defina GITHUB_TOKEN")
+        if r.status_code != 200:
+            raise RuntimeError(f"Erro {r.status_code} ao listar releases ({url}): {r.text[:300]}")
+
+        if self.etags is not None:
+            self.etags.put(url, r.headers.get("ETag"))
+        match = LAST_PAGE_RE.search(r.headers.get("Link") or "")
+        with self._lock:
+            self.stats.pages += 1
+        return r.json(), int(match.group(1)) if match else page
+
+    def fetch_all(self, concurrency: int) -> list[dict]:
+        first, last_page = self.get_page(1)
+        pages = {1: first}
+        if last_page > 1:
+            ensure_pool_size(concurrency)
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                numbers = range(2, last_page + 1)
+                for page, (items, _) in zip(numbers, pool.map(self.get_page, numbers)):
+                    pages[page] = items
+        return [item for page in sorted(pages) for item in pages[page]]
+
+    def fetch_since(self, last_published: str) -> list[dict] | None:
+        # páginas em ordem até encontrar uma release já conhecida; None = 304
+        new = []
+        page = 1
+        while True:
+            items, last_page = self.get_page(page, conditional=page == 1)
+            if items is None:
+                return None
+            newer = [item for item in items if (item.get("published_at") or "") > last_published]
+            new.extend(newer)
+            if len(newer) < len(items) or page >= last_page or not items:
+                return new
+            page += 1
+
+
+def release_row(item: dict) -> dict | None:
+    # rascunhos não têm published_at nem tarball público
+    if item.get("draft") or not item.get("published_at"):
+        return None
+    row = {column: item.get(column) for column in COLUMNS}
+    row["draft"] = str(bool(item.get("draft")))
+    row["prerelease"] = str(bool(item.get("prerelease")))
+    return row
+
+
+def read_rows(path: str) -> list[dict]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def write_rows(path: str, rows: list[dict]) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, lineterminator="\n", extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+
+
+def systematic_sample(rows: list[dict], fraction: float) -> list[dict]:
+    # passo fixo n/m a partir da primeira linha: a mesma lista dá sempre a mesma amostra
+    if not rows or fraction <= 0:
+        return []
+    m = min(len(rows), max(1, int(len(rows) * fraction)))
+    step = len(rows) / m
+    return [rows[round(i * step)] for i in range(m)]
+
+
+def sample_path(path: str, fraction: float) -> str:
+    return f"{os.path.splitext(path)[0]}_sample_{round(fraction * 100)}pct.csv"
+
+
+def find_latest_export(data_dir: str, owner: str, repo: str) -> str | None:
+    files = [
+        f
+        for f in glob.glob(os.path.join(data_dir, f"releases_{owner}_{repo}_*.csv"))
+        if "_sample_" not in os.path.basename(f)
+    ]
+    return max(files) if files else None
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Exporta as releases de um repositório do GitHub para CSV, com amostra sistemática.",
+        epilog="Ex: python scripts/export_releases_csv.py CherryHQ cherry-studio 0.3",
     )
-
-
-def ensure_provider_suffix(model: str) -> str:
-    if ":" in model:
-        return model
-    return f"{model}:hf-inference"
-
-
-def call_hf_router_chat(model: str, prompt: str, token: str) -> str:
-    url = "https://router.huggingface.co/v1/chat/completions"
-
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
-
-    payload = {
-        "model": ensure_provider_suffix(model),
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "Responda exclusivamente em CSV separado por ponto e vírgula. "
-                    "Não escreva explicações, comentários ou tags como <think>. "
-                    "Não repita o cabeçalho."
-                ),
-            },
-            {"role": "user", "content": prompt},
-        ],
-        "max_tokens": 900,
-        "temperature": 0.2,
-        "stream": False,
-    }
-
-    print("Chamando:", url)
-    print("Modelo:", payload["model"])
-
-    r = requests.post(url, headers=headers, json=payload, timeout=600)
-
-    if r.status_code != 200:
-        raise RuntimeError(f"Erro HF {r.status_code}: {r.text[:800]}")
-
-    data = r.json()
-    return data["choices"][0]["message"]["content"]
-
-
-def append_csv(out_path: str, csv_text: str, release: str, desc: str):
-    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
-
-    write_header = not os.path.exists(out_path) or os.path.getsize(out_path) == 0
-    header = "Release;DescricaoRelease;Categoria;CodeSmell;Justificativa\n"
-
-    valid_lines = []
-    for raw in csv_text.splitlines():
-        line = raw.strip()
-        if not line:
-            continue
-        if line.lower().startswith("release;"):
-            continue
-        if "<think>" in line.lower():
-            continue
-        if ";" not in line:
-            continue
-        valid_lines.append(line)
-
-    if not valid_lines:
-        valid_lines = [
-            f"{release};{desc};NENHUM;NENHUM;Nenhum code smell identificado"
-        ]
-
-    with open(out_path, "a", encoding="utf-8", newline="") as f:
-        if write_header:
-            f.write(header)
-        f.write("\n".join(valid_lines) + "\n")
+    parser.add_argument("dono")
+    parser.add_argument("repositorio")
+    parser.add_argument("fracao", nargs="?", type=float, default=0.3, help="fração da amostra (padrão: 0.3)")
+    parser.add_argument("--dados", default=DATA_DIR, help="pasta dos CSVs de releases")
+    parser.add_argument(
+        "--completo",
+        action="store_true",
+        help="ignora o CSV existente e baixa todas as releases de novo",
+    )
+    parser.add_argument(
+        "--concorrencia",
+        type=int,
+        default=8,
+        help="páginas baixadas simultaneamente na busca completa",
+    )
+    return parser.parse_args(argv)
 
 
 def main():
-    if len(sys.argv) < 7:
-        print(
-            "Uso: python scripts/run_hf.py <modelo> <release> <descricao> "
-            "<arquivo_codigo> <arquivo_prompt> <saida_csv>"
-        )
-        sys.exit(1)
+    args = parse_args(sys.argv[1:])
+    if not 0 < args.fracao <= 1:
+        raise RuntimeError("A fração da amostra deve estar entre 0 e 1.")
 
-    model = sys.argv[1]
-    release = sys.argv[2]
-    desc = sys.argv[3]
-    code_path = sys.argv[4]
-    prompt_path = sys.argv[5]
-    out_path = sys.argv[6]
-
-    token = os.getenv("HF_TOKEN")
+    token = os.getenv("GITHUB_TOKEN") or os.getenv("GH_TOKEN")
     if not token:
-        raise RuntimeError('HF_TOKEN não definido. Use: $env:HF_TOKEN="hf_..."')
-
-    template = load_prompt_template(prompt_path)
-
-    with open(code_path, "r", encoding="utf-8", errors="ignore") as f:
-        code = f.read()
-
-    MAX_CHARS = 25000
-    if len(code) > MAX_CHARS:
-        code = code[:MAX_CHARS]
-
-    prompt = build_prompt(template, release, desc, code)
-    result = call_hf_router_chat(model, prompt, token)
-
-    append_csv(out_path, result, release, desc)
-
-    print(f"OK: resultado acrescentado em {out_path}")
+        print("Aviso: GITHUB_TOKEN não definido; a API limita a 60 requisições por hora.")
+
+    etags = EtagStore()
+    fetcher = ReleaseFetcher(args.dono, args.repositorio, token, etags)
+    existing = None if args.completo else find_latest_export(args.dados, args.dono, args.repositorio)
+
+    t0 = time.perf_counter()
+    if existing:
+        rows = read_rows(existing)
+        last_published = max((r["published_at"] for r in rows), default="")
+        print(f"Atualizando {existing} ({len(rows)} releases, última publicada em {last_published})")
+        fetched = fetcher.fetch_since(last_published)
+        known = {r["id"] for r in rows}
+        new_rows = []
+        for item in fetched or []:
+            row = release_row(item)
+            if row and str(row["id"]) not in known:
+                known.add(str(row["id"]))
+                new_rows.append(row)
+        # a API devolve as mais recentes primeiro; as novas vão para o topo
+        rows = new_rows + rows
+    else:
+        rows = [row for row in map(release_row, fetcher.fetch_all(args.concorrencia)) if row]
+        new_rows = rows
+
+    fetcher.stats.new_releases = len(new_rows)
+    fetcher.stats.total_releases = len(rows)
+
+    # Com novidade, o export e a amostra vão para arquivos novos: o CSV
+    # anterior e a sua amostra, a que os resultados em analises/ se referem,
+    # ficam intactos (a amostra sistemática muda quando a lista muda).
+    if new_rows:
+        os.makedirs(args.dados, exist_ok=True)
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        out_path = os.path.join(args.dados, f"releases_{args.dono}_{args.repositorio}_{stamp}.csv")
+        write_rows(out_path, rows)
+        print(f"OK -> {out_path}")
+        sample_out = sample_path(out_path, args.fracao)
+        sample = systematic_sample(rows, args.fracao)
+        write_rows(sample_out, sample)
+        print(f"OK -> {sample_out} ({len(sample)} releases)")
+    else:
+        print("Nenhuma release nova.")
+    # só depois das gravações: com o CSV perdido, o próximo 304 esconderia
+    # as releases que ele deveria conter
+    etags.save()
+
+    print(fetcher.stats.report())
+    print(f"({time.perf_counter() - t0:.2f}s)")
+    http_client.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+from smell_catalog import parse_row
+
+
+# Leitura incremental das respostas em streaming (SSE) do router. As linhas
+# CSV completas são conferidas à medida que chegam, e a requisição é abortada
+# quando o modelo começa a repetir smells, a escrever fora do formato ou passa
+# do limite de linhas, sem gastar o resto de max_tokens.
+
+
+STOP_REPETITION = "repeticao"
+STOP_GARBAGE = "lixo"
+STOP_ROWS = "limite_linhas"
+
+
+@dataclass
+class StopPolicy:
+    # 0 desliga a regra correspondente
+    max_rows: int = 40
+    max_repeats: int = 3
+    max_garbage: int = 8
+
+    @classmethod
+    def from_env(cls) -> "StopPolicy":
+        default = cls()
+        return cls(
+            int(os.getenv("HF_STREAM_MAX_LINHAS", default.max_rows)),
+            int(os.getenv("HF_STREAM_MAX_REPETICOES", default.max_repeats)),
+            int(os.getenv("HF_STREAM_MAX_LIXO", default.max_garbage)),
+        )
+
+
+class RowGuard:
+    # Recebe o texto em pedaços e decide, a cada linha completa, se vale a pena
+    # continuar. Repetição é a mesma linha de novo (sem diferença de caixa e
+    # espaços, como no CsvStoppingCriteria do Colab): o mesmo smell em outro
+    # trecho, com outra justificativa, é achado legítimo. Lixo é qualquer linha
+    # que não seja do catálogo. `rows` guarda as linhas aceitas, como vieram.
+
+    def __init__(self, policy: StopPolicy):
+        self.policy = policy
+        self.rows: list[str] = []
+        self.repeats = 0
+        self.garbage = 0
+        self.stop_reason: str | None = None
+        self._seen: set[str] = set()
+        self._partial = ""
+        self._in_think = False
+
+    def feed(self, text: str) -> str | None:
+        self._partial += text
+        *lines, self._partial = self._partial.split("\n")
+        for line in lines:
+            reason = self._check(line.strip())
+            if reason:
+                self.stop_reason = reason
+                return reason
+        return None
+
+    def finish(self) -> str | None:
+        # a última linha pode chegar sem \n
+        partial, self._partial = self._partial, ""
+        if not partial.strip():
+            return None
+        reason = self._check(partial.strip())
+        if reason:
+            self.stop_reason = reason
+        return reason
+
+    def _check(self, line: str) -> str | None:
+        p = self.policy
+        if line.startswith("<think>"):
+            self._in_think = "</think>" not in line
+            return None
+        if self._in_think:
+            self._in_think = "</think>" not in line
+            return None
+        if not line or line.lower().startswith(("release;", "categoria;")):
+            return None
+
+        parsed = parse_row(line)
+        if parsed is None:
+            self.garbage += 1
+            if p.max_garbage and self.garbage >= p.max_garbage:
+                return STOP_GARBAGE
+            return None
+
+        key = " ".join(line.lower().split())
+        if key in self._seen:
+            self.repeats += 1
+            if p.max_repeats and self.repeats >= p.max_repeats:
+                return STOP_REPETITION
+            return None
+        self._seen.add(key)
+        self.rows.append(line)
+        if p.max_rows and len(self.rows) >= p.max_rows:
+            return STOP_ROWS
+        return None
+
+
+@dataclass
+class StreamStats:
+    model: str
+    label: str | None
+    ttft_s: float | None
+    total_s: float
+    tokens: int
+    rows: int
+    stop_reason: str | None
+
+    @property
+    def tokens_per_s(self) -> float:
+        # velocidade de geração, sem contar a espera pelo primeiro token
+        if self.ttft_s is None or self.total_s <= self.ttft_s:
+            return 0.0
+        return self.tokens / (self.total_s - self.ttft_s)
+
+    def line(self) -> str:
+        ttft = f"{self.ttft_s:.2f}s" if self.ttft_s is not None else "-"
+        stop = f", interrompido: {self.stop_reason}" if self.stop_reason else ""
+        return (
+            f"Stream {self.label or self.model}: TTFT {ttft}, {self.tokens} tokens, "
+            f"{self.tokens_per_s:.1f} tokens/s, {self.rows} linhas{stop}"
+        )
+
+
+def iter_sse_data(response):
+    # cada evento é "data: <json>"; comentários (":") e linhas vazias são ignorados
+    for raw in response.iter_lines():
+        if not raw or raw.startswith(b":"):
+            continue
+        if not raw.startswith(b"data:"):
+            continue
+        data = raw[5:].strip()
+        if data == b"[DONE]":
+            return
+        yield json.loads(data)
+
+
+class StreamRecorder:
+    # Política de parada compartilhada pelas chamadas em streaming e registro
+    # das métricas por release (opcionalmente em JSONL).
+
+    def __init__(self, policy: StopPolicy | None = None, path: str | None = None):
+        self.policy = policy or StopPolicy.from_env()
+        self.path = path
+        self.stats: list[StreamStats] = []
+        self._lock = threading.Lock()
+
+    def read(self, response, model: str, label: str | None, started: float) -> tuple[str, StreamStats]:
+        guard = RowGuard(self.policy)
+        tokens = 0
+        usage_tokens = None
+        ttft = None
+        try:
+            for event in iter_sse_data(response):
+                if "error" in event:
+                    raise RuntimeError(f"Erro no stream: {event['error']}")
+                usage = event.get("usage") or {}
+                if usage.get("completion_tokens"):
+                    usage_tokens = usage["completion_tokens"]
+                choices = event.get("choices") or []
+                if not choices:
+                    continue
+                text = (choices[0].get("delta") or {}).get("content") or ""
+                if not text:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                # sem usage, cada evento com conteúdo conta como um token
+                tokens += 1
+                if guard.feed(text):
+                    break
+            else:
+                guard.finish()
+        finally:
+            # fechar antes do fim derruba a conexão e o servidor para de gerar
+            response.close()
+
+        stats = StreamStats(
+            model,
+            label,
+            ttft,
+            time.perf_counter() - started,
+            usage_tokens or tokens,
+            len(guard.rows),
+            guard.stop_reason,
+        )
+        self.record(stats)
+        # interrompido ou não, a resposta são as linhas aceitas pelo guard
+        return "\n".join(guard.rows), stats
+
+    def record(self, stats: StreamStats) -> None:
+        print(stats.line())
+        with self._lock:
+            self.stats.append(stats)
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    row = asdict(stats)
+                    row["tokens_per_s"] = round(stats.tokens_per_s, 2)
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def report(self) -> str:
+        if not self.stats:
+            return "Stream: nenhuma chamada"
+        ttfts = sorted(s.ttft_s for s in self.stats if s.ttft_s is not None)
+        rates = [s.tokens_per_s for s in self.stats if s.tokens_per_s]
+        stopped: dict[str, int] = {}
+        for s in self.stats:
+            if s.stop_reason:
+                stopped[s.stop_reason] = stopped.get(s.stop_reason, 0) + 1
+        lines = [f"Stream: {len(self.stats)} chamadas, {sum(s.tokens for s in self.stats)} tokens"]
+        if ttfts:
+            lines.append(
+                f"  TTFT mediana {ttfts[len(ttfts) // 2]:.2f}s, máx {ttfts[-1]:.2f}s"
+            )
+        if rates:
+            lines.append(f"  tokens/s médio {sum(rates) / len(rates):.1f}")
+        if stopped:
+            lines.append(
+                "  interrompidas: " + ", ".join(f"{k}={v}" for k, v in sorted(stopped.items()))
+            )
+        return "\n".join(lines)
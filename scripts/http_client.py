@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import os
+import threading
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Sessão HTTP compartilhada (pool + keep-alive) usada pelas chamadas ao
+# router do Hugging Face e pelos downloads da API do GitHub. Os endereços
+# base vêm do ambiente (HF_ROUTER_URL, GITHUB_API_URL), o que permite apontar
+# os scripts para servidores locais, como no bench_e2e.py.
+
+
+DEFAULT_ROUTER_URL = "https://router.huggingface.co/v1"
+DEFAULT_GITHUB_API_URL = "https://api.github.com"
+
+
+@dataclass(frozen=True)
+class HttpConfig:
+    pool_size: int = 10
+    connect_timeout: float = 10.0
+    router_read_timeout: float = 600.0
+    github_read_timeout: float = 180.0
+    router_url: str = DEFAULT_ROUTER_URL
+    github_api_url: str = DEFAULT_GITHUB_API_URL
+
+    @classmethod
+    def from_env(cls) -> "HttpConfig":
+        return cls(
+            pool_size=int(os.getenv("HTTP_POOL_SIZE", cls.pool_size)),
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", cls.connect_timeout)),
+            router_read_timeout=float(os.getenv("HF_READ_TIMEOUT", cls.router_read_timeout)),
+            github_read_timeout=float(os.getenv("GITHUB_READ_TIMEOUT", cls.github_read_timeout)),
+            router_url=os.getenv("HF_ROUTER_URL", cls.router_url).rstrip("/"),
+            github_api_url=os.getenv("GITHUB_API_URL", cls.github_api_url).rstrip("/"),
+        )
+
+    def router_timeout(self) -> tuple[float, float]:
+        return (self.connect_timeout, self.router_read_timeout)
+
+    def github_timeout(self) -> tuple[float, float]:
+        return (self.connect_timeout, self.github_read_timeout)
+
+    def chat_completions_url(self) -> str:
+        return f"{self.router_url}/chat/completions"
+
+    def github_url(self, url: str) -> str:
+        # os tarball_url dos CSVs apontam para a API pública; troca só a base
+        if self.github_api_url != DEFAULT_GITHUB_API_URL and url.startswith(DEFAULT_GITHUB_API_URL):
+            return self.github_api_url + url[len(DEFAULT_GITHUB_API_URL):]
+        return url
+
+
+_lock = threading.Lock()
+_config: HttpConfig | None = None
+_session: requests.Session | None = None
+
+
+def create_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+
+def get_config() -> HttpConfig:
+    global _config
+    with _lock:
+        if _config is None:
+            _config = HttpConfig.from_env()
+        return _config
+
+
+def get_session() -> requests.Session:
+    global _session
+    config = get_config()
+    with _lock:
+        if _session is None:
+            _session = create_session(config.pool_size)
+        return _session
+
+
+def configure(config: HttpConfig) -> None:
+    # troca a configuração e descarta a sessão antiga (novo pool)
+    global _config, _session
+    with _lock:
+        old = _session
+        _config = config
+        _session = None
+    if old is not None:
+        old.close()
+
+
+def close() -> None:
+    global _session
+    with _lock:
+        old = _session
+        _session = None
+    if old is not None:
+        old.close()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+import atexit
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+# Instrumentação dos scripts de lote: duração de cada estágio por release
+# (download, extração, prompt, inferência, escrita), tokens, bytes baixados e
+# novas tentativas. Com METRICS_PATH=<prefixo> (ou --metricas), os eventos vão
+# para <prefixo>.jsonl e os totais para <prefixo>.prom, no formato texto do
+# Prometheus. Desligada, stage() devolve sempre o mesmo nullcontext e add()
+# não faz nada.
+#
+# A release de cada evento vem do argumento explícito ou de release_scope(),
+# que o dispatcher assíncrono e os laços sequenciais abrem por release.
+# METRICS_PROFILE_MS liga um profiler por amostragem, que grava as pilhas no
+# formato "folded" (<prefixo>.folded), pronto para flamegraph.pl/speedscope.
+
+
+PREFIX = "code_smells"
+# limites do histograma de duração dos estágios, em segundos
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+COUNTERS = {
+    "prompt_tokens": "Tokens de prompt informados pelo router.",
+    "completion_tokens": "Tokens gerados.",
+    "bytes_downloaded": "Bytes de tarball recebidos.",
+    "retries": "Novas tentativas depois de 429/503.",
+    "cache_hits": "Respostas servidas pelo cache local.",
+}
+
+_release: contextvars.ContextVar[str | None] = contextvars.ContextVar("metrics_release", default=None)
+_NULL = nullcontext()
+
+
+@contextmanager
+def release_scope(release: str | None):
+    token = _release.set(release)
+    try:
+        yield
+    finally:
+        _release.reset(token)
+
+
+def bind_release(release: str | None) -> None:
+    # para tasks asyncio: vale até o fim do contexto da task
+    _release.set(release)
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "release", "t0")
+
+    def __init__(self, metrics: "Metrics", name: str, release: str | None):
+        self.metrics = metrics
+        self.name = name
+        self.release = release
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.t0, self.release)
+        return False
+
+
+class NullMetrics:
+    enabled = False
+
+    def stage(self, name: str, release: str | None = None):
+        return _NULL
+
+    def observe(self, name: str, seconds: float, release: str | None = None) -> None:
+        pass
+
+    def add(self, counter: str, value: float = 1, release: str | None = None) -> None:
+        pass
+
+    def offset(self) -> int:
+        return 0
+
+    def replay(self, start: int) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class Metrics:
+    enabled = True
+
+    def __init__(self, prefix: str, flush_every: int = 256, flush_seconds: float = 5.0):
+        self.prefix = prefix
+        self.jsonl_path = f"{prefix}.jsonl"
+        self.prom_path = f"{prefix}.prom"
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._pending: list[str] = []
+        self._last_flush = time.monotonic()
+        self._buckets: dict[str, list[int]] = {}
+        self._sums: dict[str, float] = {}
+        self._counters: dict[str, float] = {name: 0 for name in COUNTERS}
+        self._releases: set[str] = set()
+        self._closed = False
+        os.makedirs(os.path.dirname(self.jsonl_path) or ".", exist_ok=True)
+
+    def stage(self, name: str, release: str | None = None) -> _Timer:
+        return _Timer(self, name, release)
+
+    def observe(self, name: str, seconds: float, release: str | None = None) -> None:
+        release = release or _release.get()
+        event = {"t": round(time.time(), 3), "release": release, "estagio": name, "s": round(seconds, 6)}
+        with self._lock:
+            self._observe_locked(name, seconds)
+            self._record_locked(event, release)
+
+    def _observe_locked(self, name: str, seconds: float) -> None:
+        counts = self._buckets.get(name)
+        if counts is None:
+            counts = self._buckets[name] = [0] * (len(BUCKETS) + 1)
+            self._sums[name] = 0.0
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        counts[i] += 1
+        self._sums[name] += seconds
+
+    def add(self, counter: str, value: float = 1, release: str | None = None) -> None:
+        release = release or _release.get()
+        event = {"t": round(time.time(), 3), "release": release, "contador": counter, "valor": value}
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+            self._record_locked(event, release)
+
+    def offset(self) -> int:
+        # fim atual do JSONL, para replay() depois
+        with self._lock:
+            self._flush_locked()
+            return os.path.getsize(self.jsonl_path) if os.path.exists(self.jsonl_path) else 0
+
+    def replay(self, start: int) -> None:
+        # soma aos totais os eventos que outros processos (os run_hf.py do
+        # --subprocess) acrescentaram ao JSONL a partir do byte `start`; cada
+        # um deles regravou o .prom só com a própria release
+        if not os.path.exists(self.jsonl_path):
+            return
+        with self._lock, open(self.jsonl_path, "rb") as f:
+            f.seek(start)
+            for raw in f:
+                try:
+                    event = json.loads(raw)
+                except ValueError:
+                    continue
+                if "estagio" in event:
+                    self._observe_locked(event["estagio"], float(event["s"]))
+                elif "contador" in event:
+                    counter = event["contador"]
+                    self._counters[counter] = self._counters.get(counter, 0) + event["valor"]
+                if event.get("release"):
+                    self._releases.add(event["release"])
+
+    def _record_locked(self, event: dict, release: str | None) -> None:
+        if release:
+            self._releases.add(release)
+        self._pending.append(json.dumps(event, ensure_ascii=False))
+        if (
+            len(self._pending) >= self.flush_every
+            or time.monotonic() - self._last_flush >= self.flush_seconds
+        ):
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._pending:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(self._pending) + "\n")
+            self._pending = []
+        tmp = f"{self.prom_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self._prometheus_locked())
+        os.replace(tmp, self.prom_path)
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def prometheus(self) -> str:
+        with self._lock:
+            return self._prometheus_locked()
+
+    def _prometheus_locked(self) -> str:
+        name = f"{PREFIX}_stage_seconds"
+        lines = [
+            f"# HELP {name} Duração de cada estágio por release.",
+            f"# TYPE {name} histogram",
+        ]
+        for stage in sorted(self._buckets):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), self._buckets[stage]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {self._sums[stage]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {cumulative}')
+        for counter, value in sorted(self._counters.items()):
+            metric = f"{PREFIX}_{counter}_total"
+            lines.append(f"# HELP {metric} {COUNTERS.get(counter, counter)}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {int(value) if float(value).is_integer() else value}")
+        lines.append(f"# HELP {PREFIX}_releases Releases com algum evento registrado.")
+        lines.append(f"# TYPE {PREFIX}_releases gauge")
+        lines.append(f"{PREFIX}_releases {len(self._releases)}")
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._flush_locked()
+
+
+class SamplingProfiler:
+    # Amostra as pilhas de todas as threads a cada `interval_s` e conta as
+    # pilhas iguais. O custo cai só sobre a thread do profiler (e o GIL).
+
+    def __init__(self, path: str, interval_s: float = 0.005):
+        self.path = path
+        self.interval_s = interval_s
+        self.samples = 0
+        self._stacks: dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval_s):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                parts.append(names.get(ident, "thread"))
+                stack = ";".join(reversed(parts))
+                self._stacks[stack] = self._stacks.get(stack, 0) + 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self._stacks.items(), key=lambda kv: -kv[1]):
+                f.write(f"{stack} {count}\n")
+
+
+_lock = threading.Lock()
+_metrics: Metrics | NullMetrics = NullMetrics()
+_profiler: SamplingProfiler | None = None
+
+
+def get() -> Metrics | NullMetrics:
+    return _metrics
+
+
+def stage(name: str, release: str | None = None):
+    return _metrics.stage(name, release)
+
+
+def add(counter: str, value: float = 1, release: str | None = None) -> None:
+    _metrics.add(counter, value, release)
+
+
+def configure(prefix: str | None, profile_ms: float = 0.0) -> Metrics | NullMetrics:
+    # prefixo None deixa a instrumentação desligada
+    global _metrics, _profiler
+    close()
+    with _lock:
+        if prefix:
+            _metrics = Metrics(prefix)
+            if profile_ms > 0:
+                _profiler = SamplingProfiler(f"{prefix}.folded", profile_ms / 1000)
+                _profiler.start()
+            atexit.register(close)
+        else:
+            _metrics = NullMetrics()
+        return _metrics
+
+
+def configure_from_env(prefix: str | None = None, profile_ms: float | None = None) -> Metrics | NullMetrics:
+    # argumentos de linha de comando têm precedência sobre o ambiente
+    prefix = prefix or os.getenv("METRICS_PATH")
+    if profile_ms is None:
+        profile_ms = float(os.getenv("METRICS_PROFILE_MS", "0"))
+    return configure(prefix, profile_ms)
+
+
+def close() -> None:
+    global _profiler
+    with _lock:
+        profiler, _profiler = _profiler, None
+        current = _metrics
+    if profiler is not None:
+        profiler.stop()
+    current.close()
+
+
+def report() -> str:
+    m = _metrics
+    if not m.enabled:
+        return "Métricas: desligadas"
+    return f"Métricas: {m.jsonl_path}, {m.prom_path}"
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from results_store import CATEGORIES, DEFAULT_STORE_DIR, SMELL_CATEGORY, SMELLS, ResultsStore
+
+
+# Concordância entre modelos. Cada modelo vira uma matriz indicadora
+# release x smell (1 = o modelo apontou o smell na release), tirada do cubo
+# de contagens do store. Todas as estatísticas saem de produtos de matrizes
+# sobre o eixo dos modelos, sem laços por par de modelos:
+#
+# - kappa de Cohen por par, sobre os itens (release, smell) das releases que
+#   os dois modelos analisaram;
+# - Jaccard por par e por release (releases sem smell nos dois modelos contam
+#   como concordância total);
+# - kappa de Fleiss entre todos os modelos escolhidos, global e por smell,
+#   sobre as releases analisadas por todos eles.
+
+
+@dataclass
+class AgreementData:
+    models: list[str]
+    releases: list[str]
+    labels: list[str]
+    indicator: np.ndarray  # modelos x releases x itens (bool)
+    analyzed: np.ndarray  # modelos x releases (bool)
+
+
+def build_indicator(
+    counts: np.ndarray, level: str = "smell"
+) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    # counts: modelos x releases x SMELLS. A coluna 0 (NENHUM) só marca que a
+    # release foi analisada; os itens são os smells (ou as categorias).
+    counts = np.asarray(counts)
+    analyzed = counts.sum(axis=2) > 0
+    found = counts[..., 1:] > 0
+    if level == "categoria":
+        to_category = np.eye(len(CATEGORIES), dtype=bool)[SMELL_CATEGORY[1:]][:, 1:]
+        found = (found.astype(np.int32) @ to_category.astype(np.int32)) > 0
+        return found, analyzed, CATEGORIES[1:]
+    return found, analyzed, SMELLS[1:]
+
+
+def load_data(store: ResultsStore, models: list[str] | None = None, level: str = "smell") -> AgreementData:
+    names = models or store.models
+    missing = [m for m in names if m not in store.models]
+    if missing:
+        raise KeyError(f"Modelos fora do store: {', '.join(missing)}")
+    idx = [store.models.index(m) for m in names]
+    indicator, analyzed, labels = build_indicator(np.asarray(store.counts)[idx], level)
+    return AgreementData(list(names), list(store.releases), labels, indicator, analyzed)
+
+
+def cohen_kappa_matrix(indicator: np.ndarray, analyzed: np.ndarray) -> np.ndarray:
+    # M x M. Para o par (a, b), os itens são as releases analisadas pelos dois
+    # vezes os S smells; as tabelas 2x2 saem de três produtos de matrizes.
+    m, r, s = indicator.shape
+    y = indicator.reshape(m, r * s).astype(np.float32)
+    a = analyzed.astype(np.float32)
+    flagged = indicator.sum(axis=2).astype(np.float32)  # smells por release
+
+    both = y @ y.T  # n11
+    pos_a = flagged @ a.T  # positivos de a nas releases que b analisou
+    pos_b = pos_a.T
+    n = (a @ a.T) * s
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        neither = n - pos_a - pos_b + both
+        po = (both + neither) / n
+        pa, pb = pos_a / n, pos_b / n
+        pe = pa * pb + (1 - pa) * (1 - pb)
+        kappa = (po - pe) / (1 - pe)
+    # sem variação nos dois modelos, a concordância é total
+    kappa = np.where((pe >= 1) & (po >= 1), 1.0, kappa)
+    kappa[n == 0] = np.nan
+    return kappa
+
+
+def jaccard_per_release(indicator: np.ndarray, analyzed: np.ndarray) -> np.ndarray:
+    # M x M x R; NaN onde algum dos dois modelos não analisou a release
+    y = indicator.astype(np.float32).transpose(1, 0, 2)  # R x M x S
+    inter = y @ y.transpose(0, 2, 1)  # R x M x M
+    flagged = y.sum(axis=2)
+    union = flagged[:, :, None] + flagged[:, None, :] - inter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        jac = np.where(union > 0, inter / union, 1.0)
+    common = analyzed.T[:, :, None] & analyzed.T[:, None, :]
+    jac = np.where(common, jac, np.nan)
+    return jac.transpose(1, 2, 0)
+
+
+def fleiss_kappa(indicator: np.ndarray, analyzed: np.ndarray) -> tuple[float, np.ndarray, int]:
+    # (kappa global, kappa por item, releases usadas); só releases analisadas
+    # por todos os modelos, já que o Fleiss exige o mesmo número de avaliadores
+    m = indicator.shape[0]
+    common = analyzed.all(axis=0)
+    if m < 2 or not common.any():
+        return float("nan"), np.full(indicator.shape[2], np.nan), 0
+    pos = indicator[:, common, :].sum(axis=0).astype(np.float64)  # releases x itens
+    neg = m - pos
+
+    def kappa(pos: np.ndarray, neg: np.ndarray, axis=None):
+        agree = (pos * (pos - 1) + neg * (neg - 1)) / (m * (m - 1))
+        p_bar = agree.mean(axis=axis)
+        p_pos = pos.sum(axis=axis) / (pos.size if axis is None else pos.shape[axis]) / m
+        pe = p_pos**2 + (1 - p_pos) ** 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            k = (p_bar - pe) / (1 - pe)
+        return np.where(pe >= 1, 1.0, k)
+
+    return float(kappa(pos, neg)), kappa(pos, neg, axis=0), int(common.sum())
+
+
+def nanmean_pairs(jac: np.ndarray) -> np.ndarray:
+    counts = (~np.isnan(jac)).sum(axis=2)
+    totals = np.nansum(jac, axis=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(counts > 0, totals / counts, np.nan)
+
+
+def format_matrix(models: list[str], matrix: np.ndarray) -> str:
+    width = max(8, max(len(m) for m in models) + 1)
+    lines = [" " * width + "".join(f"{m[:8]:>9}" for m in models)]
+    for name, row in zip(models, matrix):
+        cells = "".join(f"{'-':>9}" if np.isnan(v) else f"{v:>9.3f}" for v in row)
+        lines.append(f"{name:<{width}}{cells}")
+    return "\n".join(lines)
+
+
+def write_csv(path: str, header: list[str], rows: list[list]) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def export(data: AgreementData, kappa: np.ndarray, jac: np.ndarray, per_item: np.ndarray, out_dir: str) -> list[str]:
+    os.makedirs(out_dir, exist_ok=True)
+    fmt = lambda v: "" if np.isnan(v) else f"{v:.4f}"
+    paths = []
+
+    path = os.path.join(out_dir, "kappa_cohen.csv")
+    write_csv(path, ["Modelo"] + data.models, [[m] + [fmt(v) for v in row] for m, row in zip(data.models, kappa)])
+    paths.append(path)
+
+    path = os.path.join(out_dir, "jaccard_release.csv")
+    rows = []
+    for a in range(len(data.models)):
+        for b in range(a + 1, len(data.models)):
+            for ri in np.flatnonzero(~np.isnan(jac[a, b])):
+                rows.append([data.models[a], data.models[b], data.releases[ri], fmt(jac[a, b, ri])])
+    write_csv(path, ["ModeloA", "ModeloB", "Release", "Jaccard"], rows)
+    paths.append(path)
+
+    path = os.path.join(out_dir, "kappa_fleiss_item.csv")
+    write_csv(path, ["Item", "KappaFleiss"], [[label, fmt(v)] for label, v in zip(data.labels, per_item)])
+    paths.append(path)
+    return paths
+
+
+def bench(models: int, releases: int) -> None:
+    rng = np.random.default_rng(0)
+    # taxa de smells diferente por modelo, como entre Phi-3 e Qwen-3B
+    rates = rng.uniform(0.02, 0.4, models)[:, None, None]
+    counts = (rng.random((models, releases, len(SMELLS))) < rates).astype(np.int32)
+    counts[..., 0] = counts[..., 1:].sum(axis=2) == 0
+    t0 = time.perf_counter()
+    indicator, analyzed, _ = build_indicator(counts)
+    t1 = time.perf_counter()
+    cohen_kappa_matrix(indicator, analyzed)
+    t2 = time.perf_counter()
+    jac = jaccard_per_release(indicator, analyzed)
+    nanmean_pairs(jac)
+    t3 = time.perf_counter()
+    fleiss_kappa(indicator, analyzed)
+    t4 = time.perf_counter()
+    print(f"{models} modelos x {releases} releases x {len(SMELLS) - 1} smells")
+    print(f"  matriz indicadora: {(t1 - t0) * 1000:.1f}ms")
+    print(f"  kappa de Cohen ({models * (models - 1) // 2} pares): {(t2 - t1) * 1000:.1f}ms")
+    print(f"  Jaccard por par e release: {(t3 - t2) * 1000:.1f}ms")
+    print(f"  kappa de Fleiss: {(t4 - t3) * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concordância entre os modelos.")
+    parser.add_argument("resultados", nargs="*", help="arquivos de resultado (padrão: analises/*.csv)")
+    parser.add_argument("--dir", default=DEFAULT_STORE_DIR, help="pasta do store de resultados")
+    parser.add_argument("--modelos", help="modelos a comparar, separados por vírgula (padrão: todos)")
+    parser.add_argument("--nivel", default="smell", choices=["smell", "categoria"])
+    parser.add_argument("--saida", help="pasta para os CSVs (kappa, Jaccard por release, Fleiss por item)")
+    parser.add_argument("--bench", action="store_true", help="mede sobre dados sintéticos e sai")
+    parser.add_argument("--bench-modelos", type=int, default=40)
+    parser.add_argument("--bench-releases", type=int, default=5000)
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.bench:
+        bench(args.bench_modelos, args.bench_releases)
+        return
+
+    store = ResultsStore(args.dir)
+    paths = args.resultados or sorted(glob.glob(os.path.join("analises", "*.csv")))
+    print(store.ingest(paths).report())
+
+    models = args.modelos.split(",") if args.modelos else None
+    data = load_data(store, models, args.nivel)
+    # modelos sem nenhuma release analisada só poluem as matrizes
+    keep = data.analyzed.any(axis=1)
+    if not keep.all():
+        print(f"Sem resultados válidos: {', '.join(np.array(data.models)[~keep])}")
+        data = AgreementData(
+            [m for m, k in zip(data.models, keep) if k],
+            data.releases,
+            data.labels,
+            data.indicator[keep],
+            data.analyzed[keep],
+        )
+
+    t0 = time.perf_counter()
+    kappa = cohen_kappa_matrix(data.indicator, data.analyzed)
+    jac = jaccard_per_release(data.indicator, data.analyzed)
+    fleiss, per_item, used = fleiss_kappa(data.indicator, data.analyzed)
+    elapsed = time.perf_counter() - t0
+
+    print(f"\nKappa de Cohen ({args.nivel}):")
+    print(format_matrix(data.models, kappa))
+    print("\nJaccard médio por release:")
+    print(format_matrix(data.models, nanmean_pairs(jac)))
+    print(f"\nKappa de Fleiss ({len(data.models)} modelos, {used} releases em comum): {fleiss:.3f}")
+    print(f"({elapsed * 1000:.1f}ms)")
+
+    if args.saida:
+        for path in export(data, kappa, jac, per_item, args.saida):
+            print(f"OK -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable
+
+
+# Pipeline produtor/consumidor com filas limitadas entre os estágios. Cada
+# estágio tem seu número de workers; o sink recebe os itens na ordem de
+# entrada, mesmo que os estágios terminem fora de ordem.
+
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    items: int = 0
+    busy_s: float = 0.0
+    depth_samples: int = 0
+    depth_sum: int = 0
+    depth_max: int = 0
+
+    @property
+    def depth_mean(self) -> float:
+        return self.depth_sum / self.depth_samples if self.depth_samples else 0.0
+
+
+@dataclass
+class PipelineStats:
+    stages: list[StageStats] = field(default_factory=list)
+    total_s: float = 0.0
+
+    def report(self) -> str:
+        lines = [f"Pipeline: {self.total_s:.2f}s no total"]
+        for s in self.stages:
+            # utilização ~1.0 em um estágio indica o gargalo
+            util = s.busy_s / (s.workers * self.total_s) if self.total_s else 0.0
+            lines.append(
+                f"  {s.name:<10} workers={s.workers} itens={s.items} "
+                f"ocupado={s.busy_s:.2f}s utilização={util:.0%} "
+                f"fila de entrada média={s.depth_mean:.1f} máx={s.depth_max}"
+            )
+        return "\n".join(lines)
+
+
+class Pipeline:
+    def __init__(
+        self,
+        stages: list[Stage],
+        sink: Callable[[Any], None],
+        queue_size: int = 4,
+        sample_every_s: float = 0.05,
+    ):
+        if not stages:
+            raise ValueError("pipeline precisa de pelo menos um estágio")
+        for stage in stages:
+            # sem workers, os itens param na fila do estágio e o pipeline não termina
+            if stage.workers < 1:
+                raise ValueError(f"Estágio {stage.name} precisa de pelo menos 1 worker (recebeu {stage.workers})")
+        self.stages = stages
+        self.sink = sink
+        self.queue_size = queue_size
+        self.sample_every_s = sample_every_s
+        self._error: BaseException | None = None
+        self._stop = threading.Event()
+
+    def _fail(self, exc: BaseException) -> None:
+        if self._error is None:
+            self._error = exc
+        self._stop.set()
+
+    def _worker(
+        self,
+        stage: Stage,
+        stats: StageStats,
+        inbox: queue.Queue,
+        outbox: queue.Queue,
+        remaining: list[int],
+        lock: threading.Lock,
+        next_workers: int,
+    ) -> None:
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            seq, value = item
+            if self._stop.is_set():
+                continue
+            t0 = time.perf_counter()
+            try:
+                result = stage.fn(value)
+            except BaseException as e:
+                self._fail(e)
+                continue
+            elapsed = time.perf_counter() - t0
+            with lock:
+                stats.items += 1
+                stats.busy_s += elapsed
+            outbox.put((seq, result))
+
+        # o último worker do estágio avisa o próximo
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(next_workers):
+                outbox.put(_DONE)
+
+    def _writer(self, inbox: queue.Queue) -> None:
+        ready: dict[int, Any] = {}
+        next_seq = 0
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            seq, value = item
+            ready[seq] = value
+            while next_seq in ready and not self._stop.is_set():
+                try:
+                    self.sink(ready.pop(next_seq))
+                except BaseException as e:
+                    self._fail(e)
+                next_seq += 1
+
+    def _monitor(self, queues: list[queue.Queue], stats: list[StageStats], done: threading.Event):
+        while not done.wait(self.sample_every_s):
+            for q, s in zip(queues, stats):
+                depth = q.qsize()
+                s.depth_samples += 1
+                s.depth_sum += depth
+                s.depth_max = max(s.depth_max, depth)
+
+    def run(self, items: Iterable[Any]) -> PipelineStats:
+        start = time.perf_counter()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        queues.append(queue.Queue(maxsize=self.queue_size))
+        stats = [StageStats(s.name, s.workers) for s in self.stages]
+
+        threads = []
+        for i, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            # o writer é um único consumidor
+            next_workers = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            for w in range(stage.workers):
+                t = threading.Thread(
+                    target=self._worker,
+                    args=(stage, stats[i], queues[i], queues[i + 1], remaining, lock, next_workers),
+                    name=f"{stage.name}-{w}",
+                    daemon=True,
+                )
+                t.start()
+                threads.append(t)
+
+        writer = threading.Thread(target=self._writer, args=(queues[-1],), name="writer", daemon=True)
+        writer.start()
+
+        monitor_done = threading.Event()
+        monitor = threading.Thread(
+            target=self._monitor, args=(queues[:-1], stats, monitor_done), daemon=True
+        )
+        monitor.start()
+
+        try:
+            for seq, value in enumerate(items):
+                if self._stop.is_set():
+                    break
+                queues[0].put((seq, value))
+        finally:
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_DONE)
+            for t in threads:
+                t.join()
+            writer.join()
+            monitor_done.set()
+            monitor.join()
+
+        if self._error is not None:
+            raise self._error
+        return PipelineStats(stats, time.perf_counter() - start)
+
+
+def parse_workers(spec: str | None, names: list[str]) -> dict[str, int]:
+    # "download=2,inferencia=4" -> {"download": 2, "inferencia": 4, ...}
+    workers = {name: 1 for name in names}
+    if not spec:
+        return workers
+    for part in spec.split(","):
+        name, _, count = part.partition("=")
+        name = name.strip()
+        if name not in workers:
+            raise ValueError(f"Estágio desconhecido: {name} (use {', '.join(names)})")
+        workers[name] = int(count)
+        if workers[name] < 1:
+            raise ValueError(f"Estágio {name} precisa de pelo menos 1 worker (recebeu {workers[name]})")
+    return workers
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import re
+
+
+# Template de prompt compilado: o texto é lido e dividido uma vez em trechos
+# fixos e campos ({{RELEASE}}, {{DESCRICAO_RELEASE}}, {{CODIGO}}). Cada prompt
+# sai de um único "".join, em vez de três str.replace sobre o texto inteiro.
+# bind() fixa campos que não mudam entre releases (o código, no batch com um
+# arquivo só) e já junta esses valores aos trechos vizinhos.
+
+
+SLOTS = ("RELEASE", "DESCRICAO_RELEASE", "CODIGO")
+PLACEHOLDER_RE = re.compile(r"\{\{([A-Za-z_][A-Za-z0-9_]*)\}\}")
+
+
+class PromptTemplate:
+    def __init__(self, text: str, required: tuple[str, ...] = SLOTS):
+        parts: list[str] = []
+        slots: list[tuple[int, str]] = []
+        pos = 0
+        for match in PLACEHOLDER_RE.finditer(text):
+            parts.append(text[pos:match.start()])
+            slots.append((len(parts), match.group(1)))
+            parts.append("")
+            pos = match.end()
+        parts.append(text[pos:])
+
+        names = {name for _, name in slots}
+        unknown = sorted(names - set(SLOTS))
+        if unknown:
+            raise ValueError(f"Campos desconhecidos no template: {', '.join('{{%s}}' % n for n in unknown)}")
+        missing = [name for name in required if name not in names]
+        if missing:
+            raise ValueError(f"Campos ausentes no template: {', '.join('{{%s}}' % n for n in missing)}")
+
+        self.text = text
+        self.required = required
+        self._parts = parts
+        self._slots = slots
+
+    @classmethod
+    def from_file(cls, path: str, required: tuple[str, ...] = SLOTS) -> "PromptTemplate":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f.read(), required)
+
+    @property
+    def slots(self) -> list[str]:
+        # campos ainda em aberto, na ordem em que aparecem
+        return list(dict.fromkeys(name for _, name in self._slots))
+
+    def bind(self, **values: str) -> "PromptTemplate":
+        # novo template com esses campos preenchidos e os trechos fixos já juntados
+        bound = object.__new__(PromptTemplate)
+        parts: list[str] = []
+        slots: list[tuple[int, str]] = []
+        pending: list[str] = [self._parts[0]]
+        open_slots = dict(self._slots)
+        for i in range(1, len(self._parts)):
+            name = open_slots.get(i)
+            if name is None:
+                pending.append(self._parts[i])
+            elif name in values:
+                pending.append(values[name])
+            else:
+                parts.append("".join(pending))
+                slots.append((len(parts), name))
+                parts.append("")
+                pending = []
+        parts.append("".join(pending))
+
+        bound.text = self.text
+        bound.required = tuple(n for n in self.required if n not in values)
+        bound._parts = parts
+        bound._slots = slots
+        return bound
+
+    def render(self, **values: str) -> str:
+        parts = self._parts.copy()
+        try:
+            for i, name in self._slots:
+                parts[i] = values[name]
+        except KeyError as e:
+            raise ValueError(f"Falta o valor de {{{{{e.args[0]}}}}} no prompt") from None
+        return "".join(parts)
+
+    def build(self, release: str, desc: str, code: str | None = None) -> str:
+        if code is None:
+            return self.render(RELEASE=release, DESCRICAO_RELEASE=desc)
+        return self.render(RELEASE=release, DESCRICAO_RELEASE=desc, CODIGO=code)
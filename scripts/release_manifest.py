@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import sys
+import tarfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from batch_engine import load_releases, release_fields
+from run_hf_batch import ALLOWED_EXTS
+from tarball_cache import TarballCache
+
+
+# Manifesto compacto por release (caminho, tamanho, hash do conteúdo e
+# linguagem) para calcular o que mudou entre duas releases sem reabrir os
+# tarballs. Cada manifesto é um TSV comprimido em <raiz>/<release>.tsv.gz.
+
+
+DEFAULT_MANIFEST_DIR = os.path.join(".cache", "manifestos")
+
+LANGUAGES = {
+    ".ts": "TypeScript",
+    ".tsx": "TypeScript",
+    ".js": "JavaScript",
+    ".jsx": "JavaScript",
+    ".py": "Python",
+    ".java": "Java",
+    ".kt": "Kotlin",
+    ".kts": "Kotlin",
+    ".rb": "Ruby",
+    ".go": "Go",
+    ".rs": "Rust",
+    ".php": "PHP",
+    ".cs": "C#",
+    ".cpp": "C++",
+    ".cc": "C++",
+    ".cxx": "C++",
+    ".c": "C",
+    ".h": "C",
+    ".hpp": "C++",
+    ".scala": "Scala",
+    ".swift": "Swift",
+    ".m": "Objective-C",
+    ".mm": "Objective-C++",
+    ".sh": "Shell",
+    ".ps1": "PowerShell",
+}
+if set(LANGUAGES) != ALLOWED_EXTS:
+    # explícito, e não assert: python -O não pode esconder a divergência
+    raise RuntimeError(
+        "LANGUAGES e ALLOWED_EXTS divergem: "
+        f"{sorted(set(LANGUAGES) ^ ALLOWED_EXTS)}"
+    )
+
+
+@dataclass(frozen=True)
+class FileEntry:
+    size: int
+    digest: str
+    language: str
+
+
+@dataclass
+class ReleaseDelta:
+    added: set[str]
+    removed: set[str]
+    modified: set[str]
+
+    def report(self) -> str:
+        return (
+            f"{len(self.added)} adicionados, {len(self.removed)} removidos, "
+            f"{len(self.modified)} modificados"
+        )
+
+
+def language_of(path: str) -> str | None:
+    return LANGUAGES.get(os.path.splitext(path.lower())[1])
+
+
+def strip_root(name: str) -> str:
+    # o GitHub prefixa tudo com <owner>-<repo>-<sha>/, que muda a cada release
+    return name.split("/", 1)[1] if "/" in name else name
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def scan_tarball(fileobj) -> dict[str, FileEntry]:
+    entries: dict[str, FileEntry] = {}
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            language = language_of(member.name)
+            if language is None:
+                continue
+            extracted = tar.extractfile(member)
+            if not extracted:
+                continue
+            data = extracted.read()
+            entries[strip_root(member.name)] = FileEntry(len(data), content_digest(data), language)
+    return entries
+
+
+class ManifestStore:
+    # manifestos lidos ficam em memória (LRU por store, até max_cached)
+    def __init__(self, root: str = DEFAULT_MANIFEST_DIR, max_cached: int = 64):
+        self.root = root
+        self.max_cached = max_cached
+        self._cache: OrderedDict[str, dict[str, FileEntry]] = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, release: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", release)
+        return os.path.join(self.root, f"{safe}.tsv.gz")
+
+    def has(self, release: str) -> bool:
+        return os.path.exists(self.path(release))
+
+    def save(self, release: str, entries: dict[str, FileEntry]) -> None:
+        path = self.path(release)
+        tmp = f"{path}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8", newline="\n") as f:
+            for name in sorted(entries):
+                e = entries[name]
+                f.write(f"{name}\t{e.size}\t{e.digest}\t{e.language}\n")
+        os.replace(tmp, path)
+        with self._lock:
+            self._cache.pop(path, None)
+
+    def build(self, release: str, tar_path: str) -> dict[str, FileEntry]:
+        with open(tar_path, "rb") as f:
+            entries = scan_tarball(f)
+        self.save(release, entries)
+        return entries
+
+    def load(self, release: str) -> dict[str, FileEntry]:
+        path = self.path(release)
+        with self._lock:
+            entries = self._cache.get(path)
+            if entries is not None:
+                self._cache.move_to_end(path)
+                return entries
+        entries = {}
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                name, size, digest, language = line.rstrip("\n").split("\t")
+                entries[name] = FileEntry(int(size), digest, language)
+        with self._lock:
+            self._cache[path] = entries
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return entries
+
+    def delta(self, old: str, new: str) -> ReleaseDelta:
+        a = self.load(old)
+        b = self.load(new)
+        a_keys = a.keys()
+        b_keys = b.keys()
+        return ReleaseDelta(
+            added=set(b_keys - a_keys),
+            removed=set(a_keys - b_keys),
+            modified={name for name in a_keys & b_keys if a[name].digest != b[name].digest},
+        )
+
+
+def build_all(
+    releases_csv: str, store: ManifestStore, tar_cache: TarballCache, gh_token: str | None
+) -> None:
+    rows = load_releases(releases_csv)
+    total = len(rows)
+    for i, row in enumerate(rows, start=1):
+        release, _ = release_fields(row, i)
+        tar_url = row.get("tarball_url")
+        if not tar_url:
+            print(f"[{i}/{total}] Pulando {release}: sem tarball_url")
+            continue
+        if store.has(release):
+            print(f"[{i}/{total}] {release}: manifesto já existe")
+            continue
+        t0 = time.perf_counter()
+        entries = store.build(release, tar_cache.fetch(tar_url, gh_token))
+        print(f"[{i}/{total}] {release}: {len(entries)} arquivos ({time.perf_counter() - t0:.1f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manifestos de arquivos por release.")
+    parser.add_argument("--dir", default=DEFAULT_MANIFEST_DIR, help="pasta dos manifestos")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_build = sub.add_parser("build", help="gera os manifestos de todas as releases do CSV")
+    p_build.add_argument("csv_releases")
+
+    p_delta = sub.add_parser("delta", help="arquivos que mudaram entre duas releases")
+    p_delta.add_argument("release_antiga")
+    p_delta.add_argument("release_nova")
+    p_delta.add_argument("--listar", action="store_true", help="lista os caminhos")
+
+    args = parser.parse_args(sys.argv[1:])
+    store = ManifestStore(args.dir)
+
+    if args.comando == "build":
+        gh_token = os.getenv("GITHUB_TOKEN") or os.getenv("GH_TOKEN")
+        build_all(args.csv_releases, store, TarballCache.from_env(), gh_token)
+        return
+
+    for release in (args.release_antiga, args.release_nova):
+        if not store.has(release):
+            raise RuntimeError(f"Manifesto não encontrado para {release}. Rode o comando build antes.")
+
+    delta = store.delta(args.release_antiga, args.release_nova)
+    print(f"{args.release_antiga} -> {args.release_nova}: {delta.report()}")
+    if args.listar:
+        for label, names in (("+", delta.added), ("-", delta.removed), ("M", delta.modified)):
+            for name in sorted(names):
+                print(f"{label} {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+
+# Cache em disco das respostas do router, endereçado pelo hash de
+# (modelo com sufixo do provedor, mensagem de sistema, prompt, max_tokens, temperature).
+#
+# A idade de uma entrada é o mtime do arquivo (a gravação, em put), tanto em
+# get quanto em evict; o último uso, para a remoção por LRU, fica no atime.
+
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "hf_respostas")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE_S = 30 * 24 * 3600
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evicted: int = 0
+
+    def report(self) -> str:
+        return (
+            f"Cache: {self.hits} acertos, {self.misses} faltas, "
+            f"{self.writes} gravadas, {self.evicted} removidas"
+        )
+
+
+def cache_key(model: str, system: str, prompt: str, max_tokens: int, temperature: float) -> str:
+    raw = json.dumps([model, system, prompt, max_tokens, temperature], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        root: str = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_s: float | None = DEFAULT_MAX_AGE_S,
+        bypass: bool = False,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        # bypass: ignora o que já está no cache, mas grava as respostas novas
+        self.bypass = bypass
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._size = 0
+        self.evict()
+
+    @classmethod
+    def from_env(cls, bypass: bool = False) -> "ResponseCache":
+        max_mb = os.getenv("HF_CACHE_MAX_MB")
+        max_days = os.getenv("HF_CACHE_MAX_DAYS")
+        return cls(
+            os.getenv("HF_CACHE_DIR", DEFAULT_CACHE_DIR),
+            int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_MAX_BYTES,
+            float(max_days) * 24 * 3600 if max_days else DEFAULT_MAX_AGE_S,
+            bypass or os.getenv("HF_CACHE_BYPASS") == "1",
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def _entries(self) -> list[tuple[str, int, float, float]]:
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, st.st_size, st.st_atime, st.st_mtime))
+        return entries
+
+    def _expired(self, mtime: float, now: float) -> bool:
+        return self.max_age_s is not None and now - mtime > self.max_age_s
+
+    def get(self, key: str) -> str | None:
+        if self.bypass:
+            with self._lock:
+                self.stats.misses += 1
+            return None
+
+        path = self._path(key)
+        try:
+            st = os.stat(path)
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.stats.misses += 1
+            return None
+
+        # mesma idade que evict usa: o mtime, que um acerto não muda
+        if self._expired(st.st_mtime, time.time()):
+            with self._lock:
+                self.stats.misses += 1
+            return None
+
+        # atime marca o último uso, para a remoção por LRU; o mtime (idade) fica
+        os.utime(path, (time.time(), st.st_mtime))
+        with self._lock:
+            self.stats.hits += 1
+        return entry["content"]
+
+    def put(self, key: str, model: str, content: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(
+            {"model": model, "created": time.time(), "content": content}, ensure_ascii=False
+        ).encode("utf-8")
+
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        try:
+            old_size = os.path.getsize(path)
+        except FileNotFoundError:
+            old_size = 0
+        os.replace(tmp, path)
+
+        with self._lock:
+            self.stats.writes += 1
+            self._size += len(data) - old_size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self) -> None:
+        now = time.time()
+        entries = self._entries()
+        size = sum(e[1] for e in entries)
+        removed = 0
+
+        # primeiro as expiradas, depois as menos usadas até caber no limite
+        entries.sort(key=lambda e: (not self._expired(e[3], now), e[2]))
+        for path, entry_size, _, mtime in entries:
+            if not self._expired(mtime, now) and size <= self.max_bytes:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            removed += 1
+
+        with self._lock:
+            self._size = size
+            self.stats.evicted += removed
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable
+
+from smell_catalog import HEADER, NONE_LABEL
+
+
+# Destino único dos resultados das análises. Mantém o arquivo (ou a conexão)
+# aberto e grava as releases em lotes, conforme a FlushPolicy. O formato sai
+# da extensão da saída: .csv, .sqlite/.db ou .parquet.
+#
+# write() recebe um callback opcional, chamado depois que aquela release está
+# de fato no arquivo; é por ele que o journal de checkpoint confirma o offset.
+
+
+COLUMNS = HEADER.split(";")
+
+# nas saídas tabulares, o modelo e a release pedida ficam ao lado da release
+# que o modelo escreveu; é o par (modelo, release) que diz o que já foi
+# processado na retomada, como no journal do CSV
+MODEL_COLUMN = "Modelo"
+SOURCE_COLUMN = "ReleaseOrigem"
+
+OnFlush = Callable[[int | None], None]
+
+
+def result_lines(csv_text: str, release: str, desc: str) -> list[str]:
+    # linhas CSV aproveitáveis da resposta; sem nenhuma, a linha NENHUM
+    kept_lines = []
+    for raw in csv_text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("<think>") or line.startswith("</think>"):
+            continue
+        if line.lower().startswith("release;"):
+            continue
+        if ";" not in line:
+            continue
+        kept_lines.append(line)
+
+    if not kept_lines:
+        kept_lines.append(
+            f"{release};{desc};{NONE_LABEL};{NONE_LABEL};Nenhum code smell identificado"
+        )
+    return kept_lines
+
+
+def split_line(line: str) -> list[str]:
+    # a justificativa pode ter ";" próprio; fica tudo na última coluna
+    parts = line.split(";", len(COLUMNS) - 1)
+    return parts + [""] * (len(COLUMNS) - len(parts))
+
+
+@dataclass
+class FlushPolicy:
+    # grava quando acumular `releases` releases ou `seconds` segundos, o que
+    # vier primeiro; fsync força a ida ao disco a cada gravação
+    releases: int = 1
+    seconds: float = 5.0
+    fsync: bool = False
+
+    @classmethod
+    def from_env(cls) -> "FlushPolicy":
+        default = cls()
+        return cls(
+            int(os.getenv("RESULT_FLUSH_RELEASES", default.releases)),
+            float(os.getenv("RESULT_FLUSH_SECONDS", default.seconds)),
+            os.getenv("RESULT_FSYNC", "0") == "1",
+        )
+
+
+class ResultSink(ABC):
+    def __init__(self, path: str, policy: FlushPolicy | None = None):
+        self.path = path
+        self.policy = policy or FlushPolicy()
+        # (modelo, release) já gravados em execuções anteriores (CSV usa o journal)
+        self.done: set[tuple[str, str]] = set()
+        self.position: int | None = None
+        self.rows_written = 0
+        self.flushes = 0
+        self._pending: list[tuple[str | None, str, str]] = []
+        self._pending_releases = 0
+        self._callbacks: list[OnFlush] = []
+        self._last_flush = time.monotonic()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def write(
+        self,
+        csv_text: str,
+        release: str,
+        desc: str,
+        on_flush: OnFlush | None = None,
+        model: str | None = None,
+    ) -> None:
+        self._pending.extend((model, release, line) for line in result_lines(csv_text, release, desc))
+        self._pending_releases += 1
+        if on_flush is not None:
+            self._callbacks.append(on_flush)
+        if (
+            self._pending_releases >= self.policy.releases
+            or time.monotonic() - self._last_flush >= self.policy.seconds
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            self._write_rows(self._pending)
+            self.rows_written += len(self._pending)
+            self.flushes += 1
+        callbacks, self._callbacks = self._callbacks, []
+        self._pending = []
+        self._pending_releases = 0
+        self._last_flush = time.monotonic()
+        for callback in callbacks:
+            callback(self.position)
+
+    def close(self) -> None:
+        self.flush()
+        self._close()
+
+    def is_done(self, model: str, release: str) -> bool:
+        return (model, release) in self.done
+
+    def report(self) -> str:
+        return f"Resultados: {self.rows_written} linhas em {self.flushes} gravações ({self.path})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @abstractmethod
+    def _write_rows(self, rows: list[tuple[str | None, str, str]]) -> None: ...
+
+    @abstractmethod
+    def _close(self) -> None: ...
+
+
+class CsvSink(ResultSink):
+    def __init__(self, path: str, policy: FlushPolicy | None = None):
+        super().__init__(path, policy)
+        self._fh = open(path, "a", encoding="utf-8", newline="")
+        self.position = self._fh.tell()
+
+    def _write_rows(self, rows: list[tuple[str | None, str, str]]) -> None:
+        # as linhas vão como vieram do modelo, numa única escrita por lote
+        data = "\n".join(line for _, _, line in rows) + "\n"
+        if self.position == 0:
+            data = HEADER + "\n" + data
+        self._fh.write(data)
+        self._fh.flush()
+        if self.policy.fsync:
+            os.fsync(self._fh.fileno())
+        self.position = self._fh.tell()
+
+    def _close(self) -> None:
+        self._fh.close()
+
+
+class SqliteSink(ResultSink):
+    def __init__(self, path: str, policy: FlushPolicy | None = None):
+        super().__init__(path, policy)
+        # aberta aqui, mas gravada da thread de escrita do --pipeline: a
+        # conexão passa entre threads e o lock serializa o uso
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if self.policy.fsync else 'NORMAL'}")
+        self._columns = [MODEL_COLUMN, SOURCE_COLUMN] + COLUMNS
+        columns = ", ".join(f"{c} TEXT" for c in self._columns)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS resultados (id INTEGER PRIMARY KEY, {columns})"
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(resultados)")}
+        if MODEL_COLUMN not in existing:
+            # tabela de antes da coluna de modelo: as linhas antigas ficam sem
+            # modelo e não contam como feitas para nenhum
+            self._conn.execute(f"ALTER TABLE resultados ADD COLUMN {MODEL_COLUMN} TEXT")
+        self._conn.commit()
+        self.done = set(
+            self._conn.execute(
+                f"SELECT DISTINCT {MODEL_COLUMN}, {SOURCE_COLUMN} FROM resultados "
+                f"WHERE {MODEL_COLUMN} IS NOT NULL"
+            )
+        )
+
+    def _write_rows(self, rows: list[tuple[str | None, str, str]]) -> None:
+        values = [[model, release] + split_line(line) for model, release, line in rows]
+        placeholders = ", ".join("?" for _ in self._columns)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO resultados ({', '.join(self._columns)}) VALUES ({placeholders})",
+                values,
+            )
+
+    def _close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ParquetSink(ResultSink):
+    # cada gravação vira um row group; o arquivo só é válido depois de close()
+    def __init__(self, path: str, policy: FlushPolicy | None = None):
+        super().__init__(path, policy)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Saída em Parquet requer pyarrow: pip install pyarrow")
+        self._pa = pa
+        self._columns = [MODEL_COLUMN, SOURCE_COLUMN] + COLUMNS
+        self._schema = pa.schema([(c, pa.string()) for c in self._columns])
+        previous = pq.read_table(path) if os.path.exists(path) else None
+        self._writer = pq.ParquetWriter(f"{path}.tmp", self._schema)
+        if previous is not None:
+            if MODEL_COLUMN not in previous.column_names:
+                # arquivo de antes da coluna de modelo: linhas antigas sem modelo
+                previous = previous.add_column(
+                    0, MODEL_COLUMN, pa.nulls(previous.num_rows, pa.string())
+                )
+            previous = previous.select(self._columns).cast(self._schema)
+            self._writer.write_table(previous)
+            self.done = {
+                (model, release)
+                for model, release in zip(
+                    previous.column(MODEL_COLUMN).to_pylist(),
+                    previous.column(SOURCE_COLUMN).to_pylist(),
+                )
+                if model is not None
+            }
+
+    def _write_rows(self, rows: list[tuple[str | None, str, str]]) -> None:
+        columns = zip(*([model, release] + split_line(line) for model, release, line in rows))
+        self._writer.write_table(
+            self._pa.table({c: list(v) for c, v in zip(self._columns, columns)}, schema=self._schema)
+        )
+
+    def _close(self) -> None:
+        self._writer.close()
+        if self.policy.fsync:
+            with open(f"{self.path}.tmp", "rb") as f:
+                os.fsync(f.fileno())
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+SINKS = {
+    ".csv": CsvSink,
+    ".sqlite": SqliteSink,
+    ".db": SqliteSink,
+    ".parquet": ParquetSink,
+}
+
+
+def is_csv(path: str) -> bool:
+    # o journal de checkpoint (offsets em bytes) só se aplica ao CSV
+    return os.path.splitext(path)[1].lower() == ".csv"
+
+
+def open_sink(path: str, policy: FlushPolicy | None = None) -> ResultSink:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SINKS:
+        raise ValueError(f"Formato de saída desconhecido: {ext} (use {', '.join(SINKS)})")
+    return SINKS[ext](path, policy)
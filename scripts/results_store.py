@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from smell_catalog import CATALOG, NONE_LABEL, canonical_category, canonical_smell
+
+
+# Armazenamento colunar dos resultados em analises/. Cada linha vira
+# (modelo, release, smell) codificados como inteiros, com os dicionários em
+# meta.json e uma coluna .npy por campo. As linhas ficam ordenadas por
+# (modelo, release, smell) e um cubo de contagens modelo x release x smell
+# responde as consultas agregadas sem varrer as linhas.
+#
+# A categoria não é guardada: sai do catálogo a partir do smell. A
+# justificativa também fica de fora; ela continua nos arquivos originais.
+
+
+DEFAULT_STORE_DIR = os.path.join(".cache", "resultados")
+
+# smell 0 / categoria 0 = nenhum smell identificado
+SMELLS = [NONE_LABEL] + [smell for smells in CATALOG.values() for smell in smells]
+CATEGORIES = [NONE_LABEL] + list(CATALOG)
+SMELL_CATEGORY = np.array(
+    [0] + [CATEGORIES.index(c) for c, smells in CATALOG.items() for _ in smells], dtype=np.int8
+)
+_SMELL_CODE = {smell: i for i, smell in enumerate(SMELLS)}
+_CATEGORY_CODE = {category: i for i, category in enumerate(CATEGORIES)}
+
+NONE_VALUES = {NONE_LABEL, "NENHUMA", "N/A", "NA", "-"}
+
+COLUMNS = ("model", "release", "smell", "source")
+DTYPES = {"model": np.int16, "release": np.int32, "smell": np.int8, "source": np.int16}
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    skipped: int = 0
+    rows: int = 0
+    discarded: int = 0
+
+    def report(self) -> str:
+        return (
+            f"Ingestão: {self.files} arquivos lidos, {self.skipped} sem mudança, "
+            f"{self.rows} linhas, {self.discarded} linhas sem smell do catálogo"
+        )
+
+
+def model_name(path: str) -> str:
+    # phi3_resultados.csv -> phi3, olmo_v1.0.0.csv -> olmo
+    name = os.path.basename(path)
+    name = re.sub(r"\.(csv|sqlite|db|parquet)$", "", name)
+    name = re.sub(r"_v\d[\w.-]*$", "", name)
+    return re.sub(r"_resultados$", "", name)
+
+
+def detect_delimiter(first_line: str) -> str:
+    # os scripts gravam ";", mas há arquivos exportados por planilha com ","
+    return ";" if first_line.count(";") >= first_line.count(",") else ","
+
+
+def read_records(path: str):
+    # cada item é a lista de campos de uma linha do arquivo
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".sqlite", ".db"):
+        conn = sqlite3.connect(path)
+        try:
+            yield from (
+                list(row)
+                for row in conn.execute(
+                    "SELECT Release, DescricaoRelease, Categoria, CodeSmell, Justificativa "
+                    "FROM resultados ORDER BY id"
+                )
+            )
+        finally:
+            conn.close()
+        return
+    if ext == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Leitura de Parquet requer pyarrow: pip install pyarrow")
+        table = pq.read_table(
+            path, columns=["Release", "DescricaoRelease", "Categoria", "CodeSmell", "Justificativa"]
+        )
+        yield from (list(row.values()) for row in table.to_pylist())
+        return
+
+    with open(path, newline="", encoding="utf-8", errors="ignore") as f:
+        delimiter = detect_delimiter(f.readline())
+        f.seek(0)
+        yield from csv.reader(f, delimiter=delimiter)
+
+
+def is_release_tag(value: str) -> bool:
+    return bool(value) and not any(c.isspace() for c in value)
+
+
+def extract_smells(fields: list[str], fallback: str = "") -> list[tuple[str, str]]:
+    # Procura pares (Categoria, CodeSmell) em qualquer posição da linha: há
+    # modelos que juntam vários registros numa linha só. A release é o campo
+    # duas posições antes do par (Release;Descricao;Categoria;CodeSmell); se
+    # ele vier vazio ou for texto solto, vale a release do registro anterior.
+    found = []
+    i = 0
+    while i < len(fields) - 1:
+        a, b = fields[i].strip(), fields[i + 1].strip()
+        release = fields[i - 2].strip() if i >= 2 else ""
+        if not is_release_tag(release):
+            release = fields[0].strip() if is_release_tag(fields[0].strip()) else fallback
+        if a.lower() == "categoria":
+            break
+        smell = canonical_smell(b)
+        if smell and (canonical_category(a) or not a):
+            found.append((release, smell))
+            i += 2
+            continue
+        if a.upper() in NONE_VALUES and b.upper() in NONE_VALUES:
+            found.append((release, NONE_LABEL))
+            i += 2
+            continue
+        i += 1
+    return found
+
+
+class ResultsStore:
+    def __init__(self, root: str = DEFAULT_STORE_DIR):
+        self.root = root
+        self.models: list[str] = []
+        self.releases: list[str] = []
+        # arquivo -> {"id", "model", "size", "mtime"}
+        self.sources: dict[str, dict] = {}
+        self.columns = {c: np.zeros(0, dtype=DTYPES[c]) for c in COLUMNS}
+        self.counts = np.zeros((0, 0, len(SMELLS)), dtype=np.int32)
+        self._model_code: dict[str, int] = {}
+        self._release_code: dict[str, int] = {}
+        if os.path.exists(self._path("meta.json")):
+            self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _load(self) -> None:
+        with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["smells"] != SMELLS:
+            raise RuntimeError("Catálogo mudou desde a ingestão; rode ingest --refazer")
+        self.models = meta["models"]
+        self.releases = meta["releases"]
+        self.sources = meta["sources"]
+        self._model_code = {m: i for i, m in enumerate(self.models)}
+        self._release_code = {r: i for i, r in enumerate(self.releases)}
+        # mmap: abrir o store não lê as colunas inteiras
+        self.columns = {c: np.load(self._path(f"{c}.npy"), mmap_mode="r") for c in COLUMNS}
+        self.counts = np.load(self._path("counts.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.columns["model"])
+
+    def _code(self, table: dict[str, int], values: list[str], value: str) -> int:
+        code = table.get(value)
+        if code is None:
+            code = table[value] = len(values)
+            values.append(value)
+        return code
+
+    def parse_file(self, path: str, model: str, source_id: int, stats: IngestStats) -> dict[str, np.ndarray]:
+        model_code = self._code(self._model_code, self.models, model)
+        releases, smells = [], []
+        last_release = ""
+        for fields in read_records(path):
+            found = extract_smells(fields, last_release)
+            if not found:
+                if any(f.strip() for f in fields) and fields[0].strip().lower() != "release":
+                    stats.discarded += 1
+                continue
+            last_release = found[-1][0]
+            for release, smell in found:
+                releases.append(self._code(self._release_code, self.releases, release))
+                smells.append(_SMELL_CODE[smell])
+        n = len(releases)
+        stats.rows += n
+        return {
+            "model": np.full(n, model_code, dtype=DTYPES["model"]),
+            "release": np.array(releases, dtype=DTYPES["release"]),
+            "smell": np.array(smells, dtype=DTYPES["smell"]),
+            "source": np.full(n, source_id, dtype=DTYPES["source"]),
+        }
+
+    def ingest(self, paths: list[str], names: dict[str, str] | None = None, rebuild: bool = False) -> IngestStats:
+        # Só relê arquivos novos ou alterados (tamanho/mtime); as linhas antigas
+        # de um arquivo alterado são descartadas antes de entrar as novas.
+        names = names or {}
+        stats = IngestStats()
+        if rebuild:
+            self.models, self.releases = [], []
+            self._model_code, self._release_code = {}, {}
+            self.sources = {}
+            self.columns = {c: np.zeros(0, dtype=DTYPES[c]) for c in COLUMNS}
+
+        keep = np.ones(len(self), dtype=bool)
+        parts = []
+        next_id = max((s["id"] for s in self.sources.values()), default=-1) + 1
+        for path in paths:
+            key = os.path.abspath(path)
+            st = os.stat(path)
+            model = names.get(path) or model_name(path)
+            old = self.sources.get(key)
+            if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime and old["model"] == model:
+                stats.skipped += 1
+                continue
+            if old:
+                keep &= np.asarray(self.columns["source"]) != old["id"]
+                source_id = old["id"]
+            else:
+                source_id = next_id
+                next_id += 1
+            parts.append(self.parse_file(path, model, source_id, stats))
+            self.sources[key] = {"id": source_id, "model": model, "size": st.st_size, "mtime": st.st_mtime}
+            stats.files += 1
+
+        if parts or not keep.all() or rebuild:
+            columns = {
+                c: np.concatenate([np.asarray(self.columns[c])[keep]] + [p[c] for p in parts])
+                for c in COLUMNS
+            }
+            self._build(columns)
+        return stats
+
+    def _build(self, columns: dict[str, np.ndarray]) -> None:
+        # ordena por (modelo, release, smell) e recalcula o cubo de contagens
+        order = np.lexsort((columns["smell"], columns["release"], columns["model"]))
+        self.columns = {c: columns[c][order] for c in COLUMNS}
+        shape = (len(self.models), len(self.releases), len(SMELLS))
+        flat = (
+            self.columns["model"].astype(np.int64) * shape[1] + self.columns["release"]
+        ) * shape[2] + self.columns["smell"]
+        self.counts = np.bincount(flat, minlength=int(np.prod(shape))).astype(np.int32).reshape(shape)
+        self._save()
+
+    def _save(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        arrays = dict(self.columns, counts=self.counts)
+        for name, array in arrays.items():
+            tmp = self._path(f"{name}.tmp.npy")
+            np.save(tmp, array)
+            os.replace(tmp, self._path(f"{name}.npy"))
+        # meta.json por último: é ele que marca o store como consistente
+        tmp = self._path("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"smells": SMELLS, "models": self.models, "releases": self.releases, "sources": self.sources},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp, self._path("meta.json"))
+
+    def _select(self, model: str | None, release: str | None, smell: str | None, category: str | None):
+        # índices do cubo para cada eixo; None = todos
+        def pick(value, table, label):
+            if value is None:
+                return slice(None)
+            if value not in table:
+                raise KeyError(f"{label} desconhecido: {value}")
+            return table[value]
+
+        m = pick(model, self._model_code, "Modelo")
+        r = pick(release, self._release_code, "Release")
+        if smell is not None:
+            s = pick(canonical_smell(smell) or smell, _SMELL_CODE, "Smell")
+        elif category is not None:
+            code = pick(canonical_category(category) or category, _CATEGORY_CODE, "Categoria")
+            s = np.flatnonzero(SMELL_CATEGORY == code)
+        else:
+            s = slice(None)
+        return m, r, s
+
+    def count(
+        self,
+        model: str | None = None,
+        release: str | None = None,
+        smell: str | None = None,
+        category: str | None = None,
+    ) -> int:
+        m, r, s = self._select(model, release, smell, category)
+        return int(np.asarray(self.counts[m, r][..., s]).sum())
+
+    def per_release(
+        self, smell: str | None = None, category: str | None = None, model: str | None = None
+    ) -> dict[str, dict[str, int]]:
+        # {modelo: {release: contagem}}, só com contagens > 0
+        _, _, s = self._select(None, None, smell, category)
+        cube = np.asarray(self.counts[..., s])
+        if cube.ndim == 3:
+            cube = cube.sum(axis=2)
+        result = {}
+        for mi, name in enumerate(self.models):
+            if model is not None and name != model:
+                continue
+            nz = np.flatnonzero(cube[mi])
+            result[name] = {self.releases[ri]: int(cube[mi, ri]) for ri in nz}
+        return result
+
+    def model_rows(self, model: str) -> slice:
+        # as linhas estão ordenadas por modelo: o intervalo sai por busca binária
+        code = self._model_code[model]
+        column = self.columns["model"]
+        return slice(
+            int(np.searchsorted(column, code, "left")), int(np.searchsorted(column, code, "right"))
+        )
+
+    def summary(self) -> str:
+        lines = [f"{len(self)} linhas, {len(self.models)} modelos, {len(self.releases)} releases"]
+        for mi, name in enumerate(self.models):
+            cube = self.counts[mi]
+            lines.append(
+                f"  {name:<12} {int(cube.sum()):>8} linhas, "
+                f"{int((cube.sum(axis=1) > 0).sum())} releases, "
+                f"{int(cube[:, 0].sum())} sem smell"
+            )
+        return "\n".join(lines)
+
+
+def bench(rows: int, models: int, releases: int) -> None:
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as root:
+        store = ResultsStore(root)
+        store.models = [f"modelo{i}" for i in range(models)]
+        store.releases = [f"v{i}" for i in range(releases)]
+        store._model_code = {m: i for i, m in enumerate(store.models)}
+        store._release_code = {r: i for i, r in enumerate(store.releases)}
+        columns = {
+            "model": rng.integers(0, models, rows, dtype=DTYPES["model"]),
+            "release": rng.integers(0, releases, rows, dtype=DTYPES["release"]),
+            "smell": rng.integers(0, len(SMELLS), rows, dtype=DTYPES["smell"]),
+            "source": np.zeros(rows, dtype=DTYPES["source"]),
+        }
+        t0 = time.perf_counter()
+        store._build(columns)
+        print(f"Build de {rows} linhas: {time.perf_counter() - t0:.2f}s")
+
+        t0 = time.perf_counter()
+        store = ResultsStore(root)
+        print(f"Abertura: {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+        queries = [
+            ("smell por release por modelo", lambda: store.per_release("Long Method")),
+            ("categoria por release por modelo", lambda: store.per_release(category="Bloaters")),
+            ("smell x modelo x release", lambda: store.count("modelo1", "v7", "Feature Envy")),
+            ("smell em todos os modelos", lambda: store.count(smell="Dead Code")),
+        ]
+        for label, query in queries:
+            t0 = time.perf_counter()
+            query()
+            print(f"{label}: {(time.perf_counter() - t0) * 1000:.2f}ms")
+
+        # referência: a mesma contagem varrendo as colunas
+        t0 = time.perf_counter()
+        code = _SMELL_CODE["Long Method"]
+        mask = np.asarray(store.columns["smell"]) == code
+        np.bincount(
+            np.asarray(store.columns["model"])[mask].astype(np.int64) * releases
+            + np.asarray(store.columns["release"])[mask],
+            minlength=models * releases,
+        )
+        print(f"mesma consulta varrendo as linhas: {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store colunar dos resultados em analises/.")
+    parser.add_argument("--dir", default=DEFAULT_STORE_DIR, help="pasta do store")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_ingest = sub.add_parser("ingest", help="lê os arquivos de resultado (padrão: analises/*.csv)")
+    p_ingest.add_argument("arquivos", nargs="*")
+    p_ingest.add_argument(
+        "--modelo", action="append", default=[], help="nome do modelo para um arquivo: arquivo=modelo"
+    )
+    p_ingest.add_argument("--refazer", action="store_true", help="descarta o store e lê tudo de novo")
+
+    p_count = sub.add_parser("conta", help="contagem de linhas com os filtros dados")
+    p_count.add_argument("--modelo")
+    p_count.add_argument("--release")
+    p_count.add_argument("--smell")
+    p_count.add_argument("--categoria")
+    p_count.add_argument("--por-release", action="store_true", help="contagem por modelo e release")
+
+    sub.add_parser("resumo", help="linhas por modelo")
+
+    p_bench = sub.add_parser("bench", help="build e consultas sobre dados sintéticos")
+    p_bench.add_argument("--linhas", type=int, default=20_000_000)
+    p_bench.add_argument("--modelos", type=int, default=8)
+    p_bench.add_argument("--releases", type=int, default=2000)
+
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.comando == "bench":
+        bench(args.linhas, args.modelos, args.releases)
+        return
+
+    if args.comando == "ingest":
+        names = dict(spec.split("=", 1) for spec in args.modelo)
+        paths = args.arquivos or sorted(glob.glob(os.path.join("analises", "*.csv")))
+        paths += [p for p in names if p not in paths]
+        store = ResultsStore(args.dir)
+        t0 = time.perf_counter()
+        stats = store.ingest(paths, names, args.refazer)
+        print(f"{stats.report()} ({time.perf_counter() - t0:.2f}s)")
+        print(store.summary())
+        return
+
+    store = ResultsStore(args.dir)
+    if not store.models:
+        raise RuntimeError(f"Store vazio em {args.dir}. Rode o comando ingest antes.")
+
+    if args.comando == "resumo":
+        print(store.summary())
+        return
+
+    t0 = time.perf_counter()
+    if args.por_release:
+        result = store.per_release(args.smell, args.categoria, args.modelo)
+        elapsed = time.perf_counter() - t0
+        for model, counts in result.items():
+            print(model)
+            for release, n in counts.items():
+                print(f"  {release}: {n}")
+    else:
+        total = store.count(args.modelo, args.release, args.smell, args.categoria)
+        elapsed = time.perf_counter() - t0
+        print(total)
+    print(f"({elapsed * 1000:.2f}ms)")
+
+
+if __name__ == "__main__":
+    main()
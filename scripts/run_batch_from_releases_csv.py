@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
-import csv
+import argparse
 import os
 import sys
-import subprocess
+
+import metrics
+from batch_engine import BatchEngine, load_releases, run_subprocess_batch
+from checkpoint import CheckpointJournal
+from hf_stream import StreamRecorder
+from result_sink import FlushPolicy, is_csv, open_sink
+from response_cache import ResponseCache
 
 
 def find_latest_sample_csv(data_dir: str) -> str:
@@ -18,27 +24,78 @@ def find_latest_sample_csv(data_dir: str) -> str:
     return os.path.join(data_dir, files[-1])
 
 
-def main():
-    if len(sys.argv) < 5:
-        print(
-            "Uso:\n"
-            "python scripts/run_batch_from_releases_csv.py "
-            "<modelo> <csv_releases_30pct> <arquivo_codigo> <arquivo_prompt> [saida_csv]\n\n"
-            "Ex:\n"
-            "python scripts/run_batch_from_releases_csv.py "
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Roda o modelo para cada release do CSV de amostra.",
+        epilog=(
+            "Ex: python scripts/run_batch_from_releases_csv.py "
             "HuggingFaceTB/SmolLM3-3B:hf-inference "
             "data/releases_..._sample_30pct.csv "
             "releases/editor.ts "
             "prompt/code_smells_prompt.txt "
             "analises/smollm3_resultados.csv"
-        )
-        sys.exit(1)
+        ),
+    )
+    parser.add_argument("modelo")
+    parser.add_argument("csv_releases", help="CSV de releases ou AUTO")
+    parser.add_argument("arquivo_codigo")
+    parser.add_argument("arquivo_prompt")
+    parser.add_argument(
+        "saida_csv",
+        nargs="?",
+        help="saída .csv, .sqlite ou .parquet (padrão: analises/<modelo>_resultados.csv)",
+    )
+    parser.add_argument(
+        "--subprocess",
+        action="store_true",
+        help="modo antigo: um processo run_hf.py por release",
+    )
+    parser.add_argument(
+        "--concorrencia",
+        type=int,
+        default=1,
+        help="chamadas simultâneas ao router (1 = sequencial)",
+    )
+    parser.add_argument(
+        "--sem-cache",
+        action="store_true",
+        help="ignora respostas em cache e chama o router de novo",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="lê a resposta em streaming e interrompe repetição, lixo ou excesso de linhas",
+    )
+    parser.add_argument(
+        "--gravar-a-cada",
+        type=int,
+        help="releases acumuladas antes de gravar a saída (padrão: RESULT_FLUSH_RELEASES ou 1)",
+    )
+    parser.add_argument(
+        "--fsync",
+        action="store_true",
+        help="força a ida ao disco a cada gravação da saída",
+    )
+    parser.add_argument(
+        "--metricas",
+        help="prefixo dos arquivos de métricas por estágio (.jsonl e .prom); padrão: METRICS_PATH",
+    )
+    parser.add_argument(
+        "--perfil-ms",
+        type=float,
+        help="intervalo do profiler por amostragem, em ms (grava <prefixo>.folded)",
+    )
+    return parser.parse_args(argv)
 
-    model = sys.argv[1]
-    releases_csv = sys.argv[2]
-    code_file = sys.argv[3]
-    prompt_file = sys.argv[4]
-    out_csv = sys.argv[5] if len(sys.argv) >= 6 else None
+
+def main():
+    args = parse_args(sys.argv[1:])
+
+    model = args.modelo
+    releases_csv = args.csv_releases
+    code_file = args.arquivo_codigo
+    prompt_file = args.arquivo_prompt
+    out_csv = args.saida_csv
 
     if releases_csv == "AUTO":
         releases_csv = find_latest_sample_csv("data")
@@ -58,9 +115,7 @@ def main():
     if not os.path.exists(prompt_file):
         raise RuntimeError(f"Arquivo de prompt não encontrado: {prompt_file}")
 
-    with open(releases_csv, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
+    rows = load_releases(releases_csv)
 
     if not rows:
         raise RuntimeError("CSV de releases está vazio.")
@@ -70,29 +125,73 @@ def main():
     print(f"Modelo: {model}")
     print(f"Saída: {out_csv}")
 
-    for i, row in enumerate(rows, start=1):
-        release = (row.get("tag_name") or row.get("name") or str(row.get("id") or "")).strip()
-        desc = (row.get("name") or "").strip()
-
-        if not release:
-            release = f"release_{i}"
-
-        print(f"[{i}/{total}] Rodando release {release}")
-
-        subprocess.run(
-            [
-                sys.executable,
-                "scripts/run_hf.py",
-                model,
-                release,
-                desc,
-                code_file,
-                prompt_file,
-                out_csv,
-            ],
-            check=True,
+    if args.sem_cache:
+        os.environ["HF_CACHE_BYPASS"] = "1"
+
+    if args.subprocess and not is_csv(out_csv):
+        raise RuntimeError("O modo --subprocess só grava CSV.")
+
+    journal = None
+    if is_csv(out_csv):
+        journal = CheckpointJournal(out_csv)
+        if journal.done:
+            print(f"Checkpoint: {len(journal.done)} releases já concluídas em {journal.path}")
+
+    policy = FlushPolicy.from_env()
+    if args.gravar_a_cada:
+        policy.releases = args.gravar_a_cada
+    if args.fsync:
+        policy.fsync = True
+
+    if args.subprocess:
+        # cada run_hf.py registra a própria release no mesmo JSONL; o .prom
+        # com todas elas é refeito aqui no fim, a partir do JSONL
+        if args.metricas:
+            os.environ["METRICS_PATH"] = args.metricas
+        metrics.configure_from_env(args.metricas, 0)
+    else:
+        metrics.configure_from_env(args.metricas, args.perfil_ms)
+
+    cache = None
+    stream = None
+    sink = None
+    if args.subprocess:
+        start = metrics.get().offset()
+        stats = run_subprocess_batch(model, rows, code_file, prompt_file, out_csv, journal)
+        metrics.get().replay(start)
+    else:
+        token = os.getenv("HF_TOKEN")
+        if not token:
+            raise RuntimeError('HF_TOKEN não definido. No PowerShell: $env:HF_TOKEN="hf_..."')
+        if os.getenv("HF_CACHE", "1") != "0":
+            cache = ResponseCache.from_env()
+        if args.stream:
+            stream = StreamRecorder(path=f"{out_csv}.stream.jsonl")
+        sink = open_sink(out_csv, policy)
+        if sink.done:
+            print(f"Retomada: {len(sink.done)} releases já gravadas em {out_csv}")
+        engine = BatchEngine.from_files(
+            model, code_file, prompt_file, out_csv, token, cache, journal, stream, sink
         )
-
+        try:
+            if args.concorrencia > 1:
+                stats = engine.run_async(rows, args.concorrencia)
+            else:
+                stats = engine.run(rows)
+        finally:
+            engine.close()
+
+    if journal is not None:
+        journal.close()
+    print(stats.report())
+    if sink is not None:
+        print(sink.report())
+    if cache is not None:
+        print(cache.stats.report())
+    if stream is not None:
+        print(stream.report())
+    metrics.close()
+    print(metrics.report())
     print("Finalizado.")
 
 
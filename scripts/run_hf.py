@@ -1,20 +1,133 @@
 #!/usr/bin/env python3
 import os
 import sys
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Callable, TypeVar
+
 import requests
 
+import http_client
+import metrics
+from hf_stream import StreamRecorder
+from prompt_template import PromptTemplate
+from response_cache import ResponseCache, cache_key
+from result_sink import CsvSink
+
+
+# evita prompt gigante e reduz chance de 504 ou resposta cortada
+MAX_CHARS = 25000
+
+SYSTEM_MESSAGE = (
+    "Responda somente com CSV separado por ponto e vírgula. "
+    "Não use markdown. Não escreva explicações. "
+    "Não escreva tags como <think>. "
+    "Não repita o cabeçalho."
+)
+MAX_TOKENS = 900
+TEMPERATURE = 0.2
+
+# status em que vale esperar e tentar de novo
+RETRY_STATUS = {429, 503}
+MAX_BACKOFF_S = 60.0
+MAX_RETRIES = 5
+
+T = TypeVar("T")
+
+
+class HFRouterError(RuntimeError):
+    def __init__(self, status_code: int, text: str, retry_after: float | None = None):
+        super().__init__(f"Erro HF {status_code}: {text[:800]}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    # Retry-After pode vir em segundos ou como data HTTP
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+# Pausa compartilhada por todas as chamadas do processo: o Retry-After de uma
+# resposta vale também para as outras threads (dispatcher assíncrono, workers
+# de inferência do pipeline), e não só para a chamada que recebeu o 429.
+_pause_lock = threading.Lock()
+_paused_until = 0.0
+_retries = 0
+
+
+def retry_count() -> int:
+    # novas tentativas feitas pelo processo até agora
+    return _retries
+
+
+def wait_pause() -> None:
+    while True:
+        with _pause_lock:
+            delay = _paused_until - time.monotonic()
+        if delay <= 0:
+            return
+        time.sleep(delay)
+
+
+def with_retries(call: Callable[[], T], label: str, max_retries: int = MAX_RETRIES) -> T:
+    # repete `call` depois de 429/503, esperando o Retry-After ou, sem ele,
+    # um backoff exponencial até MAX_BACKOFF_S
+    global _paused_until, _retries
+    attempt = 0
+    while True:
+        wait_pause()
+        try:
+            return call()
+        except HFRouterError as e:
+            if e.status_code not in RETRY_STATUS or attempt >= max_retries:
+                raise
+            wait = e.retry_after
+            if wait is None:
+                wait = min(MAX_BACKOFF_S, 2.0 ** attempt)
+            with _pause_lock:
+                _paused_until = max(_paused_until, time.monotonic() + wait)
+                _retries += 1
+            attempt += 1
+            metrics.add("retries")
+            print(f"{label}: HTTP {e.status_code}, nova tentativa em {wait:.1f}s")
+
 
 def load_prompt_template(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
 
-def build_prompt(template: str, release: str, desc: str, code: str) -> str:
-    return (
-        template.replace("{{RELEASE}}", release)
-        .replace("{{DESCRICAO_RELEASE}}", desc)
-        .replace("{{CODIGO}}", code)
-    )
+def load_code(path: str, max_chars: int = MAX_CHARS) -> str:
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        code = f.read()
+    if len(code) > max_chars:
+        code = code[:max_chars]
+    return code
+
+
+@lru_cache(maxsize=8)
+def compile_prompt(template: str) -> PromptTemplate:
+    # o mesmo texto de template é compilado uma vez por processo
+    return PromptTemplate(template)
+
+
+def build_prompt(template: str | PromptTemplate, release: str, desc: str, code: str) -> str:
+    if not isinstance(template, PromptTemplate):
+        template = compile_prompt(template)
+    return template.build(release, desc, code)
 
 
 def ensure_provider_suffix(model: str) -> str:
@@ -25,8 +138,28 @@ def ensure_provider_suffix(model: str) -> str:
     return f"{model}:hf-inference"
 
 
-def call_hf_router_chat(model: str, prompt: str, token: str) -> str:
-    url = "https://router.huggingface.co/v1/chat/completions"
+def call_hf_router_chat(
+    model: str,
+    prompt: str,
+    token: str,
+    session: requests.Session | None = None,
+    cache: ResponseCache | None = None,
+    stream: StreamRecorder | None = None,
+    label: str | None = None,
+    max_retries: int = MAX_RETRIES,
+) -> str:
+    config = http_client.get_config()
+    url = config.chat_completions_url()
+    full_model = ensure_provider_suffix(model)
+
+    key = None
+    if cache is not None:
+        key = cache_key(full_model, SYSTEM_MESSAGE, prompt, MAX_TOKENS, TEMPERATURE)
+        cached = cache.get(key)
+        if cached is not None:
+            print("Cache:", full_model)
+            metrics.add("cache_hits")
+            return cached
 
     headers = {
         "Authorization": f"Bearer {token}",
@@ -35,68 +168,71 @@ def call_hf_router_chat(model: str, prompt: str, token: str) -> str:
     }
 
     payload = {
-        "model": ensure_provider_suffix(model),
+        "model": full_model,
         "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "Responda somente com CSV separado por ponto e vírgula. "
-                    "Não use markdown. Não escreva explicações. "
-                    "Não escreva tags como <think>. "
-                    "Não repita o cabeçalho."
-                ),
-            },
+            {"role": "system", "content": SYSTEM_MESSAGE},
             {"role": "user", "content": prompt},
         ],
-        "max_tokens": 900,
-        "temperature": 0.2,
-        "stream": False,
+        "max_tokens": MAX_TOKENS,
+        "temperature": TEMPERATURE,
+        "stream": stream is not None,
     }
 
     print("Chamando:", url)
     print("Modelo:", payload["model"])
 
-    r = requests.post(url, headers=headers, json=payload, timeout=600)
-
-    if r.status_code != 200:
-        raise RuntimeError(f"Erro HF {r.status_code}: {r.text[:800]}")
-
-    data = r.json()
+    session = session or http_client.get_session()
+    timeout = config.router_timeout()
+
+    def attempt():
+        started = time.perf_counter()
+        # a duração registrada inclui as chamadas que falham (429, 504...)
+        with metrics.stage("inferencia"):
+            r = session.post(
+                url, headers=headers, json=payload, timeout=timeout, stream=stream is not None
+            )
+
+            if r.status_code != 200:
+                raise HFRouterError(
+                    r.status_code, r.text, parse_retry_after(r.headers.get("Retry-After"))
+                )
+
+            if stream is not None:
+                return stream.read(r, full_model, label, started)
+            return r.json(), None
+
+    body, stats = with_retries(attempt, label or full_model, max_retries)
+
+    if stream is not None:
+        content = body
+        metrics.add("completion_tokens", stats.tokens)
+        # resposta interrompida não vale para a mesma chave sem streaming
+        if cache is not None and stats.stop_reason is None:
+            cache.put(key, full_model, content)
+        return content
+
+    data = body
     try:
-        return data["choices"][0]["message"]["content"]
+        content = data["choices"][0]["message"]["content"]
     except Exception:
         raise RuntimeError(f"Resposta inesperada: {data}")
 
+    usage = data.get("usage") or {}
+    if usage.get("prompt_tokens"):
+        metrics.add("prompt_tokens", usage["prompt_tokens"])
+    if usage.get("completion_tokens"):
+        metrics.add("completion_tokens", usage["completion_tokens"])
+
+    if cache is not None:
+        cache.put(key, full_model, content)
+    return content
 
-def append_csv(out_path: str, csv_text: str, release: str, desc: str):
-    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
-
-    write_header = not os.path.exists(out_path) or os.path.getsize(out_path) == 0
-    header = "Release;DescricaoRelease;Categoria;CodeSmell;Justificativa\n"
-
-    kept_lines = []
-    for raw in csv_text.splitlines():
-        line = raw.strip()
-        if not line:
-            continue
-        if line.startswith("<think>") or line.startswith("</think>"):
-            continue
-        if line.lower().startswith("release;"):
-            continue
-        if ";" not in line:
-            continue
-        kept_lines.append(line)
-
-    if not kept_lines:
-        kept_lines.append(
-            f"{release};{desc};NENHUM;NENHUM;Nenhum code smell identificado"
-        )
 
-    with open(out_path, "a", encoding="utf-8", newline="") as f:
-        if write_header:
-            f.write(header)
-        if kept_lines:
-            f.write("\n".join(kept_lines) + "\n")
+def append_csv(out_path: str, csv_text: str, release: str, desc: str) -> int:
+    # uma release avulsa; devolve o tamanho do arquivo depois da escrita
+    with CsvSink(out_path) as sink:
+        sink.write(csv_text, release, desc)
+    return sink.position
 
 
 def main():
@@ -118,20 +254,28 @@ def main():
     if not token:
         raise RuntimeError('HF_TOKEN não definido. No PowerShell: $env:HF_TOKEN="hf_..."')
 
+    metrics.configure_from_env()
+
     template = load_prompt_template(prompt_path)
 
-    with open(code_path, "r", encoding="utf-8", errors="ignore") as f:
-        code = f.read()
+    code = load_code(code_path)
+
+    cache = None
+    if os.getenv("HF_CACHE", "1") != "0":
+        cache = ResponseCache.from_env()
 
-    # evita prompt gigante e reduz chance de 504 ou resposta cortada
-    MAX_CHARS = 25000
-    if len(code) > MAX_CHARS:
-        code = code[:MAX_CHARS]
+    stream = None
+    if os.getenv("HF_STREAM", "0") == "1":
+        stream = StreamRecorder()
 
-    prompt = build_prompt(template, release, desc, code)
-    result = call_hf_router_chat(model, prompt, token)
+    with metrics.release_scope(release):
+        with metrics.stage("prompt"):
+            prompt = build_prompt(template, release, desc, code)
+        result = call_hf_router_chat(model, prompt, token, cache=cache, stream=stream, label=release)
 
-    append_csv(out_path, result, release, desc)
+        with metrics.stage("escrita"):
+            append_csv(out_path, result, release, desc)
+    metrics.close()
 
     print(f"OK: resultado acrescentado em {out_path}")
 
@@ -1,19 +1,30 @@
 #!/usr/bin/env python3
+import argparse
 import csv
 import io
 import os
+import shutil
 import sys
 import tarfile
-import requests
+import tempfile
+import threading
+from contextlib import contextmanager
 
-from run_hf import (
-    append_csv,
-    build_prompt,
-    call_hf_router_chat,
-    load_prompt_template,
-)
+import http_client
+import metrics
+from async_dispatch import ReleaseJob, current_release, ensure_pool_size, run_concurrent
+from checkpoint import CheckpointJournal
+from hf_stream import StreamRecorder
+from pipeline import Pipeline, Stage, parse_workers
+from prompt_template import PromptTemplate
+from response_cache import ResponseCache
+from tarball_cache import TarballCache
+from result_sink import FlushPolicy, ResultSink, is_csv, open_sink
+from run_hf import build_prompt, call_hf_router_chat
 
 
+PIPELINE_STAGES = ["download", "extracao", "prompt", "inferencia"]
+
 MAX_CHARS = 25_000
 MAX_FILE_BYTES = 200_000
 ALLOWED_EXTS = {
@@ -45,35 +56,69 @@ ALLOWED_EXTS = {
 }
 
 
-def download_tarball(url: str, token: str | None) -> bytes:
+def _github_get(url: str, token: str | None, stream: bool = False):
     headers = {"Accept": "application/vnd.github+json"}
     if token:
         headers["Authorization"] = f"Bearer {token}"
 
-    r = requests.get(url, headers=headers, timeout=180)
+    config = http_client.get_config()
+    url = config.github_url(url)
+    session = http_client.get_session()
+    r = session.get(url, headers=headers, timeout=config.github_timeout(), stream=stream)
     if r.status_code != 200:
         raise RuntimeError(f"Erro {r.status_code} ao baixar {url}: {r.text[:300]}")
-    return r.content
+    return r
 
 
-def extract_text_from_tarball(blob: bytes, max_chars: int = MAX_CHARS) -> str:
-    buf = io.BytesIO(blob)
+def download_tarball(url: str, token: str | None) -> bytes:
+    with metrics.stage("download"):
+        blob = _github_get(url, token).content
+    metrics.add("bytes_downloaded", len(blob))
+    return blob
+
+
+def download_tarball_to_file(url: str, token: str | None) -> str:
+    # em streaming para um arquivo temporário, sem o corpo inteiro em memória;
+    # quem lê apaga o arquivo; um download interrompido apaga o seu aqui
+    r = _github_get(url, token, stream=True)
+    f = tempfile.NamedTemporaryFile(prefix="release_", suffix=".tar.gz", delete=False)
+    try:
+        with metrics.stage("download"), f:
+            shutil.copyfileobj(r.raw, f, 1024 * 1024)
+    except BaseException:
+        os.remove(f.name)
+        raise
+    finally:
+        metrics.add("bytes_downloaded", r.raw.tell())
+        r.close()
+    return f.name
+
+
+def is_candidate_member(member: tarfile.TarInfo) -> bool:
+    if not member.isfile():
+        return False
+    if member.size > MAX_FILE_BYTES:
+        return False
+
+    # cheap binary guard by extension
+    name_lower = member.name.lower()
+    if "." in name_lower:
+        _, ext = os.path.splitext(name_lower)
+        if ext and ext not in ALLOWED_EXTS:
+            return False
+    return True
+
+
+def extract_text_from_stream(fileobj, max_chars: int = MAX_CHARS) -> str:
+    # modo "r|gz": descompacta à medida que os bytes chegam, sem montar o
+    # índice do arquivo inteiro, e para assim que o orçamento de caracteres enche
     texts: list[str] = []
     total = 0
 
-    with tarfile.open(fileobj=buf, mode="r:gz") as tar:
-        for member in tar.getmembers():
-            if not member.isfile():
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+        for member in tar:
+            if not is_candidate_member(member):
                 continue
-            if member.size > MAX_FILE_BYTES:
-                continue
-
-            # cheap binary guard by extension
-            name_lower = member.name.lower()
-            if "." in name_lower:
-                _, ext = os.path.splitext(name_lower)
-                if ext and ext not in ALLOWED_EXTS:
-                    continue
 
             extracted = tar.extractfile(member)
             if not extracted:
@@ -99,18 +144,196 @@ def extract_text_from_tarball(blob: bytes, max_chars: int = MAX_CHARS) -> str:
     return "\n\n".join(texts)
 
 
-def main():
-    if len(sys.argv) < 5:
-        print("Uso:")
+def extract_text_from_tarball(blob: bytes, max_chars: int = MAX_CHARS) -> str:
+    return extract_text_from_stream(io.BytesIO(blob), max_chars)
+
+
+def stream_text_from_tarball(url: str, token: str | None, max_chars: int = MAX_CHARS) -> str:
+    # download e extração se sobrepõem; o estágio mede os dois juntos
+    with metrics.stage("download_extracao"):
+        r = _github_get(url, token, stream=True)
+        try:
+            # desfaz só a codificação de transporte; o .tar.gz segue comprimido
+            r.raw.decode_content = True
+            return extract_text_from_stream(r.raw, max_chars)
+        finally:
+            metrics.add("bytes_downloaded", r.raw.tell())
+            # fecha a conexão mesmo que o download não tenha terminado
+            r.close()
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Baixa o código de cada release e roda o modelo sobre ele."
+    )
+    parser.add_argument("modelo")
+    parser.add_argument("csv_releases")
+    parser.add_argument("arquivo_prompt")
+    parser.add_argument("saida_csv", help="saída .csv, .sqlite ou .parquet")
+    parser.add_argument(
+        "--concorrencia",
+        type=int,
+        default=1,
+        help="releases processadas simultaneamente (1 = sequencial)",
+    )
+    parser.add_argument(
+        "--sem-cache",
+        action="store_true",
+        help="ignora respostas em cache e chama o router de novo",
+    )
+    parser.add_argument(
+        "--sem-cache-tarballs",
+        action="store_true",
+        help="não guarda os tarballs em disco (baixa em streaming a cada execução)",
+    )
+    parser.add_argument(
+        "--sem-revalidar",
+        action="store_true",
+        help="usa o tarball em cache sem requisição condicional ao GitHub",
+    )
+    parser.add_argument(
+        "--orcamento-tokens",
+        action="store_true",
+        help="empacota o código pelo orçamento de tokens do modelo em vez de MAX_CHARS",
+    )
+    parser.add_argument(
+        "--prioridade",
+        default="maiores",
+        choices=["maiores", "alterados", "ordem", "suspeitos"],
+        help="ordem de preenchimento do orçamento de tokens (ordem: a do tarball, que só é lido "
+        "até o orçamento encher; suspeitos: pela pontuação do --pre-filtro)",
+    )
+    parser.add_argument(
+        "--manifestos",
+        help="pasta dos manifestos de release (necessária para --prioridade alterados)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="sobrepõe download, extração, prompt, inferência e escrita em estágios; "
+        "com --sem-cache-tarballs, cada tarball é baixado inteiro para um arquivo "
+        "temporário (sem a parada antecipada do streaming)",
+    )
+    parser.add_argument(
+        "--workers",
+        help="workers por estágio do pipeline, ex.: download=2,inferencia=4",
+    )
+    parser.add_argument(
+        "--fila",
+        type=int,
+        default=4,
+        help="tamanho máximo de cada fila entre estágios do pipeline",
+    )
+    parser.add_argument(
+        "--pre-filtro",
+        nargs="?",
+        type=float,
+        const=1.0,
+        metavar="MINIMO",
+        help="mede os arquivos localmente e só manda ao modelo os com pontuação >= MINIMO "
+        "(padrão 1; 0 só ordena), os mais suspeitos primeiro",
+    )
+    parser.add_argument(
+        "--shards",
+        action="store_true",
+        help="analisa a release inteira em shards do tamanho do orçamento e junta os achados",
+    )
+    parser.add_argument(
+        "--max-shards",
+        type=int,
+        default=0,
+        help="limite de shards por release com --shards (0 = sem limite)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="lê a resposta em streaming e interrompe repetição, lixo ou excesso de linhas",
+    )
+    parser.add_argument(
+        "--gravar-a-cada",
+        type=int,
+        help="releases acumuladas antes de gravar a saída (padrão: RESULT_FLUSH_RELEASES ou 1)",
+    )
+    parser.add_argument(
+        "--fsync",
+        action="store_true",
+        help="força a ida ao disco a cada gravação da saída",
+    )
+    parser.add_argument(
+        "--metricas",
+        help="prefixo dos arquivos de métricas por estágio (.jsonl e .prom); padrão: METRICS_PATH",
+    )
+    parser.add_argument(
+        "--perfil-ms",
+        type=float,
+        help="intervalo do profiler por amostragem, em ms (grava <prefixo>.folded)",
+    )
+    return parser.parse_args(argv)
+
+
+def load_release_code(
+    tar_url: str, gh_token: str | None, tar_cache: TarballCache | None = None
+) -> str:
+    if tar_cache is None:
+        return stream_text_from_tarball(tar_url, gh_token, MAX_CHARS)
+    with open(tar_cache.fetch(tar_url, gh_token), "rb") as f, metrics.stage("extracao"):
+        return extract_text_from_stream(f, MAX_CHARS)
+
+
+@contextmanager
+def open_release_archive(tar_url: str, gh_token: str | None, tar_cache: TarballCache | None = None):
+    if tar_cache is not None:
+        with open(tar_cache.fetch(tar_url, gh_token), "rb") as f:
+            yield f
+        return
+    r = _github_get(tar_url, gh_token, stream=True)
+    try:
+        r.raw.decode_content = True
+        yield r.raw
+    finally:
+        metrics.add("bytes_downloaded", r.raw.tell())
+        r.close()
+
+
+def prepare_prompt(
+    template: PromptTemplate,
+    release: str,
+    desc: str,
+    tar_url: str,
+    gh_token: str | None,
+    tar_cache: TarballCache | None = None,
+    packer=None,
+    prefilter=None,
+) -> str | None:
+    # None quando não sobra código (nada elegível, ou nada suspeito com
+    # --pre-filtro): a release recebe a linha NENHUM sem chamar o modelo,
+    # como no --shards
+    if packer is None and prefilter is not None:
+        with open_release_archive(tar_url, gh_token, tar_cache) as f, metrics.stage("extracao"):
+            code = prefilter.extract(f, MAX_CHARS)
+    elif packer is None:
+        code = load_release_code(tar_url, gh_token, tar_cache)
+    else:
+        with open_release_archive(tar_url, gh_token, tar_cache) as f, metrics.stage("extracao"):
+            packed = packer.pack(release, desc, f)
         print(
-            "python scripts/run_hf_batch.py <modelo> <csv_releases> <arquivo_prompt> <saida_csv>"
+            f"{release}: {packed.tokens}/{packed.budget} tokens, "
+            f"{packed.included} arquivos incluídos, {packed.skipped} fora do orçamento"
         )
-        sys.exit(1)
+        code = packed.code
+    if not code:
+        return None
+    with metrics.stage("prompt"):
+        return build_prompt(template, release, desc, code)
 
-    model = sys.argv[1]
-    releases_csv = sys.argv[2]
-    prompt_path = sys.argv[3]
-    out_path = sys.argv[4]
+
+def main():
+    args = parse_args(sys.argv[1:])
+
+    model = args.modelo
+    releases_csv = args.csv_releases
+    prompt_path = args.arquivo_prompt
+    out_path = args.saida_csv
 
     hf_token = os.getenv("HF_TOKEN")
     if not hf_token:
@@ -118,11 +341,164 @@ def main():
 
     gh_token = os.getenv("GITHUB_TOKEN") or os.getenv("GH_TOKEN")
 
-    template = load_prompt_template(prompt_path)
+    metrics.configure_from_env(args.metricas, args.perfil_ms)
+
+    # compilado e validado uma vez, antes de qualquer download
+    template = PromptTemplate.from_file(prompt_path)
+
+    cache = None
+    if os.getenv("HF_CACHE", "1") != "0":
+        cache = ResponseCache.from_env(bypass=args.sem_cache)
+
+    tar_cache = None
+    if not args.sem_cache_tarballs:
+        tar_cache = TarballCache.from_env(revalidate=not args.sem_revalidar)
+
+    prefilter = None
+    if args.pre_filtro is not None:
+        # import tardio: static_prefilter depende deste módulo
+        from static_prefilter import Prefilter
+
+        prefilter = Prefilter.from_env(args.pre_filtro)
+    elif args.prioridade == "suspeitos":
+        raise RuntimeError("--prioridade suspeitos requer --pre-filtro")
+    if args.prioridade == "alterados" and not args.manifestos:
+        raise RuntimeError("--prioridade alterados requer --manifestos")
+
+    packer = None
+    if args.orcamento_tokens and not args.shards:
+        # import tardio: token_packer depende deste módulo
+        from batch_engine import load_releases
+        from release_manifest import ManifestStore
+        from token_packer import ReleasePacker, previous_releases
 
+        packer = ReleasePacker(
+            model,
+            template.text,
+            args.prioridade,
+            ManifestStore(args.manifestos) if args.manifestos else None,
+            previous_releases(load_releases(releases_csv)),
+            prefilter=prefilter,
+        )
+
+    stream = None
+    if args.stream:
+        stream = StreamRecorder(path=f"{out_path}.stream.jsonl")
+
+    journal = None
+    if is_csv(out_path):
+        journal = CheckpointJournal(out_path)
+        if journal.done:
+            print(f"Checkpoint: {len(journal.done)} releases já concluídas em {journal.path}")
+
+    policy = FlushPolicy.from_env()
+    if args.gravar_a_cada:
+        policy.releases = args.gravar_a_cada
+    if args.fsync:
+        policy.fsync = True
+    # aberto depois do journal, que trunca o CSV na retomada
+    sink = open_sink(out_path, policy)
+    if sink.done:
+        print(f"Retomada: {len(sink.done)} releases já gravadas em {out_path}")
+
+    if args.shards:
+        # import tardio: shard_analysis depende deste módulo
+        from shard_analysis import run_sharded
+        from token_packer import TokenCounter
+
+        run_sharded(
+            model,
+            releases_csv,
+            sink,
+            template,
+            hf_token,
+            gh_token,
+            max(1, args.concorrencia),
+            cache,
+            journal,
+            tar_cache,
+            args.max_shards,
+            TokenCounter(model) if args.orcamento_tokens else None,
+            stream,
+            prefilter,
+        )
+    elif args.pipeline:
+        run_pipeline(
+            model,
+            releases_csv,
+            sink,
+            template,
+            hf_token,
+            gh_token,
+            cache,
+            journal,
+            tar_cache,
+            packer,
+            parse_workers(args.workers, PIPELINE_STAGES),
+            args.fila,
+            stream,
+            prefilter,
+        )
+    elif args.concorrencia > 1:
+        run_async(
+            model,
+            releases_csv,
+            sink,
+            template,
+            hf_token,
+            gh_token,
+            args.concorrencia,
+            cache,
+            journal,
+            tar_cache,
+            packer,
+            stream,
+            prefilter,
+        )
+    else:
+        run_sequential(
+            model,
+            releases_csv,
+            sink,
+            template,
+            hf_token,
+            gh_token,
+            cache,
+            journal,
+            tar_cache,
+            packer,
+            stream,
+            prefilter,
+        )
+    sink.close()
+    if journal is not None:
+        journal.close()
+    print(sink.report())
+    if packer is not None:
+        packer.counter.save()
+
+    if cache is not None:
+        print(cache.stats.report())
+    if tar_cache is not None:
+        print(tar_cache.stats.report())
+    if stream is not None:
+        print(stream.report())
+    if prefilter is not None:
+        prefilter.close()
+        print(prefilter.stats.report())
+    metrics.close()
+    print(metrics.report())
+
+
+def read_releases(
+    releases_csv: str,
+    journal: CheckpointJournal | None,
+    model: str,
+    done: set[tuple[str, str]] = frozenset(),
+) -> list[dict]:
+    items = []
     with open(releases_csv, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for idx, row in enumerate(reader, start=1):
+        for idx, row in enumerate(csv.DictReader(f), start=1):
             release = row.get("tag_name") or row.get("name") or f"release_{idx}"
             desc = row.get("name") or release
             tar_url = row.get("tarball_url")
@@ -131,14 +507,208 @@ def main():
                 print(f"[{idx}] Pulando {release}: sem tarball_url")
                 continue
 
-            print(f"[{idx}] Baixando {release} de {tar_url}")
-            blob = download_tarball(tar_url, gh_token)
+            if (model, release) in done or (journal is not None and journal.is_done(model, release)):
+                print(f"[{idx}] Pulando {release}: já concluída")
+                continue
+
+            items.append({"idx": idx, "release": release, "desc": desc, "tar_url": tar_url})
+    return items
+
+
+def write_result(
+    sink: ResultSink,
+    journal: CheckpointJournal | None,
+    model: str,
+    result: str,
+    release: str,
+    desc: str,
+) -> None:
+    on_flush = None
+    if journal is not None:
+        # confirma no journal só depois que a release chegou ao arquivo
+        on_flush = lambda offset: journal.commit(model, release, offset)
+    with metrics.stage("escrita", release):
+        sink.write(result, release, desc, on_flush, model)
 
-            code = extract_text_from_tarball(blob, MAX_CHARS)
-            prompt = build_prompt(template, release, desc, code)
-            result = call_hf_router_chat(model, prompt, hf_token)
-            append_csv(out_path, result, release, desc)
-            print(f"[{idx}] OK -> {out_path}")
+
+def run_sequential(
+    model: str,
+    releases_csv: str,
+    sink: ResultSink,
+    template: PromptTemplate,
+    hf_token: str,
+    gh_token: str | None,
+    cache: ResponseCache | None,
+    journal: CheckpointJournal | None,
+    tar_cache: TarballCache | None,
+    packer=None,
+    stream: StreamRecorder | None = None,
+    prefilter=None,
+):
+    for item in read_releases(releases_csv, journal, model, sink.done):
+        idx, release, desc = item["idx"], item["release"], item["desc"]
+        print(f"[{idx}] Baixando {release} de {item['tar_url']}")
+        with metrics.release_scope(release):
+            prompt = prepare_prompt(
+                template, release, desc, item["tar_url"], gh_token, tar_cache, packer, prefilter
+            )
+            if prompt is None:
+                print(f"[{idx}] {release}: nenhum arquivo para analisar, sem chamada ao modelo")
+                result = ""
+            else:
+                result = call_hf_router_chat(
+                    model, prompt, hf_token, cache=cache, stream=stream, label=release
+                )
+            write_result(sink, journal, model, result, release, desc)
+        print(f"[{idx}] OK -> {sink.path}")
+
+
+def run_async(
+    model: str,
+    releases_csv: str,
+    sink: ResultSink,
+    template: PromptTemplate,
+    hf_token: str,
+    gh_token: str | None,
+    concurrency: int,
+    cache: ResponseCache | None,
+    journal: CheckpointJournal | None,
+    tar_cache: TarballCache | None,
+    packer=None,
+    stream: StreamRecorder | None = None,
+    prefilter=None,
+):
+    jobs = [
+        ReleaseJob(
+            item["release"],
+            item["desc"],
+            lambda item=item: prepare_prompt(
+                template,
+                item["release"],
+                item["desc"],
+                item["tar_url"],
+                gh_token,
+                tar_cache,
+                packer,
+                prefilter,
+            ),
+        )
+        for item in read_releases(releases_csv, journal, model, sink.done)
+    ]
+
+    def write(job: ReleaseJob, result: str) -> None:
+        write_result(sink, journal, model, result, job.release, job.desc)
+        print(f"OK {job.release} -> {sink.path}")
+
+    stats = run_concurrent(
+        jobs,
+        lambda prompt: call_hf_router_chat(
+            model, prompt, hf_token, cache=cache, stream=stream, label=current_release()
+        ),
+        write,
+        concurrency,
+    )
+    print(
+        f"{stats.releases} releases em {stats.total_s:.1f}s "
+        f"(concorrência {concurrency}, {stats.retries} novas tentativas)"
+    )
+
+
+def run_pipeline(
+    model: str,
+    releases_csv: str,
+    sink: ResultSink,
+    template: PromptTemplate,
+    hf_token: str,
+    gh_token: str | None,
+    cache: ResponseCache | None,
+    journal: CheckpointJournal | None,
+    tar_cache: TarballCache | None,
+    packer,
+    workers: dict[str, int],
+    queue_size: int,
+    stream: StreamRecorder | None = None,
+    prefilter=None,
+):
+    # os workers atendem releases diferentes; cada estágio abre o escopo da sua
+    #
+    # sem o cache, os tarballs baixados ficam em arquivos temporários até a
+    # extração; os que não chegarem a ela (falha em outro estágio interrompe
+    # o pipeline) são apagados no fim
+    temporary: set[str] = set()
+    temporary_lock = threading.Lock()
+
+    def download(item: dict) -> dict:
+        with metrics.release_scope(item["release"]):
+            if tar_cache is not None:
+                item["archive"] = tar_cache.fetch(item["tar_url"], gh_token)
+            else:
+                item["archive"] = download_tarball_to_file(item["tar_url"], gh_token)
+                item["temporary"] = True
+                with temporary_lock:
+                    temporary.add(item["archive"])
+        return item
+
+    def extract(item: dict) -> dict:
+        archive = item.pop("archive")
+        try:
+            with open(archive, "rb") as f, metrics.stage("extracao", item["release"]):
+                if packer is None and prefilter is not None:
+                    item["code"] = prefilter.extract(f, MAX_CHARS)
+                elif packer is None:
+                    item["code"] = extract_text_from_stream(f, MAX_CHARS)
+                else:
+                    item["code"] = packer.pack(item["release"], item["desc"], f).code
+        finally:
+            if item.pop("temporary", False):
+                os.remove(archive)
+                with temporary_lock:
+                    temporary.discard(archive)
+        return item
+
+    def prompt(item: dict) -> dict:
+        code = item.pop("code")
+        if not code:
+            # nada para analisar: a release segue sem prompt e grava a linha NENHUM
+            item["prompt"] = None
+            return item
+        with metrics.stage("prompt", item["release"]):
+            item["prompt"] = build_prompt(template, item["release"], item["desc"], code)
+        return item
+
+    def infer(item: dict) -> dict:
+        if item["prompt"] is None:
+            item.pop("prompt")
+            item["result"] = ""
+            print(f"[{item['idx']}] {item['release']}: nenhum arquivo para analisar, sem chamada ao modelo")
+            return item
+        with metrics.release_scope(item["release"]):
+            item["result"] = call_hf_router_chat(
+                model, item.pop("prompt"), hf_token, cache=cache, stream=stream, label=item["release"]
+            )
+        return item
+
+    def write(item: dict) -> None:
+        write_result(sink, journal, model, item["result"], item["release"], item["desc"])
+        print(f"[{item['idx']}] OK -> {sink.path}")
+
+    stages = [
+        Stage("download", download, workers["download"]),
+        Stage("extracao", extract, workers["extracao"]),
+        Stage("prompt", prompt, workers["prompt"]),
+        Stage("inferencia", infer, workers["inferencia"]),
+    ]
+    ensure_pool_size(max(workers["download"], workers["inferencia"]))
+
+    try:
+        stats = Pipeline(stages, write, queue_size).run(
+            read_releases(releases_csv, journal, model, sink.done)
+        )
+    finally:
+        for path in temporary:
+            if os.path.exists(path):
+                os.remove(path)
+    print(stats.report())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+import json
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+import metrics
+from async_dispatch import ReleaseJob, current_label, run_concurrent
+from checkpoint import CheckpointJournal
+from hf_stream import StreamRecorder
+from prompt_template import PromptTemplate
+from response_cache import ResponseCache
+from result_sink import ResultSink
+from run_hf import build_prompt, call_hf_router_chat
+from run_hf_batch import MAX_CHARS, open_release_archive, read_releases, write_result
+from smell_catalog import NONE_LABEL, parse_row
+from tarball_cache import TarballCache
+from token_packer import SourceFile, TokenCounter, collect_files, template_tokens, token_budget
+
+
+# Análise da release inteira em vez dos primeiros MAX_CHARS caracteres
+# (map-reduce). Os arquivos elegíveis do tarball são distribuídos em shards
+# do tamanho do orçamento do prompt (caracteres ou tokens), cada shard vira
+# uma chamada ao router, e os shards correm em paralelo pelo dispatcher
+# assíncrono. O reduce junta os achados por (Categoria, CodeSmell), um por
+# release, e grava no <saida>.shards.jsonl de que shards (e arquivos) veio
+# cada um. Download e extração das próximas releases correm num pool de
+# threads enquanto os shards do lote atual estão no dispatcher.
+
+
+@dataclass
+class Shard:
+    index: int
+    files: list[SourceFile] = field(default_factory=list)
+    size: int = 0
+
+    @property
+    def code(self) -> str:
+        return "\n\n".join(f.chunk for f in self.files)
+
+    @property
+    def names(self) -> list[str]:
+        return [f.name for f in self.files]
+
+
+def make_shards(
+    files: list[SourceFile], budget: int, measure: Callable[[str], int] = len
+) -> list[Shard]:
+    # first-fit decreasing: do maior para o menor, cada arquivo no primeiro
+    # shard em que cabe. Um arquivo maior que o orçamento ocupa um shard
+    # sozinho, cortado no tamanho do orçamento: o corte proporcional é medido
+    # de novo e aparado até caber, porque em tokens a proporção do arquivo
+    # inteiro não vale para o trecho.
+    if budget <= 0:
+        raise ValueError("Orçamento de shard deve ser positivo")
+    sized = sorted(((measure(f.chunk), f) for f in files), key=lambda sf: (-sf[0], sf[1].name))
+    shards: list[Shard] = []
+    separator = measure("\n\n")
+    for size, f in sized:
+        if size > budget:
+            keep = max(1, int(len(f.text) * budget / size) - len(f.name) - 4)
+            size = measure(SourceFile(f.name, f.text[:keep]).chunk)
+            while size > budget and keep > 1:
+                keep = max(1, min(keep - 1, int(keep * budget / size)))
+                size = measure(SourceFile(f.name, f.text[:keep]).chunk)
+            shards.append(Shard(len(shards) + 1, [SourceFile(f.name, f.text[:keep])], size))
+            continue
+        for shard in shards:
+            if shard.size + separator + size <= budget:
+                shard.files.append(f)
+                shard.size += separator + size
+                break
+        else:
+            shards.append(Shard(len(shards) + 1, [f], size))
+    return shards
+
+
+@dataclass
+class Finding:
+    category: str
+    smell: str
+    justification: str
+    shards: list[int] = field(default_factory=list)
+
+
+def reduce_findings(outputs: list[tuple[Shard, str]]) -> list[Finding]:
+    # um achado por (Categoria, CodeSmell), na ordem em que apareceram;
+    # fica a primeira justificativa e a lista dos shards que o apontaram
+    merged: dict[tuple[str, str], Finding] = {}
+    for shard, text in outputs:
+        for line in text.splitlines():
+            parsed = parse_row(line)
+            if parsed is None or parsed[1] == NONE_LABEL:
+                continue
+            category, smell, justification = parsed
+            finding = merged.get((category, smell))
+            if finding is None:
+                merged[(category, smell)] = Finding(category, smell, justification, [shard.index])
+            elif shard.index not in finding.shards:
+                finding.shards.append(shard.index)
+    return list(merged.values())
+
+
+def findings_csv(release: str, desc: str, findings: list[Finding]) -> str:
+    # vazio quando nenhum shard achou nada: o sink grava a linha NENHUM
+    return "\n".join(f"{release};{desc};{f.category};{f.smell};{f.justification}" for f in findings)
+
+
+class ProvenanceLog:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, release: str, shards: list[Shard], findings: list[Finding], skipped: int) -> None:
+        record = {
+            "release": release,
+            "shards": [{"shard": s.index, "tamanho": s.size, "arquivos": s.names} for s in shards],
+            "shards_fora": skipped,
+            "achados": [
+                {"categoria": f.category, "code_smell": f.smell, "shards": f.shards} for f in findings
+            ],
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def load_shards(
+    model: str,
+    item: dict,
+    template: PromptTemplate,
+    gh_token: str | None,
+    tar_cache: TarballCache | None,
+    counter: TokenCounter | None,
+    prefilter=None,
+) -> list[Shard]:
+    # sem counter, o orçamento de cada shard é MAX_CHARS caracteres, o mesmo
+    # corte da análise truncada; com counter, é o orçamento de tokens do modelo
+    release, desc = item["release"], item["desc"]
+    with open_release_archive(item["tar_url"], gh_token, tar_cache) as f, metrics.stage("extracao"):
+        files = collect_files(f)
+    if prefilter is not None:
+        files = prefilter.select(files)
+    if counter is None:
+        shards = make_shards(files, MAX_CHARS)
+    else:
+        budget = token_budget(model, template_tokens(counter, template.text, release, desc))
+        shards = make_shards(files, budget, counter.count)
+    if prefilter is not None:
+        # shards com os arquivos mais suspeitos primeiro: são os que ficam no --max-shards
+        rank = {f.name: i for i, f in enumerate(files)}
+        shards.sort(key=lambda s: min(rank[name] for name in s.names))
+        for i, shard in enumerate(shards, start=1):
+            shard.index = i
+    return shards
+
+
+def run_sharded(
+    model: str,
+    releases_csv: str,
+    sink: ResultSink,
+    template: PromptTemplate,
+    hf_token: str,
+    gh_token: str | None,
+    concurrency: int,
+    cache: ResponseCache | None,
+    journal: CheckpointJournal | None,
+    tar_cache: TarballCache | None,
+    max_shards: int = 0,
+    counter: TokenCounter | None = None,
+    stream: StreamRecorder | None = None,
+    prefilter=None,
+):
+    # As releases são lidas em lotes de pelo menos 2x`concurrency` shards, e
+    # os shards do lote inteiro vão juntos para o dispatcher: releases de um
+    # shard só também ocupam todas as chamadas simultâneas. A escrita sai em
+    # ordem; a release é reduzida e gravada quando chega o seu último shard.
+    # Até 2x`concurrency` releases à frente ficam baixando e extraindo em
+    # `concurrency` threads, o que limita também a memória dos shards prontos.
+    provenance = ProvenanceLog(f"{sink.path}.shards.jsonl")
+    calls = 0
+    batch: list[tuple[dict, list[Shard], int]] = []
+
+    def finish(item: dict, shards: list[Shard], skipped: int, outputs: list[tuple[Shard, str]]) -> None:
+        release, desc = item["release"], item["desc"]
+        with metrics.stage("reduce", release):
+            findings = reduce_findings(outputs)
+        write_result(sink, journal, model, findings_csv(release, desc, findings), release, desc)
+        provenance.write(release, shards, findings, skipped)
+        print(f"[{item['idx']}] OK {release}: {len(findings)} code smells de {len(shards)} shards -> {sink.path}")
+
+    def dispatch() -> None:
+        nonlocal calls
+        jobs: list[ReleaseJob] = []
+        owners: list[tuple[int, Shard]] = []
+        for i, (item, shards, _) in enumerate(batch):
+            release, desc = item["release"], item["desc"]
+            for shard in shards:
+                # a release real vai para as métricas; o shard, só para o rótulo
+                jobs.append(
+                    ReleaseJob(
+                        release,
+                        desc,
+                        lambda shard=shard, release=release, desc=desc: build_prompt(
+                            template, release, desc, shard.code
+                        ),
+                        label=f"{release}#{shard.index}",
+                    )
+                )
+                owners.append((i, shard))
+        outputs: list[list[tuple[Shard, str]]] = [[] for _ in batch]
+        written = 0
+
+        def write(job: ReleaseJob, result: str) -> None:
+            # a escrita é em ordem: o n-ésimo resultado é do n-ésimo job
+            nonlocal written
+            i, shard = owners[written]
+            written += 1
+            outputs[i].append((shard, result))
+            item, shards, skipped = batch[i]
+            if len(outputs[i]) == len(shards):
+                finish(item, shards, skipped, outputs[i])
+
+        run_concurrent(
+            jobs,
+            lambda prompt: call_hf_router_chat(
+                model, prompt, hf_token, cache=cache, stream=stream, label=current_label()
+            ),
+            write,
+            concurrency,
+        )
+        calls += len(jobs)
+        batch.clear()
+
+    def process(item: dict, shards: list[Shard]) -> None:
+        release = item["release"]
+        skipped = 0
+        if max_shards and len(shards) > max_shards:
+            skipped = len(shards) - max_shards
+            shards = shards[:max_shards]
+        files = sum(len(s.files) for s in shards)
+        print(
+            f"[{item['idx']}] {release}: {files} arquivos em {len(shards)} shards"
+            + (f" ({skipped} fora do limite)" if skipped else "")
+        )
+        if not shards:
+            # nada elegível (ou nada suspeito, com --pre-filtro): grava a linha
+            # NENHUM sem chamar o modelo, depois das releases do lote em andamento
+            if batch:
+                dispatch()
+            write_result(sink, journal, model, "", release, item["desc"])
+            provenance.write(release, [], [], 0)
+            return
+        batch.append((item, shards, skipped))
+        if sum(len(b[1]) for b in batch) >= 2 * concurrency:
+            dispatch()
+
+    def load(item: dict) -> list[Shard]:
+        with metrics.release_scope(item["release"]):
+            return load_shards(model, item, template, gh_token, tar_cache, counter, prefilter)
+
+    items = iter(read_releases(releases_csv, journal, model, sink.done))
+    loading: deque[tuple[dict, Future]] = deque()
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="shards")
+
+    def prefetch() -> None:
+        while len(loading) < 2 * concurrency:
+            item = next(items, None)
+            if item is None:
+                return
+            loading.append((item, pool.submit(load, item)))
+
+    try:
+        prefetch()
+        while loading:
+            item, future = loading.popleft()
+            shards = future.result()
+            prefetch()
+            process(item, shards)
+        if batch:
+            dispatch()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    print(f"Shards: {calls} chamadas ao router; origem dos achados em {provenance.path}")
+    if counter is not None:
+        counter.save()
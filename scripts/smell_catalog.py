@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+
+# Catálogo de code smells do prompt (Refactoring Guru) e leitura das linhas
+# CSV devolvidas pelos modelos.
+
+
+CATALOG = {
+    "Bloaters": (
+        "Long Method",
+        "Large Class",
+        "Primitive Obsession",
+        "Long Parameter List",
+        "Data Clumps",
+    ),
+    "Object Orientation Abusers": (
+        "Alternative Classes with Different Interfaces",
+        "Refused Bequest",
+        "Switch Statements",
+        "Temporary Field",
+    ),
+    "Change Preventers": (
+        "Divergent Change",
+        "Parallel Inheritance Hierarchies",
+        "Shotgun Surgery",
+    ),
+    "Dispensables": (
+        "Comments",
+        "Duplicate Code",
+        "Data Class",
+        "Dead Code",
+        "Lazy Class",
+        "Speculative Generality",
+    ),
+    "Couplers": (
+        "Feature Envy",
+        "Inappropriate Intimacy",
+        "Incomplete Library Class",
+        "Message Chains",
+        "Middle Man",
+    ),
+}
+
+NONE_LABEL = "NENHUM"
+
+HEADER = "Release;DescricaoRelease;Categoria;CodeSmell;Justificativa"
+
+_SMELLS = {smell.lower(): smell for smells in CATALOG.values() for smell in smells}
+_CATEGORIES = {category.lower(): category for category in CATALOG}
+
+
+def canonical_smell(name: str) -> str | None:
+    return _SMELLS.get(name.strip().lower())
+
+
+def canonical_category(name: str) -> str | None:
+    return _CATEGORIES.get(name.strip().lower())
+
+
+def parse_row(line: str) -> tuple[str, str, str] | None:
+    # Aceita a linha completa (Release;Descricao;Categoria;CodeSmell;Justificativa)
+    # ou só Categoria;CodeSmell;Justificativa. Devolve (categoria, smell,
+    # justificativa) com os nomes do catálogo, ou None se não for uma linha válida.
+    parts = line.strip().split(";")
+    if len(parts) >= 5:
+        category, smell, justification = parts[2], parts[3], ";".join(parts[4:])
+    elif len(parts) >= 3:
+        category, smell, justification = parts[0], parts[1], ";".join(parts[2:])
+    else:
+        return None
+
+    if category.strip().upper() == NONE_LABEL and smell.strip().upper() == NONE_LABEL:
+        return NONE_LABEL, NONE_LABEL, justification.strip()
+    smell = canonical_smell(smell)
+    if smell is None:
+        return None
+    return canonical_category(category) or category.strip(), smell, justification.strip()
@@ -0,0 +1,640 @@
+#!/usr/bin/env python3
+import argparse
+import ast
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import sys
+import tarfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+import metrics
+from release_manifest import content_digest, language_of
+from run_hf_batch import is_candidate_member
+from token_packer import SourceFile, collect_files
+
+
+# Pré-filtro estático: antes de montar o prompt, mede cada arquivo elegível
+# (tamanho das funções, número de parâmetros, tamanho das classes, blocos
+# duplicados, profundidade de aninhamento e cadeias de chamadas) com um
+# tokenizador leve, sem compilar nada, e dá uma pontuação ao arquivo. Os
+# arquivos são ordenados pela pontuação e os que ficam abaixo do mínimo não
+# entram no prompt: o orçamento do modelo vai para os prováveis Bloaters e
+# Couplers.
+#
+# Python usa o ast; Ruby (e Python que não compila) usa a indentação; o resto
+# das linguagens de ALLOWED_EXTS usa chaves. As medidas de cada arquivo ficam
+# em cache pelo hash do conteúdo, e os arquivos fora do cache são medidos em
+# paralelo, em processos (PREFILTER_WORKERS, padrão: um por núcleo).
+
+
+DEFAULT_PREFILTER_DIR = os.path.join(".cache", "pre_filtro")
+# muda quando as medidas mudam, e com ela a chave do cache
+ANALYZER_VERSION = "1"
+
+LONG_FUNCTION_LINES = 50
+MANY_PARAMS = 4
+LARGE_CLASS_LINES = 400
+LARGE_CLASS_METHODS = 20
+DEEP_NESTING = 4
+DUP_WINDOW = 6
+CHAIN_CALLS = 4
+# abaixo disso, medir no próprio processo sai mais barato que repartir
+MIN_PARALLEL_FILES = 16
+
+
+@dataclass
+class FileMetrics:
+    lines: int = 0
+    functions: int = 0
+    long_functions: int = 0
+    longest_function: int = 0
+    long_param_lists: int = 0
+    max_params: int = 0
+    classes: int = 0
+    large_classes: int = 0
+    largest_class: int = 0
+    max_nesting: int = 0
+    message_chains: int = 0
+    fingerprints: list[str] = field(default_factory=list)
+
+    def add_function(self, lines: int, params: int) -> None:
+        self.functions += 1
+        self.longest_function = max(self.longest_function, lines)
+        self.max_params = max(self.max_params, params)
+        if lines > LONG_FUNCTION_LINES:
+            self.long_functions += 1
+        if params > MANY_PARAMS:
+            self.long_param_lists += 1
+
+    def add_class(self, lines: int, methods: int) -> None:
+        self.classes += 1
+        self.largest_class = max(self.largest_class, lines)
+        if lines > LARGE_CLASS_LINES or methods > LARGE_CLASS_METHODS:
+            self.large_classes += 1
+
+
+def score(m: FileMetrics, duplicated: int = 0) -> float:
+    # cada indício conta um ponto; classe grande conta dois, aninhamento conta
+    # os níveis acima do limite e a duplicação conta os blocos de DUP_WINDOW linhas
+    return (
+        m.long_functions
+        + m.long_param_lists
+        + 2 * m.large_classes
+        + max(0, m.max_nesting - DEEP_NESTING)
+        + 0.5 * m.message_chains
+        + duplicated / DUP_WINDOW
+    )
+
+
+# --- tokenização leve: comentários e strings viram espaço, as linhas ficam ---
+
+C_COMMENTS = r"//[^\n]*|/\*.*?\*/"
+HASH_COMMENTS = r"#[^\n]*"
+DOUBLE_QUOTED = r'"(?:\\.|[^"\\\n])*"'
+SINGLE_QUOTED = r"'(?:\\.|[^'\\\n])*'"
+CHAR_LITERAL = r"'(?:\\.|[^'\\\n])'"
+BACKTICK = r"`(?:\\.|[^`\\])*`"
+TRIPLE_QUOTED = r'"""(?:\\.|[^\\])*?"""|' + r"'''(?:\\.|[^\\])*?'''"
+
+LEXERS = {
+    "c": re.compile("|".join([C_COMMENTS, DOUBLE_QUOTED, SINGLE_QUOTED]), re.S),
+    "js": re.compile("|".join([C_COMMENTS, DOUBLE_QUOTED, SINGLE_QUOTED, BACKTICK]), re.S),
+    # lifetimes ('a) não são strings
+    "rust": re.compile("|".join([C_COMMENTS, DOUBLE_QUOTED, CHAR_LITERAL]), re.S),
+    "php": re.compile("|".join([C_COMMENTS, HASH_COMMENTS, DOUBLE_QUOTED, SINGLE_QUOTED]), re.S),
+    "shell": re.compile("|".join([HASH_COMMENTS, DOUBLE_QUOTED, SINGLE_QUOTED]), re.S),
+    "script": re.compile("|".join([TRIPLE_QUOTED, HASH_COMMENTS, DOUBLE_QUOTED, SINGLE_QUOTED]), re.S),
+}
+FAMILIES = {
+    "TypeScript": "js",
+    "JavaScript": "js",
+    "Rust": "rust",
+    "PHP": "php",
+    "Shell": "shell",
+    "PowerShell": "shell",
+    "Python": "script",
+    "Ruby": "script",
+}
+
+
+def _blank(match: re.Match) -> str:
+    text = match.group()
+    newlines = text.count("\n")
+    if text.startswith(("//", "/*", "#")):
+        return " " + "\n" * newlines
+    return '""' + "\n" * newlines
+
+
+def strip_code(text: str, family: str) -> str:
+    return LEXERS[family].sub(_blank, text)
+
+
+# --- duplicação e cadeias de chamadas, iguais para todas as linguagens ---
+
+BOILERPLATE_RE = re.compile(r"^(?:import|from|#include|using|package|require|use|export \*)\b")
+WORD_RE = re.compile(r"\w")
+CHAIN_RE = re.compile(r"(?:\.\s*[A-Za-z_$][\w$]*\s*\([^()]*\)\s*){%d,}" % CHAIN_CALLS)
+
+
+def block_fingerprints(stripped: str) -> list[str]:
+    # janelas de DUP_WINDOW linhas significativas consecutivas, com espaços
+    # normalizados; strings e comentários já saíram, então clones que só
+    # mudam literais também batem
+    lines = []
+    for line in stripped.splitlines():
+        line = " ".join(line.split())
+        if len(WORD_RE.findall(line)) < 3 or BOILERPLATE_RE.match(line):
+            continue
+        lines.append(line)
+    fingerprints = []
+    for i in range(len(lines) - DUP_WINDOW + 1):
+        block = "\n".join(lines[i:i + DUP_WINDOW]).encode("utf-8")
+        fingerprints.append(hashlib.blake2b(block, digest_size=8).hexdigest())
+    return fingerprints
+
+
+def count_chains(stripped: str) -> int:
+    return sum(1 for line in stripped.splitlines() if CHAIN_RE.search(line))
+
+
+# --- linguagens com chaves ---
+
+CONTROL_RE = re.compile(
+    r"^(?:else\s+)?(?:if|for|foreach|while|switch|catch|do|try|finally|else|using|lock|"
+    r"synchronized|match|when|loop|select|with|unsafe|guard|repeat|defer)\b"
+)
+CLASS_RE = re.compile(
+    r"\b(?:class|interface|struct|enum|trait|impl|object|record|protocol|extension)\s+[A-Za-z_$]"
+)
+FUNCTION_TAIL_RE = re.compile(
+    r"\)\s*(?:(?:->|:)\s*[^{};=]*|throws\b[^{};]*|where\b[^{};]*|=>|const|noexcept|"
+    r"override|final|async|mutating|\s)*$"
+)
+ARROW_RE = re.compile(r"(?:^|[=(,:]\s*)(?:async\s+)?[A-Za-z_$][\w$]*\s*=>$")
+FUNCTION_KEYWORD_RE = re.compile(r"\bfunction\s+[\w$-]+\s*$")
+CALLEE_RE = re.compile(r"[A-Za-z_$][\w$]*\s*(?:<[^<>()]*>)?\s*$")
+SELF_PARAMS = {"self", "&self", "&mut self", "this", "void"}
+
+
+def split_params(params: str) -> int:
+    params = params.strip()
+    if not params or params in SELF_PARAMS:
+        return 0
+    depth = 0
+    count = 1
+    for ch in params:
+        if ch in "([{<":
+            depth += 1
+        elif ch in ")]}>":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            count += 1
+    first = params.split(",", 1)[0].strip()
+    if first in SELF_PARAMS:
+        count -= 1
+    # vírgula final (TS, Kotlin, Rust)
+    if params.rstrip().endswith(","):
+        count -= 1
+    return count
+
+
+def header_params(header: str) -> int:
+    # parâmetros do último grupo (...) de nível 0 precedido por um nome; sem
+    # nome (arrow function), do último grupo
+    groups = []
+    depth = 0
+    start = 0
+    for i, ch in enumerate(header):
+        if ch == "(":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == ")" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                groups.append((start, header[start + 1:i]))
+    if not groups:
+        return 0
+    named = [params for start, params in groups if CALLEE_RE.search(header[:start])]
+    return split_params(named[-1] if named else groups[-1][1])
+
+
+def classify_header(header: str) -> str:
+    header = " ".join(header.split())
+    if not header:
+        return "bloco"
+    if CONTROL_RE.match(header):
+        return "controle"
+    match = CLASS_RE.search(header)
+    if match and "(" not in header[:match.start()]:
+        return "classe"
+    if FUNCTION_TAIL_RE.search(header) or ARROW_RE.search(header) or FUNCTION_KEYWORD_RE.search(header):
+        return "funcao"
+    return "bloco"
+
+
+BRACE_TOKEN_RE = re.compile(r"[{}();\n]")
+
+
+def brace_metrics(stripped: str, m: FileMetrics) -> None:
+    # cabeçalho de cada bloco: texto desde o último { } ; ou desde a última
+    # quebra de linha fora de parênteses (linguagens sem ;)
+    stack: list[list] = []  # [tipo, linha inicial, métodos]
+    line = 1
+    parens = 0
+    header_start = 0
+    newlines = [0, 0]
+    for match in BRACE_TOKEN_RE.finditer(stripped):
+        ch = match.group()
+        pos = match.start()
+        if ch == "\n":
+            line += 1
+            if parens == 0:
+                newlines = [newlines[1], pos + 1]
+        elif ch == "(":
+            parens += 1
+        elif ch == ")":
+            parens = max(0, parens - 1)
+        elif ch == ";":
+            if parens == 0:
+                header_start = pos + 1
+        elif ch == "{":
+            header = stripped[max(header_start, newlines[1]):pos]
+            if not header.strip():
+                header = stripped[max(header_start, newlines[0]):pos]
+            kind = classify_header(header)
+            if kind == "funcao":
+                if stack and stack[-1][0] == "classe":
+                    stack[-1][2] += 1
+                stack.append(["funcao", line - header.count("\n"), header_params(header)])
+            else:
+                stack.append([kind, line - header.count("\n"), 0])
+                if kind == "controle":
+                    depth = 0
+                    for frame in reversed(stack):
+                        if frame[0] == "funcao":
+                            break
+                        depth += frame[0] == "controle"
+                    m.max_nesting = max(m.max_nesting, depth)
+            header_start = pos + 1
+            parens = 0
+        elif ch == "}":
+            if stack:
+                kind, start, extra = stack.pop()
+                if kind == "funcao":
+                    m.add_function(line - start + 1, extra)
+                elif kind == "classe":
+                    m.add_class(line - start + 1, extra)
+            header_start = pos + 1
+            parens = 0
+
+
+# --- linguagens por indentação (Ruby; Python que não compila) ---
+
+DEF_RE = re.compile(r"^def\s+(?:self\.)?[\w.]+[!?=]?\s*(?:\((.*?)\)|([^:\n]*))?")
+BLOCK_CLASS_RE = re.compile(r"^(?:class|module)\b")
+BLOCK_CONTROL_RE = re.compile(
+    r"^(?:if|unless|while|until|for|case|begin|elif|elsif|else|try|except|with|rescue|ensure)\b|\bdo(?:\s*\|[^|]*\|)?$"
+)
+
+
+def indent_metrics(stripped: str, m: FileMetrics) -> None:
+    stack: list[list] = []  # [indentação, tipo, linha inicial, métodos]
+    last = 0
+
+    def close(frame: list, end: int) -> None:
+        _, kind, start, extra = frame
+        if kind == "funcao":
+            m.add_function(end - start + 1, extra)
+        elif kind == "classe":
+            m.add_class(end - start + 1, extra)
+
+    for number, raw in enumerate(stripped.splitlines(), start=1):
+        code = raw.strip()
+        if not code:
+            continue
+        indent = len(raw.expandtabs(4)) - len(raw.expandtabs(4).lstrip())
+        while stack and stack[-1][0] >= indent:
+            # "end" na mesma coluna fecha o bloco e faz parte dele
+            end = number if code == "end" and stack[-1][0] == indent else last
+            close(stack.pop(), end)
+            if code == "end":
+                break
+        last = number
+        if code == "end":
+            continue
+        match = DEF_RE.match(code)
+        if match:
+            if stack and stack[-1][1] == "classe":
+                stack[-1][3] += 1
+            params = match.group(1) if match.group(1) is not None else (match.group(2) or "")
+            stack.append([indent, "funcao", number, split_params(params)])
+        elif BLOCK_CLASS_RE.match(code):
+            stack.append([indent, "classe", number, 0])
+        elif BLOCK_CONTROL_RE.search(code):
+            stack.append([indent, "controle", number, 0])
+            depth = 0
+            for frame in reversed(stack):
+                if frame[1] == "funcao":
+                    break
+                depth += frame[1] == "controle"
+            m.max_nesting = max(m.max_nesting, depth)
+    while stack:
+        close(stack.pop(), last)
+
+
+# --- Python pelo ast ---
+
+FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+CONTROL_NODES = tuple(
+    getattr(ast, name)
+    for name in ("For", "AsyncFor", "While", "With", "AsyncWith", "Try", "TryStar", "Match")
+    if hasattr(ast, name)
+)
+
+
+def python_metrics(text: str, m: FileMetrics) -> None:
+    tree = ast.parse(text)
+
+    def visit(node: ast.AST, depth: int, in_class: bool = False) -> None:
+        if isinstance(node, FUNCTION_NODES):
+            args = node.args
+            names = [a.arg for a in args.posonlyargs + args.args]
+            if in_class and names and names[0] in ("self", "cls"):
+                names = names[1:]
+            params = len(names) + len(args.kwonlyargs) + bool(args.vararg) + bool(args.kwarg)
+            m.add_function(node.end_lineno - node.lineno + 1, params)
+            for child in node.body:
+                visit(child, 0)
+            return
+        if isinstance(node, ast.ClassDef):
+            methods = sum(isinstance(child, FUNCTION_NODES) for child in node.body)
+            m.add_class(node.end_lineno - node.lineno + 1, methods)
+            for child in node.body:
+                visit(child, 0, in_class=True)
+            return
+        if isinstance(node, ast.If):
+            m.max_nesting = max(m.max_nesting, depth + 1)
+            for child in node.body:
+                visit(child, depth + 1)
+            # elif é um If dentro do orelse, no mesmo nível
+            if len(node.orelse) == 1 and isinstance(node.orelse[0], ast.If):
+                visit(node.orelse[0], depth)
+            else:
+                for child in node.orelse:
+                    visit(child, depth + 1)
+            return
+        if isinstance(node, CONTROL_NODES):
+            depth += 1
+            m.max_nesting = max(m.max_nesting, depth)
+        for child in ast.iter_child_nodes(node):
+            visit(child, depth)
+
+    visit(tree, 0)
+
+
+def analyze_source(name: str, text: str) -> dict:
+    # roda nos processos do pool: recebe e devolve tipos simples
+    m = FileMetrics(lines=text.count("\n") + 1)
+    language = language_of(name)
+    family = FAMILIES.get(language, "c")
+    stripped = strip_code(text, family)
+    if language == "Python":
+        try:
+            python_metrics(text, m)
+        except (SyntaxError, ValueError, RecursionError):
+            m = FileMetrics(lines=m.lines)
+            indent_metrics(stripped, m)
+    elif language == "Ruby":
+        indent_metrics(stripped, m)
+    else:
+        brace_metrics(stripped, m)
+    m.message_chains = count_chains(stripped)
+    m.fingerprints = block_fingerprints(stripped)
+    return asdict(m)
+
+
+def cache_key(name: str, text: str) -> str:
+    # a extensão entra na chave: o mesmo texto em outra linguagem mede diferente
+    ext = os.path.splitext(name.lower())[1]
+    return content_digest(f"{ANALYZER_VERSION}\n{ext}\n{text}".encode("utf-8"))
+
+
+class MetricsCache:
+    def __init__(self, root: str = DEFAULT_PREFILTER_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "MetricsCache":
+        return cls(os.getenv("PREFILTER_CACHE_DIR", DEFAULT_PREFILTER_DIR))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> dict | None:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, value: dict) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(value, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+
+@dataclass
+class PrefilterStats:
+    files: int = 0
+    cached: int = 0
+    kept: int = 0
+    chars: int = 0
+    kept_chars: int = 0
+    seconds: float = 0.0
+
+    def report(self) -> str:
+        dropped = self.files - self.kept
+        saved = 1 - self.kept_chars / self.chars if self.chars else 0.0
+        return (
+            f"Pré-filtro: {self.files} arquivos medidos ({self.cached} do cache) em {self.seconds:.1f}s; "
+            f"{dropped} descartados, {saved:.0%} dos caracteres fora do prompt"
+        )
+
+
+@dataclass
+class RankedFile:
+    file: SourceFile
+    score: float
+    metrics: FileMetrics
+    duplicated: int
+
+
+class Prefilter:
+    def __init__(
+        self,
+        min_score: float = 1.0,
+        workers: int | None = None,
+        cache: MetricsCache | None = None,
+    ):
+        self.min_score = min_score
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = cache
+        self.stats = PrefilterStats()
+        self._lock = threading.Lock()
+        self._pool: ProcessPoolExecutor | None = None
+
+    @classmethod
+    def from_env(cls, min_score: float = 1.0, use_cache: bool = True) -> "Prefilter":
+        workers = os.getenv("PREFILTER_WORKERS")
+        return cls(min_score, int(workers) if workers else None, MetricsCache.from_env() if use_cache else None)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: os processos não herdam as threads do dispatcher
+                context = multiprocessing.get_context("spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def measure(self, files: list[SourceFile]) -> list[FileMetrics]:
+        results: list[dict | None] = [None] * len(files)
+        keys = [cache_key(f.name, f.text) for f in files]
+        if self.cache is not None:
+            for i, key in enumerate(keys):
+                results[i] = self.cache.get(key)
+        missing = [i for i, r in enumerate(results) if r is None]
+        if len(missing) >= MIN_PARALLEL_FILES and self.workers > 1:
+            chunksize = max(1, len(missing) // (self.workers * 4))
+            measured = self._get_pool().map(
+                analyze_source,
+                [files[i].name for i in missing],
+                [files[i].text for i in missing],
+                chunksize=chunksize,
+            )
+        else:
+            measured = (analyze_source(files[i].name, files[i].text) for i in missing)
+        for i, value in zip(missing, measured):
+            results[i] = value
+            if self.cache is not None:
+                self.cache.put(keys[i], value)
+        with self._lock:
+            self.stats.files += len(files)
+            self.stats.cached += len(files) - len(missing)
+        return [FileMetrics(**r) for r in results]
+
+    def rank(self, files: list[SourceFile]) -> list[RankedFile]:
+        # do mais para o menos suspeito; empates, do maior para o menor
+        t0 = time.perf_counter()
+        with metrics.stage("pre_filtro"):
+            measured = self.measure(files)
+            seen = Counter(fp for m in measured for fp in m.fingerprints)
+            ranked = []
+            for f, m in zip(files, measured):
+                duplicated = sum(1 for fp in m.fingerprints if seen[fp] > 1)
+                ranked.append(RankedFile(f, score(m, duplicated), m, duplicated))
+            ranked.sort(key=lambda r: (-r.score, -len(r.file.text), r.file.name))
+        with self._lock:
+            self.stats.seconds += time.perf_counter() - t0
+        return ranked
+
+    def select(self, files: list[SourceFile]) -> list[SourceFile]:
+        kept = [r.file for r in self.rank(files) if r.score >= self.min_score]
+        with self._lock:
+            self.stats.kept += len(kept)
+            self.stats.chars += sum(len(f.text) for f in files)
+            self.stats.kept_chars += sum(len(f.text) for f in kept)
+        return kept
+
+    def extract(self, fileobj, max_chars: int) -> str:
+        # como extract_text_from_stream, mas com os arquivos suspeitos primeiro
+        texts: list[str] = []
+        total = 0
+        for f in self.select(collect_files(fileobj)):
+            remaining = max_chars - total
+            if remaining <= 0:
+                break
+            chunk = f.text[:remaining]
+            texts.append(f"// {f.name}\n{chunk}")
+            total += len(chunk)
+        return "\n\n".join(texts)
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+def read_local_files(path: str) -> list[SourceFile]:
+    if os.path.isdir(path):
+        files = []
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            for filename in sorted(filenames):
+                full = os.path.join(dirpath, filename)
+                info = tarfile.TarInfo(full)
+                info.size = os.path.getsize(full)
+                if not is_candidate_member(info):
+                    continue
+                with open(full, "r", encoding="utf-8", errors="ignore") as f:
+                    text = f.read()
+                if text.strip():
+                    files.append(SourceFile(os.path.relpath(full, path), text))
+        return files
+    with open(path, "rb") as f:
+        return collect_files(io.BytesIO(f.read()))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mede e ordena os arquivos de uma release pelo pré-filtro estático."
+    )
+    parser.add_argument("caminho", help="tarball .tar.gz de release ou pasta de código")
+    parser.add_argument("--minimo", type=float, default=1.0, help="pontuação mínima para o arquivo ficar")
+    parser.add_argument("--top", type=int, default=20, help="arquivos listados")
+    parser.add_argument("--workers", type=int, help="processos (padrão: PREFILTER_WORKERS ou um por núcleo)")
+    parser.add_argument("--sem-cache", action="store_true", help="mede tudo de novo, sem ler nem gravar o cache")
+    args = parser.parse_args(sys.argv[1:])
+
+    prefilter = Prefilter.from_env(args.minimo, use_cache=not args.sem_cache)
+    if args.workers:
+        prefilter.workers = args.workers
+    files = read_local_files(args.caminho)
+    ranked = prefilter.rank(files)
+    kept = [r for r in ranked if r.score >= args.minimo]
+    prefilter.close()
+
+    print(f"{'pontos':>7} {'linhas':>6} {'f>':>3} {'p>':>3} {'c>':>3} {'aninh':>5} {'dup':>4} {'cad':>4}  arquivo")
+    for r in ranked[:args.top]:
+        m = r.metrics
+        print(
+            f"{r.score:7.1f} {m.lines:6d} {m.long_functions:3d} {m.long_param_lists:3d} "
+            f"{m.large_classes:3d} {m.max_nesting:5d} {r.duplicated:4d} {m.message_chains:4d}  {r.file.name}"
+        )
+    total_chars = sum(len(r.file.text) for r in ranked)
+    kept_chars = sum(len(r.file.text) for r in kept)
+    print(
+        f"{len(kept)}/{len(ranked)} arquivos com pontuação >= {args.minimo:g} "
+        f"({kept_chars}/{total_chars} caracteres)"
+    )
+    print(
+        f"{prefilter.stats.files} medidos, {prefilter.stats.cached} do cache, "
+        f"{prefilter.stats.seconds:.2f}s com {prefilter.workers} processos"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import http_client
+import metrics
+
+
+# Cache local dos tarballs das releases. O índice mapeia tarball_url para o
+# sha256 do conteúdo (blobs/<sha256>.tar.gz) junto com ETag/Last-Modified,
+# usados para revalidar com requisições condicionais (304 = nada a baixar).
+
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "tarballs")
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+CHUNK_BYTES = 256 * 1024
+
+
+@dataclass
+class TarballCacheStats:
+    fresh: int = 0
+    not_modified: int = 0
+    downloaded: int = 0
+    bytes_downloaded: int = 0
+    evicted: int = 0
+
+    def report(self) -> str:
+        return (
+            f"Tarballs: {self.fresh} do cache sem requisição, "
+            f"{self.not_modified} revalidados (304), {self.downloaded} baixados "
+            f"({self.bytes_downloaded / 1e6:.1f} MB), {self.evicted} removidos"
+        )
+
+
+class TarballCache:
+    def __init__(
+        self,
+        root: str = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        revalidate: bool = True,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        # tags publicadas não mudam; sem revalidação o cache não faz nenhuma requisição
+        self.revalidate = revalidate
+        self.stats = TarballCacheStats()
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(root, "index.json")
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self._index: dict[str, dict] = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                self._index = json.load(f)
+
+    @classmethod
+    def from_env(cls, revalidate: bool = True) -> "TarballCache":
+        max_mb = os.getenv("TARBALL_CACHE_MAX_MB")
+        return cls(
+            os.getenv("TARBALL_CACHE_DIR", DEFAULT_CACHE_DIR),
+            int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_MAX_BYTES,
+            revalidate,
+        )
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", f"{digest}.tar.gz")
+
+    def _save_index(self) -> None:
+        tmp = f"{self._index_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp, self._index_path)
+
+    def _cached(self, url: str) -> dict | None:
+        with self._lock:
+            entry = self._index.get(url)
+        if entry and os.path.exists(self.blob_path(entry["sha256"])):
+            return entry
+        return None
+
+    def _touch(self, url: str) -> None:
+        with self._lock:
+            self._index[url]["last_used"] = time.time()
+            self._save_index()
+
+    def fetch(self, url: str, token: str | None) -> str:
+        with metrics.stage("download"):
+            return self._fetch(url, token)
+
+    def _fetch(self, url: str, token: str | None) -> str:
+        entry = self._cached(url)
+        if entry and not self.revalidate:
+            self._touch(url)
+            with self._lock:
+                self.stats.fresh += 1
+            return self.blob_path(entry["sha256"])
+
+        headers = {"Accept": "application/vnd.github+json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        # o índice continua pela URL original; só a requisição troca de base
+        config = http_client.get_config()
+        session = http_client.get_session()
+        with session.get(
+            config.github_url(url), headers=headers, timeout=config.github_timeout(), stream=True
+        ) as r:
+            if r.status_code == 304 and entry:
+                self._touch(url)
+                with self._lock:
+                    self.stats.not_modified += 1
+                return self.blob_path(entry["sha256"])
+            if r.status_code != 200:
+                raise RuntimeError(f"Erro {r.status_code} ao baixar {url}: {r.text[:300]}")
+
+            digest = hashlib.sha256()
+            size = 0
+            tmp = os.path.join(self.root, f"download.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f:
+                for chunk in r.iter_content(CHUNK_BYTES):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            etag = r.headers.get("ETag")
+            last_modified = r.headers.get("Last-Modified")
+
+        sha = digest.hexdigest()
+        os.replace(tmp, self.blob_path(sha))
+        metrics.add("bytes_downloaded", size)
+
+        with self._lock:
+            self._index[url] = {
+                "sha256": sha,
+                "size": size,
+                "etag": etag,
+                "last_modified": last_modified,
+                "last_used": time.time(),
+            }
+            self.stats.downloaded += 1
+            self.stats.bytes_downloaded += size
+            self._evict_locked(keep=url)
+            self._save_index()
+        return self.blob_path(sha)
+
+    def _evict_locked(self, keep: str) -> None:
+        # conteúdo idêntico em URLs diferentes ocupa um único blob
+        blobs = {e["sha256"]: e["size"] for e in self._index.values()}
+        total = sum(blobs.values())
+        if total <= self.max_bytes:
+            return
+
+        for url, entry in sorted(self._index.items(), key=lambda kv: kv[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if url == keep:
+                continue
+            del self._index[url]
+            self.stats.evicted += 1
+            sha = entry["sha256"]
+            if any(e["sha256"] == sha for e in self._index.values()):
+                continue
+            try:
+                os.remove(self.blob_path(sha))
+            except FileNotFoundError:
+                pass
+            total -= blobs[sha]
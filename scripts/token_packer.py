@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+import json
+import os
+import tarfile
+import threading
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+
+from release_manifest import ManifestStore, content_digest, strip_root
+from run_hf import MAX_TOKENS, SYSTEM_MESSAGE, compile_prompt
+from run_hf_batch import is_candidate_member
+
+
+# Empacota o código de uma release por orçamento de tokens do modelo, em vez
+# de cortar em MAX_CHARS caracteres. A contagem usa o tokenizer real e fica
+# memorizada pelo hash do conteúdo (em memória e em disco).
+
+
+DEFAULT_TOKEN_CACHE = os.path.join(".cache", "tokens")
+
+# janela de contexto por modelo; o restante usa DEFAULT_CONTEXT
+MODEL_CONTEXT = {
+    "microsoft/Phi-3-mini-4k-instruct": 4096,
+    "Qwen/Qwen2.5-0.5B-Instruct": 32768,
+    "Qwen/Qwen2.5-3B-Instruct": 32768,
+    "HuggingFaceTB/SmolLM3-3B": 65536,
+}
+DEFAULT_CONTEXT = 8192
+
+# margem para o chat template (tokens especiais, papéis) e arredondamentos
+CHAT_OVERHEAD_TOKENS = 64
+
+PRIORITIES = ("maiores", "alterados", "ordem", "suspeitos")
+
+
+@dataclass
+class SourceFile:
+    name: str
+    text: str
+
+    @property
+    def chunk(self) -> str:
+        return f"// {self.name}\n{self.text}"
+
+
+@dataclass
+class PackResult:
+    code: str
+    tokens: int
+    budget: int
+    included: int
+    skipped: int
+
+
+def base_model(model: str) -> str:
+    # remove o sufixo do provedor (:hf-inference, :publicai)
+    return model.split(":", 1)[0]
+
+
+def load_tokenizer_encode(model: str) -> Callable[[str], list[int]]:
+    try:
+        from transformers import AutoTokenizer
+    except ImportError:
+        raise RuntimeError("Empacotamento por tokens requer transformers: pip install transformers")
+    tokenizer = AutoTokenizer.from_pretrained(base_model(model))
+    return lambda text: tokenizer.encode(text, add_special_tokens=False)
+
+
+class TokenCounter:
+    def __init__(
+        self,
+        model: str,
+        encode: Callable[[str], list[int]] | None = None,
+        cache_dir: str = DEFAULT_TOKEN_CACHE,
+    ):
+        self.model = base_model(model)
+        self.encode = encode or load_tokenizer_encode(model)
+        safe = self.model.replace("/", "_")
+        self.cache_path = os.path.join(cache_dir, f"{safe}.json")
+        self._lock = threading.Lock()
+        self._counts: dict[str, int] = {}
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                self._counts = json.load(f)
+
+    def count(self, text: str) -> int:
+        key = content_digest(text.encode("utf-8"))
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        n = len(self.encode(text))
+        with self._lock:
+            self._counts[key] = n
+            self._dirty = True
+            self.misses += 1
+        return n
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp = f"{self.cache_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._counts, f)
+            os.replace(tmp, self.cache_path)
+            self._dirty = False
+
+
+def token_budget(model: str, template_tokens: int, max_tokens: int = MAX_TOKENS) -> int:
+    context = MODEL_CONTEXT.get(base_model(model), DEFAULT_CONTEXT)
+    return max(0, context - max_tokens - template_tokens - CHAT_OVERHEAD_TOKENS)
+
+
+def template_tokens(counter: TokenCounter, template: str, release: str, desc: str) -> int:
+    # tudo o que entra no prompt além do código
+    filled = compile_prompt(template).build(release, desc, "")
+    return counter.count(SYSTEM_MESSAGE) + counter.count(filled)
+
+
+def iter_files(fileobj) -> Iterator[SourceFile]:
+    # um arquivo por vez, na ordem do tarball; parar a iteração para de ler o stream
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+        for member in tar:
+            if not is_candidate_member(member):
+                continue
+            extracted = tar.extractfile(member)
+            if not extracted:
+                continue
+            text = extracted.read().decode("utf-8", errors="ignore")
+            if text.strip():
+                yield SourceFile(strip_root(member.name), text)
+
+
+def collect_files(fileobj) -> list[SourceFile]:
+    return list(iter_files(fileobj))
+
+
+def order_files(
+    files: list[SourceFile], priority: str, changed: set[str] | None = None
+) -> list[SourceFile]:
+    if priority not in PRIORITIES:
+        raise ValueError(f"Prioridade desconhecida: {priority} (use {', '.join(PRIORITIES)})")
+    if priority in ("ordem", "suspeitos"):
+        # suspeitos: a lista já vem ordenada pelo pré-filtro
+        return list(files)
+    by_size = sorted(files, key=lambda f: len(f.text), reverse=True)
+    if priority == "maiores" or not changed:
+        return by_size
+    # alterados primeiro, cada grupo do maior para o menor
+    return [f for f in by_size if f.name in changed] + [
+        f for f in by_size if f.name not in changed
+    ]
+
+
+def pack_files(
+    files: Iterable[SourceFile],
+    counter: TokenCounter,
+    budget: int,
+    priority: str = "maiores",
+    changed: set[str] | None = None,
+) -> PackResult:
+    chunks = []
+    used = 0
+    skipped = 0
+    separator = counter.count("\n\n")
+    # "ordem" consome os arquivos à medida que chegam (pode ser o iter_files)
+    ordered = files if priority == "ordem" else order_files(list(files), priority, changed)
+    for f in ordered:
+        cost = counter.count(f.chunk) + (separator if chunks else 0)
+        if used + cost > budget:
+            skipped += 1
+            if priority == "ordem":
+                # orçamento cheio: o resto do tarball nem é lido
+                break
+            # não cabe inteiro; tenta os próximos (menores)
+            continue
+        chunks.append(f.chunk)
+        used += cost
+    return PackResult("\n\n".join(chunks), used, budget, len(chunks), skipped)
+
+
+def previous_releases(rows: list[dict]) -> dict[str, str]:
+    # release -> release imediatamente anterior por data de publicação
+    dated = [
+        (row.get("published_at") or "", (row.get("tag_name") or row.get("name") or "").strip())
+        for row in rows
+    ]
+    dated = [d for d in dated if d[1]]
+    dated.sort()
+    return {dated[i][1]: dated[i - 1][1] for i in range(1, len(dated))}
+
+
+class ReleasePacker:
+    def __init__(
+        self,
+        model: str,
+        template: str,
+        priority: str = "maiores",
+        manifests: ManifestStore | None = None,
+        previous: dict[str, str] | None = None,
+        counter: TokenCounter | None = None,
+        max_tokens: int = MAX_TOKENS,
+        prefilter=None,
+    ):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Prioridade desconhecida: {priority} (use {', '.join(PRIORITIES)})")
+        self.model = model
+        self.template = template
+        self.priority = priority
+        self.manifests = manifests
+        self.previous = previous or {}
+        self.counter = counter or TokenCounter(model)
+        self.max_tokens = max_tokens
+        self.prefilter = prefilter
+
+    def changed_files(self, release: str) -> set[str] | None:
+        prev = self.previous.get(release)
+        if self.manifests is None or prev is None:
+            return None
+        if not (self.manifests.has(prev) and self.manifests.has(release)):
+            return None
+        delta = self.manifests.delta(prev, release)
+        return delta.added | delta.modified
+
+    def pack(self, release: str, desc: str, fileobj) -> PackResult:
+        budget = token_budget(
+            self.model,
+            template_tokens(self.counter, self.template, release, desc),
+            self.max_tokens,
+        )
+        changed = self.changed_files(release) if self.priority == "alterados" else None
+        if self.prefilter is None:
+            # em "ordem", o tarball é lido só até o orçamento encher
+            files = iter_files(fileobj)
+        else:
+            files = self.prefilter.select(collect_files(fileobj))
+        return pack_files(files, self.counter, budget, self.priority, changed)